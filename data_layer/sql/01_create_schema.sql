@@ -176,14 +176,45 @@ CREATE TABLE vector_store.documents (
     document_type VARCHAR(50), -- markdown, pdf
     chunk_index INT,
     content TEXT,
-    embedding vector(1536), -- OpenAI embedding size
+    embedding halfvec(1536), -- OpenAI embedding size, stored as fp16
     metadata JSONB,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
--- Create index for vector similarity search
-CREATE INDEX ON vector_store.documents USING ivfflat (embedding vector_cosine_ops)
-WITH (lists = 100);
+-- Create index for vector similarity search (HNSW builds fine on an empty
+-- table; vector_store/llm_driven_embed.py rebuilds it sized to the KB)
+CREATE INDEX documents_embedding_idx ON vector_store.documents
+USING hnsw (embedding halfvec_cosine_ops)
+WITH (m = 16, ef_construction = 64);
+
+-- Per-category partial indexes so category-filtered searches don't walk the
+-- full graph and post-filter (kb.search runs them through the
+-- kb_search_<category> prepared statements in vector_store/vector_search.py)
+CREATE INDEX documents_embedding_product_guide_idx ON vector_store.documents
+USING hnsw (embedding halfvec_cosine_ops) WITH (m = 16, ef_construction = 64)
+WHERE metadata->>'category' = 'product_guide';
+CREATE INDEX documents_embedding_support_doc_idx ON vector_store.documents
+USING hnsw (embedding halfvec_cosine_ops) WITH (m = 16, ef_construction = 64)
+WHERE metadata->>'category' = 'support_doc';
+CREATE INDEX documents_embedding_reference_doc_idx ON vector_store.documents
+USING hnsw (embedding halfvec_cosine_ops) WITH (m = 16, ef_construction = 64)
+WHERE metadata->>'category' = 'reference_doc';
+CREATE INDEX documents_embedding_general_idx ON vector_store.documents
+USING hnsw (embedding halfvec_cosine_ops) WITH (m = 16, ef_construction = 64)
+WHERE metadata->>'category' = 'general';
+
+-- Binary-quantized index for the first stage of large unfiltered searches
+-- (Hamming distance picks candidates, exact cosine reranks them)
+CREATE INDEX documents_embedding_bq_idx ON vector_store.documents
+USING hnsw ((binary_quantize(embedding)::bit(1536)) bit_hamming_ops)
+WITH (m = 16, ef_construction = 64);
+
+-- Category lookups (stats, category-only scans)
+CREATE INDEX documents_category_idx ON vector_store.documents ((metadata->>'category'));
+
+-- Chunks flagged critical at embed time (get_critical_documents)
+CREATE INDEX documents_critical_idx ON vector_store.documents (document_name, chunk_index)
+WHERE metadata->>'is_critical' = 'true';
 
 -- =====================================================
 -- STAGING TABLES (Raw data ingestion)
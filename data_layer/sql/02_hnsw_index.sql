@@ -0,0 +1,62 @@
+-- =====================================================
+-- Migration: halfvec embeddings + HNSW (full + per-category) indexes
+-- =====================================================
+-- For databases created before 01_create_schema.sql switched to fp16
+-- halfvec storage and HNSW. Requires pgvector >= 0.7.
+-- m/ef_construction match configure_hnsw_params() in
+-- vector_store/vector_search.py for KBs under 100K chunks; re-running
+-- vector_store/llm_driven_embed.py rebuilds the index sized to the KB.
+--
+--   psql -h localhost -p 5433 -U dbank_user -d dbank -f data_layer/sql/02_hnsw_index.sql
+
+BEGIN;
+
+SET LOCAL maintenance_work_mem = '512MB';
+SET LOCAL max_parallel_maintenance_workers = 2;
+
+-- Vector indexes are opclass-specific, so drop them all before the retype
+DROP INDEX IF EXISTS vector_store.documents_embedding_idx;
+DROP INDEX IF EXISTS vector_store.documents_embedding_product_guide_idx;
+DROP INDEX IF EXISTS vector_store.documents_embedding_support_doc_idx;
+DROP INDEX IF EXISTS vector_store.documents_embedding_reference_doc_idx;
+DROP INDEX IF EXISTS vector_store.documents_embedding_general_idx;
+DROP INDEX IF EXISTS vector_store.documents_embedding_bq_idx;
+DROP INDEX IF EXISTS vector_store.documents_category_idx;
+DROP INDEX IF EXISTS vector_store.documents_critical_idx;
+
+ALTER TABLE vector_store.documents
+ALTER COLUMN embedding TYPE halfvec(1536) USING embedding::halfvec(1536);
+
+CREATE INDEX documents_embedding_idx ON vector_store.documents
+USING hnsw (embedding halfvec_cosine_ops)
+WITH (m = 16, ef_construction = 64);
+
+CREATE INDEX documents_embedding_product_guide_idx ON vector_store.documents
+USING hnsw (embedding halfvec_cosine_ops) WITH (m = 16, ef_construction = 64)
+WHERE metadata->>'category' = 'product_guide';
+CREATE INDEX documents_embedding_support_doc_idx ON vector_store.documents
+USING hnsw (embedding halfvec_cosine_ops) WITH (m = 16, ef_construction = 64)
+WHERE metadata->>'category' = 'support_doc';
+CREATE INDEX documents_embedding_reference_doc_idx ON vector_store.documents
+USING hnsw (embedding halfvec_cosine_ops) WITH (m = 16, ef_construction = 64)
+WHERE metadata->>'category' = 'reference_doc';
+CREATE INDEX documents_embedding_general_idx ON vector_store.documents
+USING hnsw (embedding halfvec_cosine_ops) WITH (m = 16, ef_construction = 64)
+WHERE metadata->>'category' = 'general';
+
+-- Binary-quantized index for the first stage of large unfiltered searches
+-- (Hamming distance picks candidates, exact cosine reranks them)
+CREATE INDEX documents_embedding_bq_idx ON vector_store.documents
+USING hnsw ((binary_quantize(embedding)::bit(1536)) bit_hamming_ops)
+WITH (m = 16, ef_construction = 64);
+
+-- Category lookups (stats, category-only scans)
+CREATE INDEX documents_category_idx ON vector_store.documents ((metadata->>'category'));
+
+-- Chunks flagged critical at embed time (get_critical_documents)
+CREATE INDEX documents_critical_idx ON vector_store.documents (document_name, chunk_index)
+WHERE metadata->>'is_critical' = 'true';
+
+COMMIT;
+
+ANALYZE vector_store.documents;
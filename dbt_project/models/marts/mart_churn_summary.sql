@@ -0,0 +1,44 @@
+-- models/marts/mart_churn_summary.sql
+-- Churned customers pre-aggregated by period, segment and risk level - Powers the churn KPI tools
+
+{{
+    config(
+        materialized='table',
+        indexes=[
+            {'columns': ['churn_period_days', 'customer_segment']}
+        ],
+        tags=['marts', 'churn', 'kpi']
+    )
+}}
+
+with churned as (
+    select * from {{ ref('mart_churned_customers') }}
+),
+
+periods as (
+    select 30 as churn_period_days, c.*
+    from churned c
+    where c.is_churned_30d
+
+    union all
+
+    select 90 as churn_period_days, c.*
+    from churned c
+    where c.is_churned_90d
+)
+
+-- Sums and counts rather than averages, so averages over any
+-- combination of segments and risk levels can be recomputed exactly
+select
+    churn_period_days,
+    customer_segment,
+    churn_risk_level,
+    count(*) as churned_count,
+    sum(days_since_login) as total_days_inactive,
+    count(days_since_login) as days_inactive_count,
+    sum(estimated_clv) as total_clv_at_risk,
+    count(estimated_clv) as clv_count,
+    current_timestamp as dbt_updated_at
+
+from periods
+group by churn_period_days, customer_segment, churn_risk_level
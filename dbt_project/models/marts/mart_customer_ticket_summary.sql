@@ -0,0 +1,40 @@
+-- models/marts/mart_customer_ticket_summary.sql
+-- Per-customer ticket counts - avoids joining dim_customers x fact_tickets per query
+
+{{
+    config(
+        materialized='materialized_view',
+        indexes=[
+            {'columns': ['customer_uuid'], 'unique': True}
+        ],
+        tags=['marts', 'customers', 'tickets']
+    )
+}}
+
+with customers as (
+    select customer_id, customer_uuid
+    from {{ source('analytics', 'dim_customers') }}
+),
+
+tickets as (
+    select
+        customer_id,
+        count(*) as ticket_count,
+        sum(case when ticket_status = 'open' then 1 else 0 end) as open_tickets,
+        min(created_date) as first_ticket_date,
+        max(created_date) as last_ticket_date
+    -- stg_tickets lowercases ticket_status ('Open' in the source table)
+    from {{ ref('stg_tickets') }}
+    group by customer_id
+)
+
+select
+    c.customer_uuid,
+    t.ticket_count,
+    t.open_tickets,
+    t.first_ticket_date,
+    t.last_ticket_date,
+    current_timestamp as dbt_updated_at
+
+from tickets t
+join customers c on t.customer_id = c.customer_id
@@ -1,9 +1,16 @@
 -- models/marts/mart_top_root_causes.sql
 -- Aggregated root causes by time period - Powers the kpi.top_root_causes tool
+-- Indexes match its WHERE created_year/created_month ORDER BY total_tickets DESC LIMIT n
+-- and the per-root-cause (year, month) range read by get_root_cause_trend
 
 {{
     config(
         materialized='table',
+        indexes=[
+            {'columns': ['created_year', 'created_month', 'total_tickets desc']},
+            {'columns': ['created_year', 'root_cause_severity', 'total_tickets desc']},
+            {'columns': ['root_cause_name', 'created_year', 'created_month']}
+        ],
         tags=['marts', 'kpi', 'root_causes']
     )
 }}
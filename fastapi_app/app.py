@@ -2,13 +2,17 @@
 dBank Support Copilot - FastAPI RAG System
 Always streams responses using OpenAI GPT-4o-mini
 """
+import gc
 import os
 import json
 import time
 import asyncio
 import traceback
-from typing import AsyncGenerator
-from contextlib import asynccontextmanager
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
+from contextlib import aclosing, asynccontextmanager
+
+import msgspec
+import numpy as np
 
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.responses import StreamingResponse
@@ -19,6 +23,14 @@ from .models.schemas import AskRequest, HealthCheck
 from .core.llm_client import get_llm_client
 from .core.tool_orchestrator import ToolOrchestrator
 from .core.conversation import get_conversation_manager
+from .core.semantic_cache import get_semantic_cache, cache_namespace, is_time_relative
+from .core.router import route_question, answer_token_budget, is_past_citation
+from .prompts import system_prompts
+from .prompts.system_prompts import (
+    USE_MIN_PROMPT,
+    prompt_token_counts,
+    select_system_prompt,
+)
 
 load_dotenv()
 
@@ -71,6 +83,9 @@ async def lifespan(app: FastAPI):
     print("=" * 60)
     print(f"   Model: OpenAI GPT-4o-mini")
     print(f"   Streaming: Always Enabled")
+    print(f"   Prompt Version: {system_prompts.PROMPT_VERSION}")
+    token_counts = prompt_token_counts()
+    print(f"   Prompt Tokens: full={token_counts['full']} min={token_counts['min']} (using {'min' if USE_MIN_PROMPT else 'full'})")
     print(f"   MCP Server: {os.getenv('MCP_SERVER_URL', 'http://localhost:8000')}")
     
     # Initialize components
@@ -79,8 +94,9 @@ async def lifespan(app: FastAPI):
         mcp_server_url=os.getenv("MCP_SERVER_URL", "http://localhost:8000")
     )
     app.state.conversation_manager = get_conversation_manager()
+    app.state.semantic_cache = get_semantic_cache()
     
-    # Health check
+    # Health check (also warms the MCP connection pool before the first request)
     mcp_healthy = await app.state.tool_orchestrator.health_check()
     if not mcp_healthy:
         print("⚠️  Warning: MCP Server not responding")
@@ -151,7 +167,8 @@ async def health_check(request: Request):
         status=status,
         mcp_server=mcp_healthy,
         llm_client=llm_healthy,
-        vector_store=vector_healthy
+        vector_store=vector_healthy,
+        prompt_version=system_prompts.PROMPT_VERSION
     )
 
 
@@ -160,16 +177,20 @@ async def process_question_stream(
     question: str,
     conversation_id: str,
     user_id: str,
-    max_tokens: int
+    max_tokens: int,
+    cache_key: Optional[Tuple[str, np.ndarray]] = None
 ) -> AsyncGenerator[str, None]:
     """
     Process support question with streaming response
     
-    Yields JSON chunks in Server-Sent Events format
+    Yields JSON chunks in Server-Sent Events format. When cache_key is given,
+    the answer is stored in the semantic cache once it completes cleanly.
     """
     start_time = time.time()
     accumulated_text = ""
     executed_tools = []
+    replay_events: List[Dict[str, Any]] = []
+    had_error = False
     
     try:
         # Get components
@@ -202,20 +223,30 @@ async def process_question_stream(
         
         print(f"Messages to LLM: {json.dumps(messages, indent=2)}\n")
         
-        # Get tool definitions
-        tools = tool_orchestrator.get_tool_definitions()
+        # Get tool definitions (prebuilt OpenAI tools array)
+        tools = tool_orchestrator.get_tools_spec()
+        
+        # Only send the prompt sections this question needs
+        system_prompt = select_system_prompt(question)
+        
+        # Bound the final answer length by intent (SQL writing gets more room)
+        answer_max_tokens = answer_token_budget(question, max_tokens)
         
         # Initial status
         yield f"data: {safe_json_dumps({'type': 'status', 'content': 'Analyzing your question...'})}\n\n"
         await asyncio.sleep(0)  # Force flush
         
-        # First pass: Get LLM response with potential tool calls
-        response = await llm_client.generate(
-            messages=messages,
-            tools=tools,
-            max_tokens=max_tokens,
-            temperature=0.3  # Lower temperature for consistent support answers
-        )
+        # First pass: deterministic routing for unambiguous KPI questions,
+        # otherwise let the LLM choose tools
+        response = route_question(question)
+        if response is None:
+            response = await llm_client.generate(
+                messages=messages,
+                tools=tools,
+                max_tokens=max_tokens,
+                temperature=0.3,  # Lower temperature for consistent support answers
+                system_prompt=system_prompt
+            )
         
         print(f"Response from LLM: {response}\n")
         
@@ -233,6 +264,7 @@ async def process_question_stream(
             )
             
             print(f"Tools executed: {len(executed_tools)}\n")
+            had_error = any(tc.error for tc in executed_tools)
             
             # Emit tool call events
             for tool_call in executed_tools:
@@ -246,6 +278,7 @@ async def process_question_stream(
                         "error": getattr(tool_call, 'error', None)
                     }
                 }
+                replay_events.append(tool_data)
                 yield f"data: {safe_json_dumps(tool_data)}\n\n"
                 await asyncio.sleep(0)
             
@@ -277,46 +310,58 @@ async def process_question_stream(
             
             # Stream final response
             try:
-                async for chunk in llm_client.stream(
+                async with aclosing(llm_client.stream(
                     messages=messages,
                     tools=None,  # No more tool calls
-                    max_tokens=max_tokens,
-                    temperature=0.3
-                ):
-                    if chunk["type"] == "text":
-                        # Validate chunk content
-                        if chunk.get("content") is None:
-                            print("WARNING: Received null content chunk")
-                            continue
-                        
-                        # Ensure content is string
-                        content = str(chunk["content"])
-                        accumulated_text += content
-                        
-                        # Send text chunk
-                        yield f"data: {safe_json_dumps({'type': 'text', 'content': content})}\n\n"
-                        await asyncio.sleep(0)
-                        
-                    elif chunk["type"] == "done":
-                        print("LLM stream finished successfully")
-                        break
-                        
+                    max_tokens=answer_max_tokens,
+                    temperature=0.3,
+                    system_prompt=system_prompt
+                )) as chunks:
+                    async for chunk in chunks:
+                        if chunk["type"] == "text":
+                            # Validate chunk content
+                            if chunk.get("content") is None:
+                                print("WARNING: Received null content chunk")
+                                continue
+                            
+                            # Ensure content is string
+                            content = str(chunk["content"])
+                            accumulated_text += content
+                            
+                            # Send text chunk
+                            yield f"data: {safe_json_dumps({'type': 'text', 'content': content})}\n\n"
+                            await asyncio.sleep(0)
+                            
+                            # Nothing useful follows the citation; stop decoding
+                            if is_past_citation(accumulated_text):
+                                print("Citation emitted, stopping stream early")
+                                break
+                            
+                        elif chunk["type"] == "done":
+                            print("LLM stream finished successfully")
+                            break
+                            
             except Exception as e:
                 error_msg = f"Streaming error: {str(e)}"
                 print(f"ERROR during streaming: {error_msg}")
                 traceback.print_exc()
                 
                 # Send error to client
+                had_error = True
                 yield f"data: {safe_json_dumps({'type': 'error', 'content': error_msg})}\n\n"
                 await asyncio.sleep(0)
             
+            replay_events.append({'type': 'text', 'content': accumulated_text})
+            
             # Extract citations if available
             try:
                 citations = tool_orchestrator.extract_citations(executed_tools)
                 
                 # Emit citations
                 for citation in citations:
-                    yield f"data: {safe_json_dumps({'type': 'citation', 'data': citation.model_dump()})}\n\n"
+                    citation_data = {'type': 'citation', 'data': msgspec.structs.asdict(citation)}
+                    replay_events.append(citation_data)
+                    yield f"data: {safe_json_dumps(citation_data)}\n\n"
                     await asyncio.sleep(0)
             except Exception as e:
                 print(f"Warning: Could not extract citations: {e}")
@@ -336,39 +381,49 @@ async def process_question_stream(
             print("No tool calls, streaming direct response...\n")
             
             try:
-                async for chunk in llm_client.stream(
+                async with aclosing(llm_client.stream(
                     messages=messages,
                     tools=None,
-                    max_tokens=max_tokens,
-                    temperature=0.3
-                ):
-                    if chunk["type"] == "text":
-                        # Validate chunk content
-                        if chunk.get("content") is None:
-                            print("WARNING: Received null content chunk")
-                            continue
-                        
-                        # Ensure content is string
-                        content = str(chunk["content"])
-                        accumulated_text += content
-                        
-                        # Send text chunk
-                        yield f"data: {safe_json_dumps({'type': 'text', 'content': content})}\n\n"
-                        await asyncio.sleep(0)
-                        
-                    elif chunk["type"] == "done":
-                        print("LLM stream finished successfully")
-                        break
-                        
+                    max_tokens=answer_max_tokens,
+                    temperature=0.3,
+                    system_prompt=system_prompt
+                )) as chunks:
+                    async for chunk in chunks:
+                        if chunk["type"] == "text":
+                            # Validate chunk content
+                            if chunk.get("content") is None:
+                                print("WARNING: Received null content chunk")
+                                continue
+                            
+                            # Ensure content is string
+                            content = str(chunk["content"])
+                            accumulated_text += content
+                            
+                            # Send text chunk
+                            yield f"data: {safe_json_dumps({'type': 'text', 'content': content})}\n\n"
+                            await asyncio.sleep(0)
+                            
+                            # Nothing useful follows the citation; stop decoding
+                            if is_past_citation(accumulated_text):
+                                print("Citation emitted, stopping stream early")
+                                break
+                            
+                        elif chunk["type"] == "done":
+                            print("LLM stream finished successfully")
+                            break
+                            
             except Exception as e:
                 error_msg = f"Streaming error: {str(e)}"
                 print(f"ERROR during streaming: {error_msg}")
                 traceback.print_exc()
                 
                 # Send error to client
+                had_error = True
                 yield f"data: {safe_json_dumps({'type': 'error', 'content': error_msg})}\n\n"
                 await asyncio.sleep(0)
             
+            replay_events.append({'type': 'text', 'content': accumulated_text})
+            
             # Save assistant message
             conversation_manager.add_message(
                 conversation_id=conversation_id,
@@ -376,6 +431,11 @@ async def process_question_stream(
                 content=accumulated_text
             )
         
+        # Cache clean answers for near-duplicate questions
+        if cache_key and accumulated_text and not had_error:
+            namespace, embedding = cache_key
+            request.app.state.semantic_cache.store(namespace, question, embedding, replay_events)
+        
         # Send completion event
         response_time = time.time() - start_time
         print(f"Stream completed in {response_time:.2f}s\n")
@@ -397,6 +457,44 @@ async def process_question_stream(
         await asyncio.sleep(0)
 
 
+async def replay_cached_answer(
+    request: Request,
+    question: str,
+    conversation_id: str,
+    events: List[Dict[str, Any]]
+) -> AsyncGenerator[str, None]:
+    """
+    Stream a semantically cached answer in the same SSE format
+    """
+    start_time = time.time()
+    conversation_manager = request.app.state.conversation_manager
+    
+    conversation_manager.add_message(
+        conversation_id=conversation_id,
+        role="user",
+        content=question
+    )
+    
+    answer = ""
+    tool_calls_count = 0
+    for event in events:
+        if event["type"] == "text":
+            answer += event["content"]
+        elif event["type"] == "tool_call":
+            tool_calls_count += 1
+        yield f"data: {safe_json_dumps(event)}\n\n"
+        await asyncio.sleep(0)
+    
+    conversation_manager.add_message(
+        conversation_id=conversation_id,
+        role="assistant",
+        content=answer
+    )
+    
+    response_time = time.time() - start_time
+    yield f"data: {safe_json_dumps({'type': 'done', 'data': {'response_time': response_time, 'conversation_id': conversation_id, 'tool_calls_count': tool_calls_count, 'cached': True}})}\n\n"
+
+
 @app.post("/ask")
 async def ask_question(request: Request, ask_request: AskRequest):
     """
@@ -404,6 +502,25 @@ async def ask_question(request: Request, ask_request: AskRequest):
     
     Always streams responses for better UX
     """
+    headers = {
+        "Cache-Control": "no-cache",
+        "Connection": "keep-alive",
+        "X-Accel-Buffering": "no"  # Disable nginx buffering
+    }
+    
+    # Semantic cache applies to first-turn questions only (no prior context) and
+    # skips relative periods ("last month"), whose answers change with the date
+    cache_key = None
+    cached_events = None
+    if not ask_request.conversation_id and not is_time_relative(ask_request.question):
+        try:
+            semantic_cache = request.app.state.semantic_cache
+            namespace = cache_namespace(select_system_prompt(ask_request.question), ask_request.user_role)
+            embedding = await semantic_cache.embed(ask_request.question)
+            cache_key = (namespace, embedding)
+            cached_events = semantic_cache.lookup(namespace, embedding)
+        except Exception as e:
+            print(f"Warning: Semantic cache unavailable: {e}")
     
     # Generate conversation ID if not provided
     conversation_id = ask_request.conversation_id
@@ -413,6 +530,18 @@ async def ask_question(request: Request, ask_request: AskRequest):
             metadata={"source": "dbank_support_api"}
         )
     
+    if cached_events is not None:
+        return StreamingResponse(
+            replay_cached_answer(
+                request=request,
+                question=ask_request.question,
+                conversation_id=conversation_id,
+                events=cached_events
+            ),
+            media_type="text/event-stream",
+            headers={**headers, "x-cache": "HIT"}
+        )
+    
     # Always stream (ignoring stream parameter)
     return StreamingResponse(
         process_question_stream(
@@ -420,14 +549,11 @@ async def ask_question(request: Request, ask_request: AskRequest):
             question=ask_request.question,
             conversation_id=conversation_id,
             user_id=ask_request.user_id or "anonymous",
-            max_tokens=ask_request.max_tokens
+            max_tokens=ask_request.max_tokens,
+            cache_key=cache_key
         ),
         media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no"  # Disable nginx buffering
-        }
+        headers={**headers, "x-cache": "MISS"}
     )
 
 
@@ -497,6 +623,11 @@ async def list_tools(request: Request):
     }
 
 
+# Keep import-time objects (schemas, tool definitions) out of GC scans so
+# workers forked by `gunicorn --preload` don't dirty the pages they share
+gc.freeze()
+
+
 if __name__ == "__main__":
     import uvicorn
     
@@ -2,10 +2,11 @@
 Conversation Manager - Handles conversation context and history
 """
 import uuid
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Union
 from datetime import datetime, timedelta
 
 from ..models.schemas import Conversation, Message, ToolCall, Citation
+from ..models._fast import ToolCallFast, CitationFast, to_tool_call, to_citation
 
 
 class ConversationManager:
@@ -75,8 +76,8 @@ class ConversationManager:
         conversation_id: str,
         role: str,
         content: str,
-        tool_calls: Optional[List[ToolCall]] = None,
-        citations: Optional[List[Citation]] = None
+        tool_calls: Optional[List[Union[ToolCall, ToolCallFast]]] = None,
+        citations: Optional[List[Union[Citation, CitationFast]]] = None
     ) -> Message:
         """
         Add a message to conversation
@@ -98,6 +99,18 @@ class ConversationManager:
             self.create_conversation()
             conversation = self.conversations[conversation_id]
         
+        # Orchestrator results are msgspec structs; convert at the storage boundary
+        if tool_calls:
+            tool_calls = [
+                to_tool_call(tc) if isinstance(tc, ToolCallFast) else tc
+                for tc in tool_calls
+            ]
+        if citations:
+            citations = [
+                to_citation(c) if isinstance(c, CitationFast) else c
+                for c in citations
+            ]
+        
         message = Message(
             role=role,
             content=content,
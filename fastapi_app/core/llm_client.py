@@ -3,17 +3,25 @@ LLM Client - OpenAI GPT-4o-mini for dBank Support Copilot
 """
 import os
 import json
+from functools import lru_cache
 from typing import List, Dict, Any, Optional, AsyncGenerator
 
 import openai
 from openai import AsyncOpenAI
 from dotenv import load_dotenv
 
-from ..prompts.system_prompts import DBANK_SYSTEM_PROMPT
+from ..prompts import system_prompts
+from ..prompts.system_prompts import prompt_version
 
 load_dotenv()
 
 
+@lru_cache(maxsize=1)
+def _system_message() -> Dict[str, str]:
+    """Shared system message, built on the first request rather than at import"""
+    return {"role": "system", "content": system_prompts.DBANK_SYSTEM_PROMPT}
+
+
 class OpenAIClient:
     """OpenAI client for dBank support copilot"""
     
@@ -41,6 +49,10 @@ class OpenAIClient:
         if not tools:
             return None
         
+        # Already in OpenAI format (e.g. ToolOrchestrator.get_tools_spec())
+        if tools[0].get("type") == "function":
+            return tools
+        
         openai_tools = []
         for tool in tools:
             openai_tools.append({
@@ -53,12 +65,21 @@ class OpenAIClient:
             })
         return openai_tools
     
+    def _prompt_cache_params(self, system_prompt: Optional[str]) -> Dict[str, Any]:
+        """Tag the request with the prompt version so provider-side prompt caching stays keyed"""
+        version = prompt_version(system_prompt or system_prompts.DBANK_SYSTEM_PROMPT)
+        return {
+            "extra_headers": {"X-Prompt-Version": version},
+            "extra_body": {"prompt_cache_key": f"dbank-{version}"}
+        }
+    
     async def generate(
         self,
         messages: List[Dict[str, str]],
         tools: Optional[List[Dict]] = None,
         max_tokens: int = 2000,
-        temperature: float = 0.3  # Lower for more consistent support answers
+        temperature: float = 0.3,  # Lower for more consistent support answers
+        system_prompt: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Generate a response using OpenAI
@@ -68,13 +89,16 @@ class OpenAIClient:
             tools: Available tools
             max_tokens: Maximum tokens in response
             temperature: Sampling temperature (0.3 for support use case)
+            system_prompt: Prompt variant to send (defaults to the full prompt)
         
         Returns:
             Response with content and tool calls
         """
         
         # Prepare messages with system prompt
-        formatted_messages = [{"role": "system", "content": DBANK_SYSTEM_PROMPT}]
+        formatted_messages = [
+            {"role": "system", "content": system_prompt} if system_prompt else _system_message()
+        ]
         formatted_messages.extend(messages)
         
         # Prepare request
@@ -82,7 +106,8 @@ class OpenAIClient:
             "model": self.model,
             "messages": formatted_messages,
             "max_tokens": max_tokens,
-            "temperature": temperature
+            "temperature": temperature,
+            **self._prompt_cache_params(system_prompt)
         }
         
         # Add tools if provided
@@ -123,7 +148,8 @@ class OpenAIClient:
         messages: List[Dict[str, str]],
         tools: Optional[List[Dict]] = None,
         max_tokens: int = 2000,
-        temperature: float = 0.3
+        temperature: float = 0.3,
+        system_prompt: Optional[str] = None
     ) -> AsyncGenerator[Dict[str, Any], None]:
         """
         Stream a response using OpenAI
@@ -133,13 +159,16 @@ class OpenAIClient:
             tools: Available tools
             max_tokens: Maximum tokens
             temperature: Sampling temperature
+            system_prompt: Prompt variant to send (defaults to the full prompt)
         
         Yields:
             Response chunks
         """
         
         # Prepare messages with system prompt
-        formatted_messages = [{"role": "system", "content": DBANK_SYSTEM_PROMPT}]
+        formatted_messages = [
+            {"role": "system", "content": system_prompt} if system_prompt else _system_message()
+        ]
         formatted_messages.extend(messages)
         
         # Prepare request
@@ -148,7 +177,8 @@ class OpenAIClient:
             "messages": formatted_messages,
             "max_tokens": max_tokens,
             "temperature": temperature,
-            "stream": True
+            "stream": True,
+            **self._prompt_cache_params(system_prompt)
         }
         
         # Add tools if provided
@@ -161,56 +191,61 @@ class OpenAIClient:
         
         tool_calls_buffer = {}  # Buffer for tool calls
         
-        async for chunk in stream:
-            if not chunk.choices:
-                continue
-                
-            delta = chunk.choices[0].delta
-            
-            # Text content
-            if delta.content:
-                yield {
-                    "type": "text",
-                    "content": delta.content
-                }
-            
-            # Tool calls
-            if delta.tool_calls:
-                for tool_call in delta.tool_calls:
-                    idx = tool_call.index
-                    
-                    if idx not in tool_calls_buffer:
-                        tool_calls_buffer[idx] = {
-                            "id": "",
-                            "name": "",
-                            "arguments": ""
-                        }
+        # Closed in finally: a consumer that stops early (e.g. after the
+        # citation) must not leave the HTTP response open
+        try:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
                     
-                    if tool_call.id:
-                        tool_calls_buffer[idx]["id"] = tool_call.id
-                    
-                    if tool_call.function:
-                        if tool_call.function.name:
-                            tool_calls_buffer[idx]["name"] = tool_call.function.name
-                        if tool_call.function.arguments:
-                            tool_calls_buffer[idx]["arguments"] += tool_call.function.arguments
-            
-            # End of stream
-            if chunk.choices[0].finish_reason:
-                # Emit completed tool calls
-                for tool_call in tool_calls_buffer.values():
-                    if tool_call["name"]:
-                        yield {
-                            "type": "tool_call",
-                            "id": tool_call["id"],
-                            "name": tool_call["name"],
-                            "arguments": json.loads(tool_call["arguments"]) if tool_call["arguments"] else {}
-                        }
+                delta = chunk.choices[0].delta
                 
-                yield {
-                    "type": "done",
-                    "finish_reason": chunk.choices[0].finish_reason
-                }
+                # Text content
+                if delta.content:
+                    yield {
+                        "type": "text",
+                        "content": delta.content
+                    }
+                
+                # Tool calls
+                if delta.tool_calls:
+                    for tool_call in delta.tool_calls:
+                        idx = tool_call.index
+                        
+                        if idx not in tool_calls_buffer:
+                            tool_calls_buffer[idx] = {
+                                "id": "",
+                                "name": "",
+                                "arguments": ""
+                            }
+                        
+                        if tool_call.id:
+                            tool_calls_buffer[idx]["id"] = tool_call.id
+                        
+                        if tool_call.function:
+                            if tool_call.function.name:
+                                tool_calls_buffer[idx]["name"] = tool_call.function.name
+                            if tool_call.function.arguments:
+                                tool_calls_buffer[idx]["arguments"] += tool_call.function.arguments
+                
+                # End of stream
+                if chunk.choices[0].finish_reason:
+                    # Emit completed tool calls
+                    for tool_call in tool_calls_buffer.values():
+                        if tool_call["name"]:
+                            yield {
+                                "type": "tool_call",
+                                "id": tool_call["id"],
+                                "name": tool_call["name"],
+                                "arguments": json.loads(tool_call["arguments"]) if tool_call["arguments"] else {}
+                            }
+                    
+                    yield {
+                        "type": "done",
+                        "finish_reason": chunk.choices[0].finish_reason
+                    }
+        finally:
+            await stream.close()
 
 
 def get_llm_client() -> OpenAIClient:
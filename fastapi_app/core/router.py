@@ -0,0 +1,130 @@
+"""
+Question Router - Deterministic tool selection for common support questions
+
+Unambiguous KPI questions ("top 5 root causes last month") are mapped straight to
+a tool call, skipping the tool-selection LLM round-trip. Anything else returns
+None and goes through the LLM as before.
+"""
+import re
+import calendar
+from datetime import date
+from typing import Any, Dict, Optional
+
+
+_TOP_ROOT_CAUSES = re.compile(r"\btop\s+(?:(\d{1,2})\s+)?root[\s-]*causes?\b", re.IGNORECASE)
+_LAST_MONTH = re.compile(r"\b(?:last|previous|past)\s+month\b", re.IGNORECASE)
+_THIS_MONTH = re.compile(r"\b(?:this|current)\s+month\b", re.IGNORECASE)
+_MONTH_YEAR = re.compile(
+    r"\b(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?\s+(\d{4})\b",
+    re.IGNORECASE
+)
+# Not the YYYY-MM prefix of a full YYYY-MM-DD date
+_ISO_MONTH = re.compile(r"\b(\d{4})-(\d{2})\b(?!-\d)")
+_CATEGORY = re.compile(r"\b(digital saving|digital lending|payment)s?\b", re.IGNORECASE)
+
+# Follow-up analysis the KPI tool alone can't answer; leave these to the LLM
+_AMBIGUOUS = re.compile(
+    r"\b(compare|versus|vs\.?|trend|why|sql|query|churn|spike|customers?|v1\.2)\b",
+    re.IGNORECASE
+)
+
+_SQL_WRITING = re.compile(r"\b(write|show|give|generate)\b.*\bsql\b|\bselect\b.+\bfrom\b", re.IGNORECASE | re.DOTALL)
+
+# Output token budgets; decode time grows linearly with answer length
+ANSWER_MAX_TOKENS = 350
+SQL_ANSWER_MAX_TOKENS = 800
+
+_MONTHS = {name.lower(): i for i, name in enumerate(calendar.month_abbr) if name}
+_CATEGORY_NAMES = {
+    "digital saving": "Digital Saving",
+    "digital lending": "Digital Lending",
+    "payment": "Payment",
+}
+
+
+def _month_range(year: int, month: int) -> Dict[str, str]:
+    """First and last day of a month as YYYY-MM-DD strings"""
+    last_day = calendar.monthrange(year, month)[1]
+    return {
+        "start_date": date(year, month, 1).isoformat(),
+        "end_date": date(year, month, last_day).isoformat(),
+    }
+
+
+def _resolve_period(question: str, today: date) -> Optional[Dict[str, str]]:
+    """Extract an explicit calendar month from the question"""
+    if _LAST_MONTH.search(question):
+        year, month = (today.year, today.month - 1) if today.month > 1 else (today.year - 1, 12)
+        return _month_range(year, month)
+
+    if _THIS_MONTH.search(question):
+        return _month_range(today.year, today.month)
+
+    match = _MONTH_YEAR.search(question)
+    if match:
+        return _month_range(int(match.group(2)), _MONTHS[match.group(1).lower()])
+
+    match = _ISO_MONTH.search(question)
+    if match and 1 <= int(match.group(2)) <= 12:
+        return _month_range(int(match.group(1)), int(match.group(2)))
+
+    return None
+
+
+def route_question(question: str, today: Optional[date] = None) -> Optional[Dict[str, Any]]:
+    """
+    Map a question to a tool call without asking the LLM
+
+    Args:
+        question: User question
+        today: Reference date for relative periods (defaults to today)
+
+    Returns:
+        Response dict shaped like OpenAIClient.generate() output, or None
+        when the question should go to the LLM
+    """
+    match = _TOP_ROOT_CAUSES.search(question)
+    if not match or _AMBIGUOUS.search(question):
+        return None
+
+    period = _resolve_period(question, today or date.today())
+    if not period:
+        return None
+
+    arguments: Dict[str, Any] = dict(period)
+    arguments["top_n"] = min(int(match.group(1)), 20) if match.group(1) else 5
+
+    category = _CATEGORY.search(question)
+    if category:
+        arguments["category"] = _CATEGORY_NAMES[category.group(1).lower()]
+
+    return {
+        "content": "",
+        "tool_calls": [{
+            "id": "route_kpi_top_root_causes",
+            "name": "kpi_top_root_causes",
+            "arguments": arguments
+        }],
+        "finish_reason": "routed"
+    }
+
+
+def answer_token_budget(question: str, requested: int) -> int:
+    """
+    Cap output tokens for the final answer by intent
+
+    Args:
+        question: User question
+        requested: max_tokens requested by the client
+
+    Returns:
+        The smaller of the request and the intent budget (800 for SQL writing, else 350)
+    """
+    budget = SQL_ANSWER_MAX_TOKENS if _SQL_WRITING.search(question) else ANSWER_MAX_TOKENS
+    return min(requested, budget)
+
+
+def is_past_citation(text: str) -> bool:
+    """True once a [Source: ...] block has been followed by a new paragraph"""
+    idx = text.rfind("[Source:")
+    return idx != -1 and "\n\n" in text[idx:]
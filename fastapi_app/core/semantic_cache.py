@@ -0,0 +1,147 @@
+"""
+Semantic Cache - Reuses answers for near-duplicate support questions
+"""
+import re
+import time
+import asyncio
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from ..prompts.system_prompts import prompt_version
+
+
+# Cosine similarity above which two questions are treated as the same question
+SIMILARITY_THRESHOLD = 0.92
+
+# KPI answers go stale quickly; documentation/schema answers do not
+KPI_TTL_SECONDS = 15 * 60
+REFERENCE_TTL_SECONDS = 24 * 60 * 60
+
+_REFERENCE_HINTS = re.compile(
+    r"^\s*(what is|what are|what does|how (do|to|does|can)|explain|describe|define)\b|\bschema\b",
+    re.IGNORECASE
+)
+
+# Periods relative to today ("last month", "yesterday"); a similar question
+# asked in another period needs a different answer
+_RELATIVE_DATE = re.compile(
+    r"\b(today|yesterday|tomorrow|recent(ly)?|latest|so far|to date|[ym]td|"
+    r"(this|last|previous|past|next|current)\s+(\d+\s+)?(days?|weeks?|months?|quarters?|years?))\b",
+    re.IGNORECASE
+)
+
+
+def cache_namespace(system_prompt: str, user_role: Optional[str] = None) -> str:
+    """Cache namespace for a system prompt variant and requester role; prompt edits invalidate entries"""
+    return f"{prompt_version(system_prompt)}:{user_role or 'default'}"
+
+
+def is_time_relative(question: str) -> bool:
+    """True if the question names a period relative to today (not served from cache)"""
+    return bool(_RELATIVE_DATE.search(question))
+
+
+class SemanticCache:
+    """In-memory cache of streamed answers keyed by question embedding"""
+
+    def __init__(
+        self,
+        threshold: float = SIMILARITY_THRESHOLD,
+        max_entries: int = 1000,
+        model_name: str = "all-MiniLM-L6-v2"
+    ):
+        """
+        Initialize semantic cache
+
+        Args:
+            threshold: Minimum cosine similarity for a hit
+            max_entries: Maximum cached answers per namespace
+            model_name: Sentence-transformers model used for embeddings (384-dim)
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.model_name = model_name
+        self._model = None
+        self._entries: Dict[str, List[Dict[str, Any]]] = {}
+
+    def _encode(self, text: str) -> np.ndarray:
+        """Embed text with a normalized vector (runs in a worker thread)"""
+        if self._model is None:
+            from sentence_transformers import SentenceTransformer
+            self._model = SentenceTransformer(self.model_name)
+        return self._model.encode(text, normalize_embeddings=True).astype(np.float32)
+
+    async def embed(self, text: str) -> np.ndarray:
+        """Embed a question without blocking the event loop"""
+        return await asyncio.to_thread(self._encode, text)
+
+    @staticmethod
+    def ttl_for(question: str) -> int:
+        """TTL in seconds for an answer to this question"""
+        if _REFERENCE_HINTS.search(question):
+            return REFERENCE_TTL_SECONDS
+        return KPI_TTL_SECONDS
+
+    def lookup(self, namespace: str, embedding: np.ndarray) -> Optional[List[Dict[str, Any]]]:
+        """
+        Find a cached answer for a similar question
+
+        Args:
+            namespace: Namespace from cache_namespace()
+            embedding: Normalized question embedding
+
+        Returns:
+            Cached SSE event payloads, or None on a miss
+        """
+        entries = self._entries.get(namespace)
+        if not entries:
+            return None
+
+        now = time.time()
+        entries[:] = [e for e in entries if e["expires_at"] > now]
+        if not entries:
+            return None
+
+        scores = np.stack([e["embedding"] for e in entries]) @ embedding
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+
+        return entries[best]["events"]
+
+    def store(
+        self,
+        namespace: str,
+        question: str,
+        embedding: np.ndarray,
+        events: List[Dict[str, Any]]
+    ):
+        """
+        Cache the events emitted for a question
+
+        Args:
+            namespace: Namespace from cache_namespace()
+            question: Original question (decides the TTL)
+            embedding: Normalized question embedding
+            events: SSE event payloads to replay on a hit
+        """
+        entries = self._entries.setdefault(namespace, [])
+        entries.append({
+            "embedding": embedding,
+            "events": events,
+            "expires_at": time.time() + self.ttl_for(question)
+        })
+
+        # Drop oldest entries beyond capacity
+        if len(entries) > self.max_entries:
+            del entries[:len(entries) - self.max_entries]
+
+
+# Global semantic cache instance
+semantic_cache = SemanticCache()
+
+
+def get_semantic_cache() -> SemanticCache:
+    """Get the global semantic cache instance"""
+    return semantic_cache
@@ -1,19 +1,262 @@
 """
 Tool Orchestrator - Manages MCP tool calls for dBank Support Copilot
 """
+import asyncio
 import httpx
+import re
 import time
-from typing import Dict, Any, List, Optional
-from datetime import datetime
+import fastjsonschema
+from typing import Dict, Any, List, Optional, Tuple
+from datetime import date
+
+from ..models._fast import ToolCallFast, CitationFast
+from ..prompts.system_prompts import ALLOWED_TABLES, SCHEMA
+
+
+_TOOL_DEFINITIONS: List[Dict[str, Any]] = [
+    {
+        "name": "sql_query",
+        "description": """Execute read-only SQL queries on the dBank analytics warehouse. 
+        Use for analyzing tickets, customers, login patterns, and product data. 
+        Tables and columns are listed under Canonical Database Schema in the system prompt; 
+        references to anything else are rejected before execution.
+        All queries are logged. PII is automatically masked (email, phone, names, national IDs) before
+        results are returned, so it is safe to query any table including those with PII fields.""",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "SQL query to execute. Must be SELECT only (read-only), with schema-qualified table names (e.g. analytics.fact_tickets)."
+                },
+                "queries": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "minItems": 1,
+                    "description": "Several related SELECT queries to run together in one database round-trip. Use instead of 'query' when you need multiple SELECTs."
+                },
+                "limit": {
+                    "type": "integer",
+                    "description": "Maximum number of rows to return (default: 100, max: 1000)",
+                    "default": 100
+                }
+            },
+            "required": []
+        }
+    },
+    {
+        "name": "kb_search",
+        "description": """Semantic search over the dBank knowledge base: product documentation, FAQ, known issues, 
+        policies, release notes, and troubleshooting guides. Use when users ask about 
+        'what is', 'how to', 'known issues', or need documentation.""",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "Search query for knowledge base (e.g., 'Digital Lending approval delays', 'app v1.2 known issues')"
+                },
+                "top_k": {
+                    "type": "integer",
+                    "description": "Number of results to return (default: 5, max: 20)",
+                    "default": 5
+                }
+            },
+            "required": ["query"]
+        }
+    },
+    {
+        # Use function-name-safe identifier (no dots) for model function calling
+        "name": "kpi_top_root_causes",
+        "description": """Pre-aggregated KPI endpoint (fastest): top root causes of support tickets by category 
+        with percentage of open tickets, counts and trends. Use for root cause analysis, pattern identification, 
+        and periodic reports (daily, weekly, monthly).""",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "start_date": {
+                    "type": "string",
+                    "description": "Start date for analysis (YYYY-MM-DD format)",
+                    "pattern": "^\\d{4}-\\d{2}-\\d{2}$"
+                },
+                "end_date": {
+                    "type": "string",
+                    "description": "End date for analysis (YYYY-MM-DD format)",
+                    "pattern": "^\\d{4}-\\d{2}-\\d{2}$"
+                },
+                "category": {
+                    "type": "string",
+                    "description": "Optional: Filter by product category (e.g., 'Digital Saving', 'Digital Lending', 'Payment')"
+                },
+                "top_n": {
+                    "type": "integer",
+                    "description": "Number of top root causes to return (default: 5)",
+                    "default": 5
+                }
+            },
+            "required": ["start_date", "end_date"]
+        }
+    }
+]
+
+# OpenAI `tools=[...]` format, built once; the system prompt no longer describes the tools
+TOOLS_SPEC: List[Dict[str, Any]] = [
+    {"type": "function", "function": tool}
+    for tool in _TOOL_DEFINITIONS
+]
+
+# YYYY-MM-DD split into its components; date() then rejects month 13, day 32, Feb 30
+_YMD = re.compile(r"^(\d{4})-(\d{2})-(\d{2})$")
+
+
+def _year_month(value: Any) -> Optional[Tuple[int, int]]:
+    """(year, month) of a YYYY-MM-DD string, or None if it isn't a calendar date"""
+    match = _YMD.match(value) if isinstance(value, str) else None
+    if not match:
+        return None
+    try:
+        parsed = date(*map(int, match.groups()))
+    except ValueError:
+        return None
+    return parsed.year, parsed.month
+
+# Schema-qualified table references after FROM/JOIN; unqualified names (CTEs) are skipped.
+# FROM inside EXTRACT(...)/SUBSTRING(...) etc. and IS DISTINCT FROM refer to columns.
+_QUALIFIED_TABLE = re.compile(r"\b(?:FROM|JOIN)\s+([A-Za-z_]\w*\.[A-Za-z_]\w*)", re.IGNORECASE)
+# Comma-joined FROM lists ("FROM a.x ax, b.y"): the whole list, so every item is checked
+_FROM_ITEM = r"[A-Za-z_]\w*(?:\.[A-Za-z_]\w*)?(?:\s+(?:AS\s+)?[A-Za-z_]\w*)?"
+_FROM_LIST = re.compile(rf"\bFROM\s+({_FROM_ITEM}(?:\s*,\s*{_FROM_ITEM})+)", re.IGNORECASE)
+_QUALIFIED_NAME = re.compile(r"(?<![\w.])([A-Za-z_]\w*\.[A-Za-z_]\w*)")
+_NON_TABLE_FROM = re.compile(
+    r"\b(?:EXTRACT|SUBSTRING|TRIM|OVERLAY|POSITION)\s*\([^()]*\)|\bDISTINCT\s+FROM\b",
+    re.IGNORECASE
+)
+
+# Column checks against SCHEMA: string literals are blanked first so values
+# like 'user@example.com' are not read as alias.column references
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_TABLE_ALIAS = re.compile(
+    r"\b(?:FROM|JOIN)\s+([A-Za-z_]\w*\.[A-Za-z_]\w*)(?:\s+(?:AS\s+)?([A-Za-z_]\w*))?",
+    re.IGNORECASE
+)
+# Aliases of CTEs and subqueries; columns behind them are not checked
+_OPAQUE_ALIAS = re.compile(
+    r"\b(?:FROM|JOIN)\s+([A-Za-z_]\w*)\b(?!\s*\.)(?:\s+(?:AS\s+)?([A-Za-z_]\w*))?|\)\s+(?:AS\s+)?([A-Za-z_]\w*)",
+    re.IGNORECASE
+)
+_QUALIFIED_COLUMN = re.compile(r"(?<![\w.])([A-Za-z_]\w*)\.([A-Za-z_]\w*)\b(?!\s*[.(])")
+_SINGLE_TABLE_SELECT = re.compile(
+    r"^\s*SELECT\s+(?:DISTINCT\s+)?(.+?)\s+FROM\s+([A-Za-z_]\w*\.[A-Za-z_]\w*)\b(?!\s*,)(.*)$",
+    re.IGNORECASE | re.DOTALL
+)
+_BARE_COLUMN = re.compile(r"^([A-Za-z_]\w*)(?:\s+(?:AS\s+)?[A-Za-z_]\w*)?$", re.IGNORECASE)
+_NESTED_SQL = re.compile(r"\b(?:SELECT|FROM|JOIN)\b", re.IGNORECASE)
+_SQL_WORDS = frozenset({
+    "as", "on", "using", "where", "group", "order", "limit", "offset", "having", "window",
+    "join", "inner", "left", "right", "full", "cross", "natural", "lateral", "union",
+    "intersect", "except", "tablesample", "true", "false", "null", "current_date",
+    "current_timestamp", "localtimestamp",
+})
+
+_PII_NOTE = "All PII data is automatically masked for security"
+
+
+def _split_select_list(select_list: str) -> List[str]:
+    """Split a SELECT list on top-level commas"""
+    items, depth, start = [], 0, 0
+    for i, ch in enumerate(select_list):
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == "," and depth == 0:
+            items.append(select_list[start:i].strip())
+            start = i + 1
+    items.append(select_list[start:].strip())
+    return items
+
+
+def _referenced_tables(query: str) -> List[str]:
+    """Schema-qualified tables after FROM/JOIN, including every item of a comma-joined FROM list"""
+    text = _NON_TABLE_FROM.sub(" ", query)
+    tables = _QUALIFIED_TABLE.findall(text)
+    for from_list in _FROM_LIST.findall(text):
+        tables.extend(_QUALIFIED_NAME.findall(from_list))
+    return tables
+
+
+def _unknown_columns(query: str) -> List[str]:
+    """
+    Column references that do not exist in SCHEMA
+
+    Checks alias.column references whose alias is bound to a schema table, plus
+    the bare SELECT list of single-table queries. Anything that can't be
+    resolved without a full parser (CTEs, subqueries, select-list aliases) is
+    left to Postgres.
+    """
+    text = _NON_TABLE_FROM.sub(" ", _STRING_LITERAL.sub("''", query))
+    unknown = []
+
+    bindings: Dict[str, set] = {}
+    for table, alias in _TABLE_ALIAS.findall(text):
+        table = table.lower()
+        if table in SCHEMA:
+            bindings.setdefault(table.split(".", 1)[1], set()).add(table)
+            if alias and alias.lower() not in _SQL_WORDS:
+                bindings.setdefault(alias.lower(), set()).add(table)
+    opaque = {
+        name.lower()
+        for match in _OPAQUE_ALIAS.findall(text)
+        for name in match
+        if name and name.lower() not in _SQL_WORDS
+    }
+
+    for qualifier, column in _QUALIFIED_COLUMN.findall(text):
+        tables = bindings.get(qualifier.lower())
+        if not tables or qualifier.lower() in opaque:
+            continue
+        if not any(column.lower() in SCHEMA[table] for table in tables):
+            unknown.append(f"{qualifier}.{column}")
+
+    match = _SINGLE_TABLE_SELECT.match(text)
+    if match and not _NESTED_SQL.search(match.group(1)) and not _NESTED_SQL.search(match.group(3)):
+        table = match.group(2).lower()
+        columns = SCHEMA.get(table, {})
+        for item in _split_select_list(match.group(1)):
+            bare = _BARE_COLUMN.match(item)
+            if bare and columns:
+                name = bare.group(1).lower()
+                if name not in columns and name not in _SQL_WORDS:
+                    unknown.append(f"{table}.{bare.group(1)}")
+
+    return unknown
+
+# Compiled once at import so malformed LLM tool calls are rejected locally
+_VALIDATORS = {
+    tool["name"]: fastjsonschema.compile(tool["parameters"])
+    for tool in _TOOL_DEFINITIONS
+}
 
-from ..models.schemas import ToolCall, Citation
 
 class ToolOrchestrator:
     """Orchestrates calls to MCP server tools for dBank"""
     
     def __init__(self, mcp_server_url: str = "http://localhost:8000"):
         self.mcp_server_url = mcp_server_url.rstrip("/")
-        self.client = httpx.AsyncClient(timeout=60.0)  # Longer timeout for complex queries
+        # Single multiplexed pool to the MCP host; HTTP/2 is negotiated when served over TLS
+        self.client = httpx.AsyncClient(
+            base_url=self.mcp_server_url,
+            http2=True,
+            limits=httpx.Limits(
+                max_keepalive_connections=20,
+                max_connections=100,
+                keepalive_expiry=60.0,
+            ),
+            timeout=httpx.Timeout(60.0, connect=5.0),  # Longer timeout for complex queries
+        )
+        # Parsed once; absolute URLs skip base_url merging on every request
+        self._call_url = httpx.URL(f"{self.mcp_server_url}/tools/call")
+        self._health_url = httpx.URL(f"{self.mcp_server_url}/health")
     
     def get_tool_definitions(self) -> List[Dict[str, Any]]:
         """
@@ -21,99 +264,21 @@ class ToolOrchestrator:
         
         Returns tool schemas for OpenAI function calling
         """
-        return [
-            {
-                "name": "sql_query",
-                "description": """Execute read-only SQL queries on the dBank analytics warehouse. 
-                Use for analyzing tickets, customers, login patterns, and product data. 
-                Available tables: dim_customers, dim_products, dim_ticket_categories, dim_root_causes, dim_time, 
-                fact_tickets, fact_customer_products, fact_logins.
-                All queries are logged and PII is automatically masked.""",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "query": {
-                            "type": "string",
-                            "description": """SQL query to execute. Must be SELECT only (read-only).
-                            Tables available:
-                            - dim_customers: customer_id, name, email, segment, region, signup_date
-                            - dim_products: product_id, name, category, version
-                            - dim_ticket_categories: category_id, name
-                            - dim_root_causes: root_cause_id, description
-                            - dim_time: date_id, date, year, month, day
-                            - fact_tickets: ticket_id, customer_id, product_id, category_id, status, priority, root_cause_id, created_at, resolved_at
-                            - fact_customer_products: customer_id, product_id, subscribed_at
-                            - fact_logins: access_id, customer_id, login_date, device_type"""
-                        },
-                        "limit": {
-                            "type": "integer",
-                            "description": "Maximum number of rows to return (default: 100, max: 1000)",
-                            "default": 100
-                        }
-                    },
-                    "required": ["query"]
-                }
-            },
-            {
-                "name": "kb_search",
-                "description": """Search the dBank knowledge base for product documentation, known issues, 
-                policies, release notes, and troubleshooting guides. Use when users ask about 
-                'what is', 'how to', 'known issues', or need documentation.""",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "query": {
-                            "type": "string",
-                            "description": "Search query for knowledge base (e.g., 'Digital Lending approval delays', 'app v1.2 known issues')"
-                        },
-                        "top_k": {
-                            "type": "integer",
-                            "description": "Number of results to return (default: 5, max: 20)",
-                            "default": 5
-                        }
-                    },
-                    "required": ["query"]
-                }
-            },
-            {
-                # Use function-name-safe identifier (no dots) for model function calling
-                "name": "kpi_top_root_causes",
-                "description": """Calculate top root causes of support tickets by category 
-                with percentage of open tickets. Use for root cause analysis, pattern identification, 
-                and periodic reports (daily, weekly, monthly).""",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "start_date": {
-                            "type": "string",
-                            "description": "Start date for analysis (YYYY-MM-DD format)",
-                            "pattern": "^\\d{4}-\\d{2}-\\d{2}$"
-                        },
-                        "end_date": {
-                            "type": "string",
-                            "description": "End date for analysis (YYYY-MM-DD format)",
-                            "pattern": "^\\d{4}-\\d{2}-\\d{2}$"
-                        },
-                        "category": {
-                            "type": "string",
-                            "description": "Optional: Filter by product category (e.g., 'Digital Saving', 'Digital Lending', 'Payment')"
-                        },
-                        "top_n": {
-                            "type": "integer",
-                            "description": "Number of top root causes to return (default: 5)",
-                            "default": 5
-                        }
-                    },
-                    "required": ["start_date", "end_date"]
-                }
-            }
-        ]
+        return _TOOL_DEFINITIONS
+    
+    def get_tools_spec(self) -> List[Dict[str, Any]]:
+        """
+        Get tool definitions already wrapped in the OpenAI function-calling format
+        
+        Pass straight to OpenAIClient.generate(tools=...)
+        """
+        return TOOLS_SPEC
     
     async def execute_tool(
         self,
         tool_name: str,
         arguments: Dict[str, Any]
-    ) -> ToolCall:
+    ) -> ToolCallFast:
         """
         Execute a single tool call
         
@@ -122,15 +287,45 @@ class ToolOrchestrator:
             arguments: Tool arguments
         
         Returns:
-            ToolCall object with results
+            ToolCallFast object with results
         """
         start_time = time.time()
         
-        tool_call = ToolCall(
+        tool_call = ToolCallFast(
             tool_name=tool_name,
             parameters=arguments
         )
         
+        # Reject malformed arguments before making the network call
+        validator = _VALIDATORS.get(tool_name)
+        if validator:
+            try:
+                validator(arguments)
+            except fastjsonschema.JsonSchemaException as e:
+                tool_call.error = f"invalid arguments: {e.message}"
+                tool_call.execution_time = time.time() - start_time
+                return tool_call
+        
+        # Reject SQL that touches tables outside the published schema
+        if tool_name == "sql_query":
+            queries = arguments.get("queries") or [arguments.get("query") or ""]
+            disallowed = sorted({
+                table for q in queries
+                for table in (t.lower() for t in _referenced_tables(q))
+                if table not in ALLOWED_TABLES
+            })
+            if disallowed:
+                tool_call.error = f"table not allowed: {', '.join(disallowed)}"
+                tool_call.execution_time = time.time() - start_time
+                return tool_call
+            
+            # Typo'd columns fail here instead of costing a database round-trip
+            unknown = sorted({column for q in queries for column in _unknown_columns(q)})
+            if unknown:
+                tool_call.error = f"unknown column: {', '.join(unknown)}"
+                tool_call.execution_time = time.time() - start_time
+                return tool_call
+        
         try:
             # Map internal function-safe names to MCP tool ids
             mcp_tool_map = {
@@ -143,7 +338,6 @@ class ToolOrchestrator:
                 raise ValueError(f"Unknown tool: {tool_name}")
 
             mcp_tool_id = mcp_tool_map[tool_name]
-            url = f"{self.mcp_server_url}/tools/call"
 
             # Special handling for kpi_top_root_causes: convert arguments into KPI aggregate format
             if tool_name == "kpi_top_root_causes":
@@ -152,29 +346,29 @@ class ToolOrchestrator:
                 year = None
                 month = None
 
-                # Prefer explicit year/month if provided
-                if arguments.get("year"):
-                    year = int(arguments.get("year"))
-                if arguments.get("month"):
-                    month = int(arguments.get("month"))
+                # Prefer explicit year/month if provided (each parsed on its own,
+                # so a bad month doesn't discard a good year)
+                try:
+                    if arguments.get("year"):
+                        year = int(arguments.get("year"))
+                except (TypeError, ValueError):
+                    year = None
+                try:
+                    if arguments.get("month"):
+                        month = int(arguments.get("month"))
+                except (TypeError, ValueError):
+                    month = None
 
                 # If start_date provided, derive year (and month if start/end in same month)
-                if not year and arguments.get("start_date"):
-                    try:
-                        sd = datetime.strptime(arguments.get("start_date"), "%Y-%m-%d")
-                        year = sd.year
-                    except Exception:
-                        pass
-
-                if arguments.get("start_date") and arguments.get("end_date"):
-                    try:
-                        sd = datetime.strptime(arguments.get("start_date"), "%Y-%m-%d")
-                        ed = datetime.strptime(arguments.get("end_date"), "%Y-%m-%d")
-                        # If both dates are within the same month, set month; otherwise leave None
-                        if sd.year == ed.year and sd.month == ed.month:
-                            month = sd.month
-                    except Exception:
-                        pass
+                start = _year_month(arguments.get("start_date"))
+                end = _year_month(arguments.get("end_date"))
+
+                if not year and start:
+                    year = start[0]
+
+                # If both dates are within the same month, set month; otherwise leave None
+                if start and end and start == end:
+                    month = start[1]
 
                 # top_n and category mapping
                 mcp_params = {}
@@ -199,7 +393,7 @@ class ToolOrchestrator:
                 mcp_body = {"tool": mcp_tool_id, "parameters": arguments}
 
             # Make request to MCP server (ToolCallRequest shape)
-            response = await self.client.post(url, json=mcp_body)
+            response = await self.client.post(self._call_url, json=mcp_body)
             response.raise_for_status()
             
             result = response.json()
@@ -218,28 +412,44 @@ class ToolOrchestrator:
     async def execute_tools(
         self,
         tool_calls: List[Dict[str, Any]]
-    ) -> List[ToolCall]:
+    ) -> List[ToolCallFast]:
         """
-        Execute multiple tool calls
+        Execute multiple tool calls concurrently, preserving input order
         
         Args:
             tool_calls: List of tool calls to execute
         
         Returns:
-            List of ToolCall results
+            List of ToolCallFast results
         """
-        results = []
+        if not hasattr(asyncio, "TaskGroup"):
+            # Python < 3.11: execute_tool never raises, so gather preserves order safely
+            return list(await asyncio.gather(*(
+                self.execute_tool(tool_name=tc["name"], arguments=tc["arguments"])
+                for tc in tool_calls
+            )))
         
-        for tool_call in tool_calls:
-            result = await self.execute_tool(
-                tool_name=tool_call["name"],
-                arguments=tool_call["arguments"]
-            )
-            results.append(result)
+        results: List[Optional[ToolCallFast]] = [None] * len(tool_calls)
+        
+        async with asyncio.TaskGroup() as tg:
+            for i, tool_call in enumerate(tool_calls):
+                tg.create_task(self._run_into(results, i, tool_call))
         
         return results
     
-    def extract_citations(self, tool_calls: List[ToolCall]) -> List[Citation]:
+    async def _run_into(
+        self,
+        results: List[Optional[ToolCallFast]],
+        index: int,
+        tool_call: Dict[str, Any]
+    ) -> None:
+        """Execute one tool call and store its result at the given index"""
+        results[index] = await self.execute_tool(
+            tool_name=tool_call["name"],
+            arguments=tool_call["arguments"]
+        )
+    
+    def extract_citations(self, tool_calls: List[ToolCallFast]) -> List[CitationFast]:
         """
         Extract citations from tool results for dBank
         
@@ -249,7 +459,7 @@ class ToolOrchestrator:
         Returns:
             List of citations
         """
-        citations = []
+        citations: List[CitationFast] = []
         
         for tool_call in tool_calls:
             if tool_call.error:
@@ -258,40 +468,45 @@ class ToolOrchestrator:
             # Extract citations based on tool type
             if tool_call.tool_name == "kb_search":
                 # Knowledge base citations
-                if tool_call.result and "results" in tool_call.result:
-                    for item in tool_call.result["results"]:
-                        source_name = item.get("metadata", {}).get("source", "Knowledge Base")
-                        citations.append(Citation(
-                            source=f"Product KB - {source_name}",
-                            content=item.get("text", "")[:200] + "...",
+                if tool_call.result:
+                    citations.extend(
+                        CitationFast(
+                            source=f"Product KB - {(item.get('metadata') or {}).get('source', 'Knowledge Base')}",
+                            content=(item.get("text") or "")[:200] + "...",
                             score=item.get("score"),
                             metadata=item.get("metadata")
-                        ))
+                        )
+                        for item in (tool_call.result.get("results") or ())
+                    )
             
             elif tool_call.tool_name == "sql_query":
                 # SQL query citations
                 if tool_call.result and "rows" in tool_call.result:
                     row_count = len(tool_call.result["rows"])
-                    citations.append(Citation(
+                    query_preview = (tool_call.parameters.get("query") or "")[:100]
+                    citations.append(CitationFast(
                         source="Support Database Query",
                         content=f"Based on {row_count} records from support database (PII masked)",
                         metadata={
-                            "query_preview": tool_call.parameters.get("query", "")[:100] + "...",
+                            "query_preview": query_preview + "...",
                             "row_count": row_count,
-                            "note": "All PII data is automatically masked for security"
+                            "note": _PII_NOTE
                         }
                     ))
             
             elif tool_call.tool_name == "kpi_top_root_causes":
                 # KPI root cause citations
                 if tool_call.result:
-                    citations.append(Citation(
+                    p = tool_call.parameters
+                    sd = p.get("start_date")
+                    ed = p.get("end_date")
+                    citations.append(CitationFast(
                         source="Root Cause Analysis KPI",
-                        content=f"Calculated from tickets between {tool_call.parameters.get('start_date')} and {tool_call.parameters.get('end_date')}",
+                        content=f"Calculated from tickets between {sd} and {ed}",
                         metadata={
-                            "date_range": f"{tool_call.parameters.get('start_date')} to {tool_call.parameters.get('end_date')}",
-                            "category": tool_call.parameters.get('category', 'All categories'),
-                            "top_n": tool_call.parameters.get('top_n', 5)
+                            "date_range": f"{sd} to {ed}",
+                            "category": p.get("category") or "All categories",
+                            "top_n": p.get("top_n", 5)
                         }
                     ))
         
@@ -305,7 +520,7 @@ class ToolOrchestrator:
             True if healthy, False otherwise
         """
         try:
-            response = await self.client.get(f"{self.mcp_server_url}/health")
+            response = await self.client.get(self._health_url)
             return response.status_code == 200
         except:
             return False
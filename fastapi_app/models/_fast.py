@@ -0,0 +1,38 @@
+"""
+Lightweight msgspec structs for the tool-execution hot path
+
+These mirror ToolCall and Citation in schemas.py but skip Pydantic validation.
+Convert to the Pydantic models only at the API/conversation boundary.
+"""
+from typing import Any, Dict, Optional
+
+import msgspec
+
+from .schemas import ToolCall, Citation
+
+
+class ToolCallFast(msgspec.Struct):
+    """Tool execution record (internal)"""
+    tool_name: str
+    parameters: Dict[str, Any]
+    result: Optional[Any] = None
+    execution_time: Optional[float] = None
+    error: Optional[str] = None
+
+
+class CitationFast(msgspec.Struct):
+    """Citation from knowledge base or data source (internal)"""
+    source: str
+    content: str
+    score: Optional[float] = None
+    metadata: Optional[Dict[str, Any]] = None
+
+
+def to_tool_call(fast: ToolCallFast) -> ToolCall:
+    """Convert to the Pydantic ToolCall without re-validating"""
+    return ToolCall.model_construct(**msgspec.structs.asdict(fast))
+
+
+def to_citation(fast: CitationFast) -> Citation:
+    """Convert to the Pydantic Citation without re-validating"""
+    return Citation.model_construct(**msgspec.structs.asdict(fast))
@@ -12,6 +12,7 @@ class AskRequest(BaseModel):
     question: str = Field(..., min_length=1, max_length=2000, description="User's question")
     conversation_id: Optional[str] = Field(None, description="Conversation ID for context")
     user_id: Optional[str] = Field(None, description="User ID for audit")
+    user_role: Optional[str] = Field(None, description="Requester role; cached answers are only shared within a role")
     stream: bool = Field(True, description="Enable streaming responses")
     max_tokens: int = Field(2000, ge=100, le=4000, description="Max response tokens")
     
@@ -89,4 +90,5 @@ class HealthCheck(BaseModel):
     mcp_server: bool
     llm_client: bool
     vector_store: bool
+    prompt_version: Optional[str] = Field(None, description="Hash of the active system prompt")
     timestamp: datetime = Field(default_factory=datetime.utcnow)
\ No newline at end of file
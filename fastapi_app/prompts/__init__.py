@@ -3,15 +3,42 @@
 System prompts for LLM
 """
 from .system_prompts import (
-    DBANK_SYSTEM_PROMPT,
-    TOOL_SELECTION_EXAMPLES,
-    CITATION_FORMAT,
-    ERROR_HANDLING_PROMPT,
+    ALLOWED_TABLES,
+    build_system_prompt,
+    select_system_prompt,
+    prompt_version,
+    tool_selection_examples,
+    load_sql_example,
+    full_system_message,
 )
+from . import system_prompts as _system_prompts
 
 __all__ = [
+    "ALLOWED_TABLES",
     "DBANK_SYSTEM_PROMPT",
+    "DBANK_SYSTEM_PROMPT_TOKENS",
     "TOOL_SELECTION_EXAMPLES",
     "CITATION_FORMAT",
     "ERROR_HANDLING_PROMPT",
-]
\ No newline at end of file
+    "PII_HANDLING_GUIDELINES",
+    "DBANK_SYSTEM_PROMPT_BYTES",
+    "DBANK_SYSTEM_PROMPT_LEN",
+    "TOOL_SELECTION_EXAMPLES_BYTES",
+    "CITATION_FORMAT_BYTES",
+    "ERROR_HANDLING_PROMPT_BYTES",
+    "PII_HANDLING_GUIDELINES_BYTES",
+    "PROMPT_VERSION",
+    "build_system_prompt",
+    "select_system_prompt",
+    "prompt_version",
+    "tool_selection_examples",
+    "load_sql_example",
+    "full_system_message",
+    "FULL_SYSTEM_MESSAGE",
+    "FULL_SYSTEM_MESSAGE_BYTES",
+]
+
+
+def __getattr__(name: str):
+    """Resolve prompt constants (e.g. DBANK_SYSTEM_PROMPT) from system_prompts on first access"""
+    return getattr(_system_prompts, name)
\ No newline at end of file
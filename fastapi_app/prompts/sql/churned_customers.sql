@@ -0,0 +1,14 @@
+SELECT 
+    customer_uuid,
+    customer_segment,
+    is_churned_30d,
+    is_churned_90d,
+    churn_risk_score,
+    churn_risk_level,
+    last_login_date,
+    days_since_login,
+    total_balance
+FROM analytics_marts.mart_churned_customers
+WHERE is_churned_30d = TRUE
+ORDER BY churn_risk_score DESC
+LIMIT 100;
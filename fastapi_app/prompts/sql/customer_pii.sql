@@ -0,0 +1,10 @@
+SELECT 
+    customer_id,
+    full_name,
+    email,
+    phone,
+    national_id,
+    customer_segment
+FROM analytics.dim_customers
+WHERE customer_segment = 'premium'
+LIMIT 20;
@@ -0,0 +1,14 @@
+SELECT 
+    rc.root_cause_name,
+    tc.category_name,
+    COUNT(*) AS ticket_count,
+    ROUND(COUNT(*) * 100.0 / SUM(COUNT(*)) OVER (), 2) AS percentage,
+    SUM(CASE WHEN t.ticket_status = 'Open' THEN 1 ELSE 0 END) AS open_tickets,
+    ROUND(SUM(CASE WHEN t.ticket_status = 'Open' THEN 1 ELSE 0 END) * 100.0 / COUNT(*), 2) AS pct_open
+FROM analytics.fact_tickets t
+JOIN analytics.dim_root_causes rc ON t.root_cause_id = rc.root_cause_id
+JOIN analytics.dim_ticket_categories tc ON t.category_id = tc.category_id
+WHERE t.created_date >= CURRENT_DATE - INTERVAL '30 days'
+GROUP BY rc.root_cause_name, tc.category_name
+ORDER BY ticket_count DESC
+LIMIT 5;
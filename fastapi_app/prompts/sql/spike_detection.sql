@@ -0,0 +1,30 @@
+WITH daily_tickets AS (
+    SELECT 
+        created_date,
+        app_version,
+        COUNT(*) AS ticket_count,
+        AVG(COUNT(*)) OVER (
+            ORDER BY created_date 
+            ROWS BETWEEN 7 PRECEDING AND 1 PRECEDING
+        ) AS avg_tickets_7d
+    FROM analytics.fact_tickets
+    WHERE created_date >= '2024-08-01'
+    GROUP BY created_date, app_version
+)
+SELECT 
+    created_date,
+    app_version,
+    ticket_count,
+    ROUND(avg_tickets_7d, 2) AS baseline,
+    CASE 
+        WHEN ticket_count > avg_tickets_7d * 1.5 THEN 'ANOMALY'
+        ELSE 'NORMAL'
+    END AS status,
+    STRING_AGG(DISTINCT p.product_type, ', ') AS affected_products
+FROM daily_tickets dt
+JOIN analytics.fact_tickets t ON dt.created_date = t.created_date 
+    AND dt.app_version = t.app_version
+JOIN analytics.dim_products p ON t.product_id = p.product_id
+WHERE dt.app_version = 'v1.2'
+GROUP BY dt.created_date, dt.app_version, dt.ticket_count, dt.avg_tickets_7d
+ORDER BY dt.created_date;
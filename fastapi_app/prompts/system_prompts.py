@@ -1,497 +1,385 @@
 """
 System prompts for dBank Support Copilot
-"""
-DBANK_SYSTEM_PROMPT = """You are an intelligent support analyst assistant for dBank, Thailand's virtual bank platform.
-
-Your primary job is to help the Operations Support Team analyze support tickets and product issues, provide concise data-driven insights, and recommend actionable next steps.
-
-# CRITICAL RULES FOR TOOL USAGE (READ CAREFULLY)
-
-## Rule 1: STRICT Tool Result Adherence
-- You MUST base your answer ONLY on the tool results returned
-- NEVER make up data, infer information, or "fill in blanks" that aren't in the results
-- If a tool returns data, use EXACTLY that data - no additions, no assumptions
-- If a tool returns empty results, acknowledge it explicitly - do NOT try random queries
-
-## Rule 2: Handling Empty Tool Results
-When a tool returns empty results (e.g., `[]` or `null`):
-
-**Option A - Simple Questions (PREFERRED):**
-If user asks: "Top 5 root causes last month"
-Tool returns: `[]`
-✅ CORRECT Response:
-"The kpi.top_root_causes tool found no root cause data for September 2023. This indicates:
-- No product issues were categorized with root causes during this period
-- Data may not have been ingested yet for this timeframe
-
-To investigate further, you can ask:
-- 'Show total ticket count for September 2023' 
-- 'Top root causes for last 3 months'
-
-[Source: analytics_marts.mart_top_root_causes - Empty result]"
-
-❌ WRONG Response:
-"Let me check the customers table instead..." [executes unrelated SQL query]
-[Returns customer UUIDs that have nothing to do with the question]
-
-**Option B - Investigative Questions:**
-If user EXPLICITLY asks to investigate: "Why are there no root causes last month?"
-Only then you may:
-1. First acknowledge the empty result
-2. Then use ONE follow-up SQL query to check ticket volume
-3. Report findings clearly
-
-**Option C - SQL Writing Requests:**
-If user asks: "Write SQL for churned customers"
-- Provide the SQL query as requested
-- DO NOT execute it unless explicitly asked
-- Explain what the query does
-
-## Rule 3: When Multiple Tools Return Empty
-- STOP after the first empty result
-- Do NOT chain multiple queries hoping to find something
-- Acknowledge the limitation and suggest alternatives
-- Let the user decide the next step
-
-## Rule 4: Tool Selection Priority
-1. Use `kpi.top_root_causes` for pre-aggregated KPIs (fastest)
-2. Use `sql.query` only when KPI tool is unavailable or user needs custom analysis
-3. Use `kb.search` for documentation and known issues
-4. NEVER use tools the user didn't ask for
-
-# MCP Tools Available (Production-Ready)
-
-- `sql.query` — Execute read-only SQL with **AUTOMATIC PII MASKING**. Safe to query any table including those with PII fields. All sensitive data (email, phone, names, IDs) is automatically masked before returning results.
-- `kb.search` — Semantic search across the product knowledge base (FAQ, release notes, troubleshooting guides).
-- `kpi.top_root_causes` — Pre-aggregated KPI endpoint that returns top root causes and KPI metrics (percent open, counts, trends).
-
-# IMPORTANT: PII Data Handling
-
-## Automatic PII Masking in sql.query Tool
-
-The `sql.query` tool has **BUILT-IN AUTOMATIC PII MASKING**. This means:
-
-✅ **YOU CAN AND SHOULD execute queries with PII fields** - The tool will mask them automatically
-✅ **It is SAFE to query**: email, phone, full_name, national_id, address, etc.
-✅ **Do NOT refuse queries** that contain PII columns - execute them normally
-✅ **The masking happens automatically** before results reach you
-
-### PII Masking Examples:
-
-**Original Data** → **Masked Data**
-- Email: john.doe@example.com → j***@example.com
-- Phone: +66812345678 → ***-***-5678
-- Full Name: John Smith → J*******h
-- National ID: 1234567890123 → 1***********3
-
-### When User Requests PII Data:
-
-User: "SELECT full_name, email, phone FROM analytics.dim_customers LIMIT 5"
-
-✅ **CORRECT Action**: Execute the query immediately
-```
-Tool Call: sql.query with the exact query
-```
-
-✅ **CORRECT Response**:
-"Here are the customer records (PII automatically masked):
-
-| Full Name | Email | Phone |
-|-----------|-------|-------|
-| J*******h | j***@example.com | ***-***-5678 |
-| M******a | m***@example.com | ***-***-1234 |
-| S*****n | s***@example.com | ***-***-9012 |
-
-[Source: analytics.dim_customers via sql.query - PII masked automatically]"
-
-❌ **WRONG Action**: Refuse to execute
-"I'm unable to execute that SQL query directly..."
-
-❌ **WRONG Action**: Try to avoid PII columns
-"Let me query customer_uuid instead..."
-
-### Key Points:
-1. **Never refuse queries with PII fields** - The tool handles masking automatically
-2. **Always execute the query as requested** - Masking is guaranteed
-3. **Mention masking in your response** - Let user know data is protected
-4. **Trust the tool** - PII masking is built-in and always active
-
-# Canonical Database Schema (Two Logical Schemas)
-
-1) **analytics** (core / dimensional + fact tables)
-- `dim_customers`        — Customer master (contains PII fields: full_name, email, phone, national_id, address, birth_date)
-- `dim_products`         — Product master (Savings, Lending, Payment, etc.)
-- `dim_ticket_categories`— Ticket category lookup
-- `dim_root_causes`      — Root cause lookup
-- `dim_time`             — Date/time dimension
-- `fact_tickets`         — Ticket events (ticket_id, customer_id, product_id, category_id, root_cause_id, ticket_status, created_date, resolved_date, app_version, etc.)
-- `fact_customer_products`— Product holdings per customer
-- `fact_logins`          — Login/access events
-
-**IMPORTANT**: Always prefix table names with their schema (e.g., `analytics.fact_tickets` or `analytics_marts.mart_churned_customers`).
-
-2) **analytics_marts** (business-facing pre-aggregated marts)
-- `mart_ticket_analytics`: Comprehensive ticket analytics with all dimensions joined (customer, product, category, root cause), time dimension for easy date filtering, v1.2 spike identification, and satisfaction metrics. Powers general ticket analysis queries.
-- `mart_top_root_causes`: Pre-aggregated root cause metrics by year/month/quarter with percentage calculations, open ticket tracking, and v1.2 correlation. Powers the `kpi.top_root_causes` MCP tool.
-- `mart_churned_customers`: Customer churn analysis with 30/90-day churn flags, risk scores (0-100), risk levels (active → critical), and customer lifetime value proxy. Uses customer_uuid (non-PII) instead of customer_id.
-
-In analytics_marts schema, customer_id turns into customer_uuid (non-PII surrogate key).
-
-# When to Use Each Tool
-
-- Use `kb.search` for documentation, "what is", "how to", or known issue lookups.
-- Use `sql.query` for custom aggregations, joins, filtering by date ranges, and ad-hoc analysis. **Safe to query PII fields - automatic masking is enabled.**
-- Use `kpi.top_root_causes` for fast top-N root-cause KPIs already pre-aggregated in `mart_top_root_causes`.
-
-# Response Rules
-
-1. **Be data-first**: Lead with key numbers and one-line recommendation
-2. **Always cite sources**: Specify which tool/table provided the data
-3. **Be concise**: 3-6 lines with actionable insights
-4. **Stop when appropriate**: Don't over-query if initial results are sufficient
-5. **Be honest**: If data is limited or empty, say so clearly
-6. **Execute PII queries**: Never refuse queries with PII fields - masking is automatic
 
-# Example Analysis Tasks and Responses
+Prompt text lives in prompts/text/*.md and is read on first use: importing this
+module only compiles the keyword regexes. Prompt constants (DBANK_SYSTEM_PROMPT,
+PROMPT_VERSION, ...) are resolved by the module __getattr__ and then cached as
+ordinary globals.
+"""
+import os
+import re
+import sys
+import hashlib
+from functools import lru_cache
+from importlib import resources
+from pathlib import Path
+from string import Template
+from typing import Final
+
+
+# Prompt sections in prompts/text/. Core sections are always sent; the rest are
+# added per request by build_system_prompt() so simple questions carry fewer input tokens.
+_FULL_PROMPT_SECTIONS: Final[tuple] = (
+    "core_rules",
+    "pii_guide",
+    "core_schema",
+    "empty_guide",
+    "sql_examples",
+    "pii_example",
+    "spike_example",
+    "sql_best_practices",
+    "core_footer",
+)
 
-## Example 1: Top 5 Root Causes (Successful)
-User: "Top 5 root causes in the previous month by category with % open tickets"
 
-Tool Call: `kpi.top_root_causes(year=2023, month=9, top_n=5)`
-Result: 
-```json
-[
-  {"root_cause": "Payment Gateway Error", "category": "Payment", "count": 45, "percent": 23, "open_count": 12},
-  {"root_cause": "Login Failure", "category": "Authentication", "count": 38, "percent": 19, "open_count": 8},
-  ...
-]
-```
-
-✅ CORRECT Response:
-"Top 5 root causes for September 2023:
-
-1. **Payment Gateway Error** (Payment) - 45 tickets (23%), 12 open (27% open rate)
-2. **Login Failure** (Authentication) - 38 tickets (19%), 8 open (21% open rate)
-3. **Account Sync Issue** (Sync) - 32 tickets (16%), 15 open (47% open rate)
-4. **Transaction Timeout** (Payment) - 28 tickets (14%), 5 open (18% open rate)
-5. **Profile Update Failed** (Account) - 25 tickets (13%), 10 open (40% open rate)
-
-**Recommendation**: Prioritize Account Sync Issue (47% still open) and Payment Gateway Error (highest volume).
-
-[Source: analytics_marts.mart_top_root_causes via kpi.top_root_causes]"
-
-## Example 2: Empty Results (User asks for data)
-User: "Top 5 root causes in the previous month by category with % open tickets"
-
-Tool Call: `kpi.top_root_causes(year=2023, month=9, top_n=5)`
-Result: `[]`
-
-✅ CORRECT Response:
-"No root cause data found for September 2023 in the analytics_marts.mart_top_root_causes mart.
-
-**What this means:**
-- No product issues were categorized with root causes during this period, OR
-- Data for September 2023 hasn't been ingested/processed yet
-
-**Next steps:**
-- Verify if tickets exist: Ask 'Show ticket count for September 2023'
-- Try different timeframe: 'Top root causes for last 3 months'
-- Contact data team if you expect data for this period
-
-[Source: analytics_marts.mart_top_root_causes - Empty result]"
-
-❌ WRONG Response:
-"Let me check the customers instead..." [Executes: SELECT customer_uuid FROM dim_customers LIMIT 100]
-"Here are some customer IDs: 3eb13b90-4668..." [COMPLETELY IRRELEVANT]
-
-## Example 3: SQL Writing Request
-User: "Write the SQL for churned customers in the last 30, 90 days"
-
-✅ CORRECT Response:
-"Here's the SQL to identify churned customers (no login in last 30/90 days):
-
-```sql
-SELECT 
-    customer_uuid,
-    customer_segment,
-    is_churned_30d,
-    is_churned_90d,
-    risk_score,
-    risk_level,
-    last_login_date,
-    days_since_last_login
-FROM analytics_marts.mart_churned_customers
-WHERE is_churned_30d = TRUE 
-   OR is_churned_90d = TRUE
-ORDER BY risk_score DESC
-LIMIT 100;
-```
-
-This query uses the pre-built churn mart which includes:
-- Churn flags for 30/90 day windows
-- Risk scores (0-100) and levels (active → critical)
-- Last login tracking
-
-[Source: analytics_marts.mart_churned_customers schema]"
-
-## Example 4: PII Query Request (IMPORTANT EXAMPLE)
-User: "SELECT full_name, email, phone, national_id FROM analytics.dim_customers LIMIT 5"
-
-Tool Call: `sql.query` with exact query
-Result: 
-```json
-{
-  "results": [
-    {"full_name": "J*******h", "email": "j***@example.com", "phone": "***-***-5678", "national_id": "1***********3"},
-    {"full_name": "M******a", "email": "m***@example.com", "phone": "***-***-1234", "national_id": "2***********8"}
-  ],
-  "row_count": 5,
-  "pii_masked": true
+# Canonical warehouse schema: table -> column -> Postgres type. Mirrors
+# data_layer/sql/01_create_schema.sql and the dbt marts; rendered into the
+# prompt by schema_summary() and used by the tool orchestrator to reject
+# LLM-emitted SQL with unknown tables or columns before it reaches Postgres.
+SCHEMA: Final[dict] = {
+    "analytics.dim_customers": {
+        "customer_id": "int", "customer_uuid": "text", "full_name": "text", "email": "text",
+        "phone": "text", "national_id": "text", "date_of_birth": "date", "gender": "text",
+        "customer_segment": "text", "registration_date": "date", "account_status": "text",
+        "city": "text", "country": "text", "created_at": "timestamp", "updated_at": "timestamp",
+    },
+    "analytics.dim_products": {
+        "product_id": "int", "product_code": "text", "product_name": "text",
+        "product_category": "text", "product_type": "text", "description": "text",
+        "launch_date": "date", "is_active": "bool", "created_at": "timestamp",
+    },
+    "analytics.dim_ticket_categories": {
+        "category_id": "int", "category_code": "text", "category_name": "text",
+        "parent_category": "text", "description": "text", "created_at": "timestamp",
+    },
+    "analytics.dim_root_causes": {
+        "root_cause_id": "int", "root_cause_code": "text", "root_cause_name": "text",
+        "category": "text", "severity": "text", "description": "text", "created_at": "timestamp",
+    },
+    "analytics.dim_time": {
+        "date_id": "int", "date": "date", "year": "int", "quarter": "int", "month": "int",
+        "month_name": "text", "week": "int", "day_of_month": "int", "day_of_week": "int",
+        "day_name": "text", "is_weekend": "bool", "is_holiday": "bool", "created_at": "timestamp",
+    },
+    "analytics.fact_tickets": {
+        "ticket_id": "int", "ticket_number": "text", "customer_id": "int", "product_id": "int",
+        "category_id": "int", "root_cause_id": "int", "ticket_status": "text", "priority": "text",
+        "subject": "text", "description": "text", "created_date": "date", "resolved_date": "date",
+        "closed_date": "date", "resolution_time_hours": "numeric",
+        "customer_satisfaction_score": "int", "channel": "text", "assigned_to": "text",
+        "app_version": "text", "created_at": "timestamp", "updated_at": "timestamp",
+    },
+    "analytics.fact_customer_products": {
+        "holding_id": "int", "customer_id": "int", "product_id": "int", "activation_date": "date",
+        "deactivation_date": "date", "status": "text", "balance": "numeric",
+        "credit_limit": "numeric", "interest_rate": "numeric", "created_at": "timestamp",
+        "updated_at": "timestamp",
+    },
+    "analytics.fact_logins": {
+        "login_id": "int", "customer_id": "int", "login_date": "date",
+        "login_timestamp": "timestamp", "logout_timestamp": "timestamp",
+        "session_duration_minutes": "int", "device_type": "text", "os_type": "text",
+        "app_version": "text", "ip_address": "text", "login_status": "text",
+        "created_at": "timestamp",
+    },
+    "analytics_marts.mart_ticket_analytics": {
+        "ticket_id": "int", "ticket_number": "text", "ticket_status": "text", "priority": "text",
+        "is_resolved": "bool", "satisfaction_level": "text", "resolution_speed": "text",
+        "customer_uuid": "text", "customer_segment": "text", "account_status": "text",
+        "city": "text", "registration_date": "date", "product_code": "text",
+        "product_name": "text", "product_category": "text", "product_type": "text",
+        "category_code": "text", "category_name": "text", "parent_category": "text",
+        "root_cause_code": "text", "root_cause_name": "text", "root_cause_category": "text",
+        "root_cause_severity": "text", "created_date": "date", "created_year": "int",
+        "created_month": "int", "created_month_name": "text", "created_quarter": "int",
+        "created_week": "int", "created_day_name": "text", "created_on_weekend": "bool",
+        "subject": "text", "channel": "text", "app_version": "text",
+        "resolution_time_hours": "numeric", "customer_satisfaction_score": "int",
+        "ticket_created_date": "date", "resolved_date": "date", "closed_date": "date",
+        "actual_resolution_hours": "numeric", "is_v12_related": "bool",
+        "dbt_updated_at": "timestamp",
+    },
+    "analytics_marts.mart_top_root_causes": {
+        "created_year": "int", "created_month": "int", "created_month_name": "text",
+        "created_quarter": "int", "root_cause_code": "text", "root_cause_name": "text",
+        "root_cause_category": "text", "root_cause_severity": "text", "category_name": "text",
+        "parent_category": "text", "product_category": "text", "total_tickets": "int",
+        "open_tickets": "int", "closed_tickets": "int", "resolved_tickets": "int",
+        "avg_resolution_hours": "numeric", "median_resolution_hours": "numeric",
+        "avg_satisfaction_score": "numeric", "satisfied_count": "int",
+        "unsatisfied_count": "int", "v12_related_tickets": "int", "app_channel_count": "int",
+        "web_channel_count": "int", "phone_channel_count": "int", "pct_of_period": "numeric",
+        "pct_open": "numeric", "pct_v12_related": "numeric", "satisfaction_rate": "numeric",
+        "dbt_updated_at": "timestamp",
+    },
+    "analytics_marts.mart_churned_customers": {
+        "customer_uuid": "text", "customer_segment": "text", "account_status": "text",
+        "city": "text", "registration_date": "date", "last_login_date": "date",
+        "days_since_login": "int", "total_logins": "int", "distinct_login_days": "int",
+        "avg_session_minutes": "numeric", "active_last_7d": "int", "active_last_30d": "int",
+        "active_last_90d": "int", "is_churned_30d": "bool", "is_churned_90d": "bool",
+        "churn_risk_score": "int", "churn_risk_level": "text", "total_products": "int",
+        "active_products": "int", "total_balance": "numeric",
+        "last_product_activation": "date", "total_tickets": "int", "open_tickets": "int",
+        "last_ticket_date": "date", "avg_satisfaction": "numeric", "estimated_clv": "int",
+        "dbt_updated_at": "timestamp",
+    },
+    "analytics_marts.mart_customer_ticket_summary": {
+        "customer_uuid": "text", "ticket_count": "int", "open_tickets": "int",
+        "first_ticket_date": "date", "last_ticket_date": "date", "dbt_updated_at": "timestamp",
+    },
 }
-```
-
-✅ CORRECT Response:
-"Here are 5 customer records with PII automatically masked:
-
-| Full Name | Email | Phone | National ID |
-|-----------|-------|-------|-------------|
-| J*******h | j***@example.com | ***-***-5678 | 1***********3 |
-| M******a | m***@example.com | ***-***-1234 | 2***********8 |
-| S*****n | s***@example.com | ***-***-9012 | 3***********5 |
-| R*****a | r***@example.com | ***-***-3456 | 4***********2 |
-| T*****s | t***@example.com | ***-***-7890 | 5***********9 |
-
-All sensitive data has been automatically masked for security.
-
-[Source: analytics.dim_customers via sql.query - PII masked]"
-
-❌ WRONG Response:
-"I'm unable to execute that SQL query directly because it contains PII fields."
-
-## Example 5: App v1.2 Spike Detection
-User: "Did ticket volume spike after Virtual Bank App v1.2 release?"
-
-Tool Call: `sql.query` with spike detection query
-Result: Shows daily ticket counts with anomaly flags
 
-✅ CORRECT Response:
-"Yes, ticket volume spiked significantly after v1.2 release:
-
-**Anomaly Window**: Oct 5-8, 2024
-- **Baseline**: ~120 tickets/day (7-day average)
-- **Peak**: 312 tickets on Oct 6 (260% increase)
-- **Affected Products**: Digital Savings (45%), Digital Lending (30%), Payments (25%)
+# The tool orchestrator rejects LLM-emitted SQL that references any other table
+ALLOWED_TABLES: Final[frozenset] = frozenset(SCHEMA)
+
+# Bookkeeping columns left out of the prompt (still valid in queries)
+_AUDIT_COLUMNS: Final[frozenset] = frozenset({"created_at", "updated_at", "dbt_updated_at"})
+
+
+def schema_summary() -> str:
+    """One line per table: `- schema.table(col, col, ...)`"""
+    return "\n".join(
+        f"- {table}({', '.join(c for c in columns if c not in _AUDIT_COLUMNS)})"
+        for table, columns in SCHEMA.items()
+    )
+
+
+@lru_cache(maxsize=None)
+def _load_prompt(name: str) -> str:
+    """Read one prompt section from prompts/text/<name>.md (interned), filling in $schema"""
+    text = resources.files(__package__).joinpath("text", f"{name}.md").read_text(encoding="utf-8")
+    if "$schema" in text:
+        text = Template(text).substitute(schema=schema_summary())
+    return sys.intern(text)
+
+
+# Prepended to every LLM request: keep a single interned copy and tokenize it once.
+# It must stay byte-identical (and first) so OpenAI's automatic prompt cache hits.
+@lru_cache(maxsize=1)
+def _dbank_system_prompt() -> str:
+    return sys.intern("".join(_load_prompt(name) for name in _FULL_PROMPT_SECTIONS))
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    """gpt-4o family tokenizer (o200k_base), or None if tiktoken is unavailable"""
+    try:
+        import tiktoken
+        return tiktoken.encoding_for_model("gpt-4o-mini")
+    except Exception:  # tiktoken missing or encoding files unavailable offline
+        return None
+
+
+@lru_cache(maxsize=1)
+def _dbank_system_prompt_tokens():
+    enc = _encoding()
+    return enc.encode(_dbank_system_prompt()) if enc is not None else None
+
+
+@lru_cache(maxsize=16)
+def prompt_version(prompt: str) -> str:
+    """Short content hash of a prompt; changes whenever a single byte changes"""
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+
+
+@lru_cache(maxsize=8)
+def build_system_prompt(needs_pii: bool, needs_sql: bool, needs_spike: bool) -> str:
+    """
+    Assemble the system prompt from the sections a request needs
+
+    Section order matches DBANK_SYSTEM_PROMPT, and the full combination returns
+    that exact object, so each variant is a stable prefix for prompt caching.
+    """
+    if needs_pii and needs_sql and needs_spike:
+        return _dbank_system_prompt()
+
+    parts = [_load_prompt("core_rules")]
+    if needs_pii:
+        parts.append(_load_prompt("pii_guide"))
+    parts.append(_load_prompt("core_schema"))
+    parts.append(_load_prompt("empty_guide"))
+    if needs_sql:
+        parts.append(_load_prompt("sql_examples"))
+    if needs_pii:
+        parts.append(_load_prompt("pii_example"))
+    if needs_spike:
+        parts.append(_load_prompt("spike_example"))
+    if needs_sql:
+        parts.append(_load_prompt("sql_best_practices"))
+    parts.append(_load_prompt("core_footer"))
+    return sys.intern("".join(parts))
+
+
+_PII_HINTS = re.compile(
+    r"\b(pii|customers?|names?|emails?|phones?|national|address|personal|mask)", re.IGNORECASE
+)
+_SQL_HINTS = re.compile(
+    r"\b(sql|query|select|join|tables?|schema|columns?|count|group by|breakdown|trend|compare|churn)",
+    re.IGNORECASE,
+)
+_SPIKE_HINTS = re.compile(r"\b(v1\.2|spike|release|version|rollout)", re.IGNORECASE)
 
-**Top Issues during spike:**
-- Payment Gateway Timeout (85 tickets)
-- Account Balance Display Error (62 tickets)
 
-**Recommendation**: Roll back v1.2 or hotfix payment gateway integration.
+# A/B toggle: send the minified prompt generated by scripts/minify_prompt.py
+USE_MIN_PROMPT: Final[bool] = os.getenv("DBANK_MIN_PROMPT") == "1"
 
-[Source: analytics_marts.mart_ticket_analytics via sql.query]"
 
-# SQL Best Practices for `sql.query` Calls
+@lru_cache(maxsize=1)
+def min_system_prompt() -> str:
+    """Minified full prompt (generated module, imported on first use)"""
+    from .system_prompts_min import DBANK_SYSTEM_PROMPT_MIN
+    return sys.intern(DBANK_SYSTEM_PROMPT_MIN)
 
-- Filter by date ranges using `created_date` or `dim_time`
-- Always use schema prefixes: `analytics.fact_tickets` not just `fact_tickets`
-- Limit results for exploratory queries: `LIMIT 100`
-- Use meaningful column aliases
-- Include relevant GROUP BY and ORDER BY clauses
-- **Query PII fields freely** - automatic masking is always enabled
 
-# Error Handling
+def prompt_token_counts() -> dict:
+    """Token counts of the full and minified prompts (None when tiktoken is unavailable)"""
+    enc = _encoding()
+    if enc is None:
+        return {"full": None, "min": None}
+    return {
+        "full": len(_dbank_system_prompt_tokens()),
+        "min": len(enc.encode(min_system_prompt())),
+    }
 
-If a tool fails or returns unexpected results:
 
-1. **Acknowledge**: "I encountered an issue querying the [tool/table name]"
-2. **Explain briefly**: "The KPI mart may be temporarily unavailable" or "The query timed out"
-3. **Offer alternatives**: "Try: [alternative query] or contact the analytics team"
-4. **Never expose**: Internal errors, stack traces, or credentials
+def select_system_prompt(question: str) -> str:
+    """Pick the prompt variant for a user question using keyword hints"""
+    if USE_MIN_PROMPT:
+        return min_system_prompt()
+    return build_system_prompt(
+        bool(_PII_HINTS.search(question)),
+        bool(_SQL_HINTS.search(question)),
+        bool(_SPIKE_HINTS.search(question)),
+    )
 
-# Citation Format
 
-Always cite your sources:
-- `[Source: analytics_marts.mart_top_root_causes]` - Pre-aggregated KPI mart
-- `[Source: analytics.fact_tickets via sql.query]` - Ad-hoc SQL query
-- `[Source: Product KB]` - Knowledge base article
-- `[Source: analytics_marts.mart_churned_customers - Empty result]` - Empty but valid result
-- `[Source: analytics.dim_customers via sql.query - PII masked]` - Query with automatic PII masking
+# Tool selection examples. The SQL bodies live in prompts/sql/*.sql and are only
+# read when an example is actually requested.
+_SQL_DIR: Final[Path] = Path(__file__).parent / "sql"
 
-# Remember
+_TOOL_SELECTION_HEADER: Final[str] = """
+Tool selection examples and sample queries:
 
-- **Data fidelity over creativity**: Use what you have, don't invent
-- **Empty is valid**: No data is still a result - report it honestly
-- **Stop when done**: Don't over-analyze or execute unnecessary queries
-- **User directs**: Let the user decide next steps after reporting findings
-- **PII queries are safe**: Execute them freely - masking is automatic and guaranteed
-- **Never refuse PII queries**: The sql.query tool handles all security concerns
 """
 
-
-TOOL_SELECTION_EXAMPLES = """
-Tool selection examples and sample queries:
-
-1) Top 5 Root Causes (previous 30 days) — prefer KPI tool
+# (sql file name, text before the SQL block, text after it)
+_TOOL_SELECTION_SECTIONS = (
+    ("root_causes_fallback", """1) Top 5 Root Causes (previous 30 days) — prefer KPI tool
 Request (KPI):
   {"tool": "kpi.top_root_causes", "parameters": {"year": 2023, "month": 9, "top_n": 5}}
 
 If KPI is not available, SQL fallback (example):
-```sql
-SELECT 
-    rc.root_cause_name,
-    tc.category_name,
-    COUNT(*) AS ticket_count,
-    ROUND(COUNT(*) * 100.0 / SUM(COUNT(*)) OVER (), 2) AS percentage,
-    SUM(CASE WHEN t.ticket_status = 'Open' THEN 1 ELSE 0 END) AS open_tickets,
-    ROUND(SUM(CASE WHEN t.ticket_status = 'Open' THEN 1 ELSE 0 END) * 100.0 / COUNT(*), 2) AS pct_open
-FROM analytics.fact_tickets t
-JOIN analytics.dim_root_causes rc ON t.root_cause_id = rc.root_cause_id
-JOIN analytics.dim_ticket_categories tc ON t.category_id = tc.category_id
-WHERE t.created_date >= CURRENT_DATE - INTERVAL '30 days'
-GROUP BY rc.root_cause_name, tc.category_name
-ORDER BY ticket_count DESC
-LIMIT 5;
-```
-
-2) Customer PII Query (automatic masking) - ALWAYS EXECUTE:
-```sql
-SELECT 
-    customer_id,
-    full_name,
-    email,
-    phone,
-    national_id,
-    customer_segment
-FROM analytics.dim_customers
-WHERE customer_segment = 'premium'
-LIMIT 20;
-```
-Note: All PII fields (full_name, email, phone, national_id) will be automatically masked.
-
-3) Detect v1.2 Spike (example SQL):
-```sql
-WITH daily_tickets AS (
-    SELECT 
-        created_date,
-        app_version,
-        COUNT(*) AS ticket_count,
-        AVG(COUNT(*)) OVER (
-            ORDER BY created_date 
-            ROWS BETWEEN 7 PRECEDING AND 1 PRECEDING
-        ) AS avg_tickets_7d
-    FROM analytics.fact_tickets
-    WHERE created_date >= '2024-08-01'
-    GROUP BY created_date, app_version
+""", ""),
+    ("customer_pii", """2) Customer PII Query (automatic masking) - ALWAYS EXECUTE:
+""", """Note: All PII fields (full_name, email, phone, national_id) will be automatically masked.
+"""),
+    ("spike_detection", """3) Detect v1.2 Spike (example SQL):
+""", ""),
+    ("churned_customers", """4) Churned customers (30 days) example:
+""", ""),
 )
-SELECT 
-    created_date,
-    app_version,
-    ticket_count,
-    ROUND(avg_tickets_7d, 2) AS baseline,
-    CASE 
-        WHEN ticket_count > avg_tickets_7d * 1.5 THEN 'ANOMALY'
-        ELSE 'NORMAL'
-    END AS status,
-    STRING_AGG(DISTINCT p.product_type, ', ') AS affected_products
-FROM daily_tickets dt
-JOIN analytics.fact_tickets t ON dt.created_date = t.created_date 
-    AND dt.app_version = t.app_version
-JOIN analytics.dim_products p ON t.product_id = p.product_id
-WHERE dt.app_version = 'v1.2'
-GROUP BY dt.created_date, dt.app_version, dt.ticket_count, dt.avg_tickets_7d
-ORDER BY dt.created_date;
-```
-
-4) Churned customers (30 days) example:
-```sql
-SELECT 
-    customer_uuid,
-    customer_segment,
-    is_churned_30d,
-    is_churned_90d,
-    risk_score,
-    risk_level,
-    last_login_date,
-    days_since_last_login,
-    total_balance
-FROM analytics_marts.mart_churned_customers
-WHERE is_churned_30d = TRUE
-ORDER BY risk_score DESC
-LIMIT 100;
-```
-
-Note: Prefer the mart over raw joins when available. PII fields are automatically masked when querying raw tables.
-"""
-
 
-ERROR_HANDLING_PROMPT = """
-If a tool fails or returns unexpected results:
-
-1. Acknowledge: "I encountered an issue when querying the data or KPI service."
-2. Explain briefly: give a short, non-sensitive reason (e.g., "the KPI mart is temporarily unavailable" or "the database is not reachable").
-3. Offer an alternative: try the SQL fallback or summarize what partial results were available.
-4. Escalate when needed: "For a full investigation, please open a ticket with the analytics team."
-
-Never expose internal stack traces, credentials to users.
-
-Note: PII-related queries should never fail due to security concerns - the sql.query tool handles all masking automatically.
-"""
-
-
-CITATION_FORMAT = """
-Citation examples:
-
-[Source: analytics_marts.mart_top_root_causes] - Pre-aggregated KPI mart
-[Source: analytics.fact_tickets] - Ticket events in the core analytics schema
-[Source: Product KB] - Knowledge base article or release notes
-[Source: SQL Query] - Results from an ad-hoc SQL query (PII masked)
-[Source: analytics_marts.mart_top_root_causes - Empty result] - Tool returned no data
-[Source: analytics.dim_customers via sql.query - PII masked] - Customer data with automatic PII masking
+_TOOL_SELECTION_FOOTER: Final[str] = """Note: Prefer the mart over raw joins when available. PII fields are automatically masked when querying raw tables.
 """
 
 
-PII_HANDLING_GUIDELINES = """
-# PII Query Handling - CRITICAL GUIDELINES
-
-## Always Execute PII Queries
-When a user requests data with PII fields:
-
-✅ DO:
-- Execute the query immediately without hesitation
-- Trust that the sql.query tool will mask all PII automatically
-- Present the masked results normally
-- Mention that data is masked for security
-
-❌ DON'T:
-- Refuse to execute queries with PII fields
-- Ask for permission to query PII data
-- Try to avoid PII columns
-- Warn about PII exposure (masking is automatic)
-
-## Example Scenarios:
-
-### Scenario 1: Direct PII Query
-User: "Show me customer emails and phones for premium segment"
-
-✅ CORRECT: Execute immediately
-```
-sql.query: SELECT email, phone, customer_segment FROM analytics.dim_customers WHERE customer_segment = 'premium' LIMIT 10
-```
-
-❌ WRONG: "I cannot show you emails and phones due to privacy concerns"
-
-### Scenario 2: Mixed PII and Non-PII
-User: "Get customer names and their ticket counts"
-
-✅ CORRECT: Execute the join query including full_name (will be masked)
-❌ WRONG: Query without full_name to "avoid PII"
-
-### Scenario 3: User Writes SQL with PII
-User: "SELECT full_name, national_id FROM analytics.dim_customers WHERE customer_id = 12345"
+@lru_cache(maxsize=None)
+def load_sql_example(name: str) -> str:
+    """Read one example query from prompts/sql/<name>.sql"""
+    return (_SQL_DIR / f"{name}.sql").read_text(encoding="utf-8")
+
+
+@lru_cache(maxsize=16)
+def tool_selection_examples(*names: str) -> str:
+    """
+    Assemble tool selection examples, optionally restricted to some SQL examples
+
+    Args:
+        names: SQL example names to include (all when omitted)
+    """
+    parts = [_TOOL_SELECTION_HEADER]
+    for name, intro, note in _TOOL_SELECTION_SECTIONS:
+        if names and name not in names:
+            continue
+        parts.append(f"{intro}```sql\n{load_sql_example(name)}```\n{note}\n")
+    parts.append(_TOOL_SELECTION_FOOTER)
+    return "".join(parts)
+
+
+@lru_cache(maxsize=1)
+def full_system_message() -> str:
+    """All prompt blocks joined once; callers share the same string object"""
+    return sys.intern("\n\n".join([
+        _dbank_system_prompt(),
+        tool_selection_examples(),
+        _load_prompt("error_handling"),
+        _load_prompt("citation_format"),
+        _load_prompt("pii_handling_guidelines"),
+    ]))
+
+
+def _encoded(builder):
+    """UTF-8 encoding of a lazily built prompt, for callers that assemble raw request bodies"""
+    return lambda: builder().encode("utf-8")
+
+
+# Built on first access (then cached in globals()) so nothing is read from disk
+# or tokenized until a caller actually needs it
+_LAZY_ATTRS = {
+    "DBANK_SYSTEM_PROMPT": _dbank_system_prompt,
+    "DBANK_SYSTEM_PROMPT_TOKENS": _dbank_system_prompt_tokens,
+    "DBANK_SYSTEM_PROMPT_BYTES": _encoded(_dbank_system_prompt),
+    "DBANK_SYSTEM_PROMPT_LEN": lambda: len(_dbank_system_prompt().encode("utf-8")),
+    "PROMPT_VERSION": lambda: prompt_version(_dbank_system_prompt()),
+    "ERROR_HANDLING_PROMPT": lambda: _load_prompt("error_handling"),
+    "ERROR_HANDLING_PROMPT_BYTES": _encoded(lambda: _load_prompt("error_handling")),
+    "CITATION_FORMAT": lambda: _load_prompt("citation_format"),
+    "CITATION_FORMAT_BYTES": _encoded(lambda: _load_prompt("citation_format")),
+    "PII_HANDLING_GUIDELINES": lambda: _load_prompt("pii_handling_guidelines"),
+    "PII_HANDLING_GUIDELINES_BYTES": _encoded(lambda: _load_prompt("pii_handling_guidelines")),
+    "TOOL_SELECTION_EXAMPLES": tool_selection_examples,
+    "TOOL_SELECTION_EXAMPLES_BYTES": _encoded(tool_selection_examples),
+    "FULL_SYSTEM_MESSAGE": full_system_message,
+    "FULL_SYSTEM_MESSAGE_BYTES": _encoded(full_system_message),
+}
 
-✅ CORRECT: Execute exactly as requested
-❌ WRONG: "I'm unable to execute queries with national_id"
 
-## Key Principle:
-**Trust the tool, execute the query, let automatic masking do its job.**
-"""
\ No newline at end of file
+def __getattr__(name: str):
+    """Resolve lazily built prompt constants and cache them as module globals"""
+    builder = _LAZY_ATTRS.get(name)
+    if builder is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = globals()[name] = builder()
+    return value
+
+
+__all__ = [
+    "ALLOWED_TABLES",
+    "SCHEMA",
+    "schema_summary",
+    "DBANK_SYSTEM_PROMPT",
+    "DBANK_SYSTEM_PROMPT_TOKENS",
+    "DBANK_SYSTEM_PROMPT_BYTES",
+    "DBANK_SYSTEM_PROMPT_LEN",
+    "PROMPT_VERSION",
+    "TOOL_SELECTION_EXAMPLES",
+    "TOOL_SELECTION_EXAMPLES_BYTES",
+    "ERROR_HANDLING_PROMPT",
+    "ERROR_HANDLING_PROMPT_BYTES",
+    "CITATION_FORMAT",
+    "CITATION_FORMAT_BYTES",
+    "PII_HANDLING_GUIDELINES",
+    "PII_HANDLING_GUIDELINES_BYTES",
+    "FULL_SYSTEM_MESSAGE",
+    "FULL_SYSTEM_MESSAGE_BYTES",
+    "build_system_prompt",
+    "select_system_prompt",
+    "min_system_prompt",
+    "prompt_token_counts",
+    "USE_MIN_PROMPT",
+    "prompt_version",
+    "tool_selection_examples",
+    "load_sql_example",
+    "full_system_message",
+]
@@ -4,8 +4,31 @@ Tests the three main business requirements
 """
 import asyncio
 import httpx
-import json
+import orjson
 from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict
+
+SSE_DATA_PREFIX = b"data: "
+
+
+async def iter_sse_events(response: httpx.Response) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Parse `data: ` events from a streaming /ask response
+    
+    Framing is done on raw bytes in one reusable buffer and payloads are
+    decoded by orjson straight from a memoryview, so no line is ever
+    decoded to str first.
+    """
+    buffer = bytearray()
+    async for chunk in response.aiter_bytes():
+        buffer += chunk
+        start = 0
+        with memoryview(buffer) as view:
+            while (end := buffer.find(b"\n", start)) != -1:
+                if buffer.startswith(SSE_DATA_PREFIX, start):
+                    yield orjson.loads(view[start + len(SSE_DATA_PREFIX):end])
+                start = end + 1
+        del buffer[:start]
 
 
 class DBankCopilotTester:
@@ -13,14 +36,20 @@ class DBankCopilotTester:
     
     def __init__(self, base_url: str = "http://localhost:8001"):
         self.base_url = base_url
-        self.client = httpx.AsyncClient(timeout=120.0)
+        # One pooled client for every test; HTTP/2 is negotiated when served over TLS
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=20, keepalive_expiry=60.0),
+            timeout=120.0,
+        )
     
     async def test_health(self) -> bool:
         """Test health endpoint"""
         print("🔍 Testing health endpoint...")
         
         try:
-            response = await self.client.get(f"{self.base_url}/health")
+            response = await self.client.get("/health")
             health = response.json()
             
             print(f"   Status: {health['status']}")
@@ -53,7 +82,7 @@ class DBankCopilotTester:
             
             async with self.client.stream(
                 "POST",
-                f"{self.base_url}/ask",
+                "/ask",
                 json={
                     "question": question,
                     "stream": True  # Always true for dBank
@@ -62,17 +91,14 @@ class DBankCopilotTester:
                 full_answer = ""
                 tool_calls = []
                 
-                async for line in response.aiter_lines():
-                    if line.startswith("data: "):
-                        data = json.loads(line[6:])
-                        
-                        if data["type"] == "text":
-                            full_answer += data["content"]
-                        elif data["type"] == "tool_call":
-                            tool_calls.append(data["data"]["tool_name"])
-                            print(f"   Tool Called: {data['data']['tool_name']}")
-                        elif data["type"] == "done":
-                            print(f"   Response Time: {data['data']['response_time']:.2f}s")
+                async for data in iter_sse_events(response):
+                    if data["type"] == "text":
+                        full_answer += data["content"]
+                    elif data["type"] == "tool_call":
+                        tool_calls.append(data["data"]["tool_name"])
+                        print(f"   Tool Called: {data['data']['tool_name']}")
+                    elif data["type"] == "done":
+                        print(f"   Response Time: {data['data']['response_time']:.2f}s")
                 
                 print(f"   Answer Preview: {full_answer[:200]}...")
                 print(f"   Tool Calls: {tool_calls}")
@@ -102,23 +128,20 @@ class DBankCopilotTester:
             
             async with self.client.stream(
                 "POST",
-                f"{self.base_url}/ask",
+                "/ask",
                 json={"question": question}
             ) as response:
                 full_answer = ""
                 tool_calls = []
                 
-                async for line in response.aiter_lines():
-                    if line.startswith("data: "):
-                        data = json.loads(line[6:])
-                        
-                        if data["type"] == "text":
-                            full_answer += data["content"]
-                        elif data["type"] == "tool_call":
-                            tool_calls.append(data["data"]["tool_name"])
-                            print(f"   Tool Called: {data['data']['tool_name']}")
-                        elif data["type"] == "done":
-                            print(f"   Response Time: {data['data']['response_time']:.2f}s")
+                async for data in iter_sse_events(response):
+                    if data["type"] == "text":
+                        full_answer += data["content"]
+                    elif data["type"] == "tool_call":
+                        tool_calls.append(data["data"]["tool_name"])
+                        print(f"   Tool Called: {data['data']['tool_name']}")
+                    elif data["type"] == "done":
+                        print(f"   Response Time: {data['data']['response_time']:.2f}s")
                 
                 print(f"   Answer Preview: {full_answer[:200]}...")
                 print(f"   Tool Calls: {tool_calls}")
@@ -147,23 +170,20 @@ class DBankCopilotTester:
             
             async with self.client.stream(
                 "POST",
-                f"{self.base_url}/ask",
+                "/ask",
                 json={"question": question}
             ) as response:
                 full_answer = ""
                 tool_calls = []
                 
-                async for line in response.aiter_lines():
-                    if line.startswith("data: "):
-                        data = json.loads(line[6:])
-                        
-                        if data["type"] == "text":
-                            full_answer += data["content"]
-                        elif data["type"] == "tool_call":
-                            tool_calls.append(data["data"]["tool_name"])
-                            print(f"   Tool Called: {data['data']['tool_name']}")
-                        elif data["type"] == "done":
-                            print(f"   Response Time: {data['data']['response_time']:.2f}s")
+                async for data in iter_sse_events(response):
+                    if data["type"] == "text":
+                        full_answer += data["content"]
+                    elif data["type"] == "tool_call":
+                        tool_calls.append(data["data"]["tool_name"])
+                        print(f"   Tool Called: {data['data']['tool_name']}")
+                    elif data["type"] == "done":
+                        print(f"   Response Time: {data['data']['response_time']:.2f}s")
                 
                 print(f"   Answer Preview: {full_answer[:200]}...")
                 
@@ -188,22 +208,19 @@ class DBankCopilotTester:
             
             async with self.client.stream(
                 "POST",
-                f"{self.base_url}/ask",
+                "/ask",
                 json={"question": question}
             ) as response:
                 full_answer = ""
                 tool_calls = []
                 
-                async for line in response.aiter_lines():
-                    if line.startswith("data: "):
-                        data = json.loads(line[6:])
-                        
-                        if data["type"] == "text":
-                            full_answer += data["content"]
-                        elif data["type"] == "tool_call":
-                            tool_calls.append(data["data"]["tool_name"])
-                        elif data["type"] == "done":
-                            print(f"   Response Time: {data['data']['response_time']:.2f}s")
+                async for data in iter_sse_events(response):
+                    if data["type"] == "text":
+                        full_answer += data["content"]
+                    elif data["type"] == "tool_call":
+                        tool_calls.append(data["data"]["tool_name"])
+                    elif data["type"] == "done":
+                        print(f"   Response Time: {data['data']['response_time']:.2f}s")
                 
                 print(f"   Tool Calls: {tool_calls}")
                 
@@ -229,14 +246,12 @@ class DBankCopilotTester:
             
             async with self.client.stream(
                 "POST",
-                f"{self.base_url}/ask",
+                "/ask",
                 json={"question": question1, "conversation_id": conv_id}
             ) as response:
-                async for line in response.aiter_lines():
-                    if line.startswith("data: "):
-                        data = json.loads(line[6:])
-                        if data["type"] == "done":
-                            break
+                async for data in iter_sse_events(response):
+                    if data["type"] == "done":
+                        break
             
             # Follow-up question
             question2 = "Which one has the most tickets?"
@@ -244,17 +259,15 @@ class DBankCopilotTester:
             
             async with self.client.stream(
                 "POST",
-                f"{self.base_url}/ask",
+                "/ask",
                 json={"question": question2, "conversation_id": conv_id}
             ) as response:
                 full_answer = ""
-                async for line in response.aiter_lines():
-                    if line.startswith("data: "):
-                        data = json.loads(line[6:])
-                        if data["type"] == "text":
-                            full_answer += data["content"]
-                        elif data["type"] == "done":
-                            break
+                async for data in iter_sse_events(response):
+                    if data["type"] == "text":
+                        full_answer += data["content"]
+                    elif data["type"] == "done":
+                        break
             
             print(f"   Follow-up Answer: {full_answer[:100]}...")
             print(f"   Context Used: ✅")
@@ -280,15 +293,16 @@ class DBankCopilotTester:
             ("Conversation Context", self.test_conversation_context)
         ]
         
-        results = []
-        
-        for test_name, test_func in tests:
+        async def run(test_name, test_func):
             try:
-                result = await test_func()
-                results.append((test_name, result))
+                return test_name, await test_func()
             except Exception as e:
                 print(f"❌ {test_name} failed with exception: {e}")
-                results.append((test_name, False))
+                return test_name, False
+        
+        # Tests are independent (the context test awaits its two turns itself),
+        # so they run concurrently over the shared client; progress lines interleave
+        results = await asyncio.gather(*(run(test_name, test_func) for test_name, test_func in tests))
         
         # Summary
         print("\n" + "=" * 70)
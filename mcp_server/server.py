@@ -3,27 +3,73 @@ MCP Server for dBank Deep Insights Copilot
 Implements Model Context Protocol with 3 tools
 """
 
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Request, Response, BackgroundTasks
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
-from typing import Dict, List, Any, Optional
+from typing import Dict, Iterable, Iterator, List, Any, Optional
+from decimal import Decimal
+from types import MappingProxyType
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 import os
+import sys
+import time
+import asyncio
+import orjson
 from dotenv import load_dotenv
 from datetime import datetime
 
 # Import tools
-from tools.sql_query import execute_sql_query
+from tools.sql_query import execute_sql_query, execute_sql_batch, stream_sql_query
 from tools.kb_search import search_knowledge_base_tool
 from tools.kpi_tools import get_top_root_causes
 from utils.logger import log_tool_call, get_recent_logs
+from utils.tool_cache import get_cache_stats, track_cache_status
+from utils.semantic_cache import get_tool_semantic_cache
 
 load_dotenv()
 
+# tool -> (sync callable, {parameter: default}). Tools block on Postgres or the
+# embedding model, so call_tool runs them with asyncio.to_thread.
+TOOL_DISPATCH = {
+    "sql.query": (execute_sql_query, {"query": None, "parameters": None, "mask_pii": True}),
+    "sql.query#batch": (execute_sql_batch, {"queries": None, "parameters": None, "mask_pii": True}),
+    "kb.search": (search_knowledge_base_tool, {"query": None, "top_k": 5, "category": None, "min_similarity": 0.7}),
+    "kpi.top_root_causes": (get_top_root_causes, {"year": None, "month": None, "top_n": 10, "category_filter": None}),
+}
+
+# Tools served by /tools/call/stream. sql.query pulls rows through a server-side
+# cursor; kb.search is capped at 20 chunks, so its list is simply iterated.
+# Parameters are extracted with the same adapters as TOOL_DISPATCH.
+STREAM_DISPATCH = {
+    "sql.query": stream_sql_query,
+    "kb.search": search_knowledge_base_tool,
+}
+
+# Threads for blocking tool calls. asyncio's default executor has
+# min(32, cpus + 4) threads, which on a small container is fewer than the
+# Postgres pools (DB_POOL_MAX + KB_DB_POOL_MAX) can serve at once.
+TOOL_THREADS = int(os.getenv("TOOL_THREADS", "16"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Size the executor behind asyncio.to_thread for this worker"""
+    executor = ThreadPoolExecutor(max_workers=TOOL_THREADS, thread_name_prefix="tool")
+    asyncio.get_running_loop().set_default_executor(executor)
+    yield
+    executor.shutdown(wait=False)
+
+
 # Initialize FastAPI
 app = FastAPI(
     title="dBank MCP Server",
     description="Model Context Protocol server for Deep Insights Copilot",
-    version="1.0.0"
+    version="1.0.0",
+    # orjson encodes large tool results (SQL rowsets, KB chunks) several times faster
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -68,7 +114,8 @@ class ToolCallResponse(BaseModel):
 # Tool Registry
 # =====================================================
 
-TOOLS_REGISTRY = {
+# Read-only view: the registry is fixed at import and shared by every request
+TOOLS_REGISTRY = MappingProxyType({
     "sql.query": {
         "name": "sql.query",
         "description": "Execute read-only SQL queries against the dBank database. Automatically masks PII. Only SELECT queries allowed.",
@@ -77,6 +124,10 @@ TOOLS_REGISTRY = {
                 "type": "string",
                 "description": "SQL SELECT query to execute. Must be read-only. Parameters should use {{param_name}} syntax."
             },
+            "queries": {
+                "type": "array",
+                "description": "Several related SELECT queries to run together over one connection (use instead of 'query')"
+            },
             "parameters": {
                 "type": "object",
                 "description": "Parameters to substitute in the query (for SQL injection protection)",
@@ -88,7 +139,7 @@ TOOLS_REGISTRY = {
                 "default": True
             }
         },
-        "required": ["query"]
+        "required": []
     },
     
     "kb.search": {
@@ -145,8 +196,32 @@ TOOLS_REGISTRY = {
         },
         "required": ["year"]
     }
+})
+
+_TOOL_NAMES = frozenset(TOOLS_REGISTRY)
+_TOOL_NAMES_LIST = list(TOOLS_REGISTRY)
+
+# dispatch key -> (required parameter names, ((name, default), ...)), built once
+# so call_tool checks required keys with one set difference and extracts kwargs in one pass
+_PARAM_ADAPTERS = {
+    dispatch_key: (
+        frozenset(TOOLS_REGISTRY[dispatch_key.split("#")[0]]["required"]),
+        tuple(defaults.items())
+    )
+    for dispatch_key, (_, defaults) in TOOL_DISPATCH.items()
 }
 
+# /tools/list body, serialized once: the registry never changes at runtime
+_TOOLS_LIST_JSON = orjson.dumps({
+    "tools": [
+        {
+            "name": tool_id,
+            **tool_def
+        }
+        for tool_id, tool_def in TOOLS_REGISTRY.items()
+    ]
+})
+
 # =====================================================
 # MCP Endpoints
 # =====================================================
@@ -164,97 +239,239 @@ async def root():
 @app.get("/tools/list")
 async def list_tools():
     """MCP: List available tools"""
-    return {
-        "tools": [
-            {
-                "name": tool_id,
-                **tool_def
-            }
-            for tool_id, tool_def in TOOLS_REGISTRY.items()
-        ]
-    }
+    return Response(content=_TOOLS_LIST_JSON, media_type="application/json")
+
+def _tool_kwargs(dispatch_key: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+    """Tool keyword arguments from request parameters, rejecting missing required ones"""
+    required, param_defaults = _PARAM_ADAPTERS[dispatch_key]
+    missing = required - parameters.keys()
+    if missing:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Missing required parameters for '{dispatch_key}': {sorted(missing)}"
+        )
+    return {name: parameters.get(name, default) for name, default in param_defaults}
+
+def _json_default(obj: Any) -> Any:
+    """orjson fallback for psycopg2 values it can't encode (NUMERIC columns, etc.)"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    return str(obj)
 
-@app.post("/tools/call")
-async def call_tool(request: ToolCallRequest) -> ToolCallResponse:
-    """MCP: Call a tool"""
+class ToolJSONResponse(ORJSONResponse):
+    """ORJSONResponse that also encodes Decimal/date values from psycopg2 rows"""
+    
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(
+            content,
+            default=_json_default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        )
+
+def _elapsed_ms(start_ns: int) -> int:
+    """Milliseconds since a time.perf_counter_ns() reading"""
+    return (time.perf_counter_ns() - start_ns) // 1_000_000
+
+@app.post("/tools/call", response_model=ToolCallResponse)
+async def call_tool(
+    request: ToolCallRequest,
+    http_request: Request,
+    background_tasks: BackgroundTasks
+):
+    """
+    MCP: Call a tool
+    
+    The body follows ToolCallResponse but is returned as a ToolJSONResponse
+    built from a plain dict: no model instantiation, response validation or
+    jsonable_encoder pass over large results.
+    
+    Audit log writes run as background tasks after the response is sent
+    (Starlette runs the sync psycopg2 writer in its threadpool).
+    """
+    start_ns = time.perf_counter_ns()
     start_time = datetime.now()
     tool_call_id = f"{request.tool}_{start_time.strftime('%Y%m%d_%H%M%S_%f')}"
     
     try:
         # Validate tool exists
-        if request.tool not in TOOLS_REGISTRY:
+        if request.tool not in _TOOL_NAMES:
             raise HTTPException(
                 status_code=400,
-                detail=f"Tool '{request.tool}' not found. Available tools: {list(TOOLS_REGISTRY.keys())}"
+                detail=f"Tool '{request.tool}' not found. Available tools: {_TOOL_NAMES_LIST}"
             )
         
-        # Route to appropriate tool
-        if request.tool == "sql.query":
-            result = execute_sql_query(
-                query=request.parameters.get("query"),
-                parameters=request.parameters.get("parameters", {}),
-                mask_pii=request.parameters.get("mask_pii", True)
-            )
+        # Repeated (or, for kb.search, near-identical) calls skip the tool entirely.
+        # Clients send X-No-Cache (or a truthy "_no_cache" parameter) for calls
+        # whose results must not be shared.
+        tool_cache = get_tool_semantic_cache()
+        use_cache = "x-no-cache" not in http_request.headers and not request.parameters.get("_no_cache")
+        if use_cache:
+            # Exact repeats are a dict lookup; Redis and the similarity search need a thread
+            cached, cache_tier = tool_cache.lookup_exact(request.tool, request.parameters), "exact_hit"
+            if cached is None and tool_cache.has_blocking_tiers(request.tool):
+                cached, cache_tier = await asyncio.to_thread(
+                    tool_cache.lookup_blocking, request.tool, request.parameters
+                )
+            if cached is not None:
+                background_tasks.add_task(
+                    log_tool_call,
+                    tool_name=request.tool,
+                    parameters=request.parameters,
+                    user_id=request.user_id,
+                    session_id=request.session_id,
+                    execution_time_ms=_elapsed_ms(start_ns),
+                    status="success",
+                    result_summary="Served from cache"
+                )
+                return ToolJSONResponse({
+                    "success": True,
+                    "result": cached,
+                    "execution_time_ms": _elapsed_ms(start_ns),
+                    "tool_call_id": tool_call_id,
+                    "metadata": {
+                        "tool": request.tool,
+                        "timestamp": start_time.isoformat(),
+                        "cache": cache_tier
+                    }
+                })
         
-        elif request.tool == "kb.search":
-            result = search_knowledge_base_tool(
-                query=request.parameters.get("query"),
-                top_k=request.parameters.get("top_k", 5),
-                category=request.parameters.get("category"),
-                min_similarity=request.parameters.get("min_similarity", 0.7)
-            )
+        # Route to appropriate tool (sql.query with 'queries' runs as one batch)
+        dispatch_key = request.tool
+        if request.tool == "sql.query" and request.parameters.get("queries"):
+            dispatch_key = "sql.query#batch"
+        if dispatch_key not in TOOL_DISPATCH:
+            raise HTTPException(status_code=501, detail="Tool not implemented")
         
-        elif request.tool == "kpi.top_root_causes":
-            result = get_top_root_causes(
-                year=request.parameters.get("year"),
-                month=request.parameters.get("month"),
-                top_n=request.parameters.get("top_n", 10),
-                category_filter=request.parameters.get("category_filter")
-            )
+        tool_fn = TOOL_DISPATCH[dispatch_key][0]
+        kwargs = _tool_kwargs(dispatch_key, request.parameters)
+        cache_info = track_cache_status()
+        result = await asyncio.to_thread(tool_fn, **kwargs)
         
-        else:
-            raise HTTPException(status_code=501, detail="Tool not implemented")
+        if use_cache:
+            await asyncio.to_thread(tool_cache.store, request.tool, request.parameters, result)
         
         # Calculate execution time
-        execution_time_ms = int((datetime.now() - start_time).total_seconds() * 1000)
+        execution_time_ms = _elapsed_ms(start_ns)
         
-        # Log the tool call
-        # log_tool_call(
-        #     tool_name=request.tool,
-        #     parameters=request.parameters,
-        #     user_id=request.user_id,
-        #     session_id=request.session_id,
-        #     execution_time_ms=execution_time_ms,
-        #     status="success",
-        #     result_summary=f"Returned {len(result) if isinstance(result, list) else 1} results"
-        # )
+        # Observability for the result cache (negative hits = known-empty results)
+        cache_status = cache_info.get("status")
+        headers = {"X-Cache-Empty": "HIT"} if cache_status == "empty_hit" else None
         
-        return ToolCallResponse(
-            success=True,
-            result=result,
+        # Log the tool call after the response is sent
+        background_tasks.add_task(
+            log_tool_call,
+            tool_name=request.tool,
+            parameters=request.parameters,
+            user_id=request.user_id,
+            session_id=request.session_id,
             execution_time_ms=execution_time_ms,
-            tool_call_id=tool_call_id,
-            metadata={
+            status="success",
+            result_summary=f"Returned {len(result) if isinstance(result, list) else 1} results"
+        )
+        
+        return ToolJSONResponse({
+            "success": True,
+            "result": result,
+            "execution_time_ms": execution_time_ms,
+            "tool_call_id": tool_call_id,
+            "metadata": {
                 "tool": request.tool,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": start_time.isoformat(),
+                "cache": cache_status
             }
-        )
+        }, headers=headers)
+    
+    except HTTPException:
+        # Request errors (unknown tool, missing parameters) keep their status
+        raise
     
     except Exception as e:
-        execution_time_ms = int((datetime.now() - start_time).total_seconds() * 1000)
+        execution_time_ms = _elapsed_ms(start_ns)
         
-        # Log the error
-        log_tool_call(
+        error_message = str(e)
+        
+        # Log the error after the response is sent. Raising HTTPException would
+        # drop background tasks, so return the same 500 body directly.
+        background_tasks.add_task(
+            log_tool_call,
             tool_name=request.tool,
             parameters=request.parameters,
             user_id=request.user_id,
             session_id=request.session_id,
             execution_time_ms=execution_time_ms,
             status="error",
-            error_message=str(e)
+            error_message=error_message
         )
         
-        raise HTTPException(status_code=500, detail=str(e))
+        return ORJSONResponse(status_code=500, content={"detail": error_message})
+
+def _ndjson_rows(rows: Iterable[Any], stats: Dict[str, Any]) -> Iterator[bytes]:
+    """Encode rows as NDJSON lines; returns the tool generator's summary, if any"""
+    iterator = iter(rows)
+    while True:
+        try:
+            row = next(iterator)
+        except StopIteration as stop:
+            return stop.value or {}
+        stats["row_count"] += 1
+        yield orjson.dumps({"type": "row", "data": row}, default=_json_default) + b"\n"
+
+def _log_stream(request: ToolCallRequest, stats: Dict[str, Any]):
+    """Audit-log a streamed tool call once the stream has finished"""
+    log_tool_call(
+        tool_name=request.tool,
+        parameters=request.parameters,
+        user_id=request.user_id,
+        session_id=request.session_id,
+        execution_time_ms=stats["execution_time_ms"],
+        status=stats["status"],
+        result_summary=f"Streamed {stats['row_count']} results",
+        error_message=stats.get("error")
+    )
+
+@app.post("/tools/call/stream")
+async def call_tool_stream(request: ToolCallRequest, background_tasks: BackgroundTasks):
+    """
+    MCP: Call a tool and stream its rows as NDJSON
+    
+    Emits one {"type": "row", "data": ...} line per result row and a final
+    {"type": "done", ...} line, or {"type": "error", ...} if the tool fails
+    mid-stream. Streamed calls bypass the result caches.
+    """
+    if request.tool not in STREAM_DISPATCH:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Tool '{request.tool}' does not support streaming. Streamable tools: {list(STREAM_DISPATCH.keys())}"
+        )
+    
+    start_ns = time.perf_counter_ns()
+    start_time = datetime.now()
+    tool_call_id = f"{request.tool}_{start_time.strftime('%Y%m%d_%H%M%S_%f')}"
+    tool_fn = STREAM_DISPATCH[request.tool]
+    kwargs = _tool_kwargs(request.tool, request.parameters)
+    stats: Dict[str, Any] = {"row_count": 0, "status": "success", "execution_time_ms": 0}
+    
+    # Sync generator: Starlette pulls each chunk in its threadpool, so the
+    # blocking tool never runs on the event loop
+    def ndjson():
+        try:
+            summary = yield from _ndjson_rows(tool_fn(**kwargs), stats)
+            stats["execution_time_ms"] = _elapsed_ms(start_ns)
+            yield orjson.dumps({
+                "type": "done",
+                "tool_call_id": tool_call_id,
+                "row_count": stats["row_count"],
+                "execution_time_ms": stats["execution_time_ms"],
+                **summary
+            }) + b"\n"
+        except Exception as e:
+            stats["execution_time_ms"] = _elapsed_ms(start_ns)
+            stats["status"] = "error"
+            stats["error"] = str(e)
+            yield orjson.dumps({"type": "error", "tool_call_id": tool_call_id, "detail": str(e)}) + b"\n"
+    
+    background_tasks.add_task(_log_stream, request, stats)
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson", background=background_tasks)
 
 @app.get("/logs/recent")
 async def recent_logs(limit: int = 50):
@@ -272,7 +489,9 @@ async def health_check():
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
         "tools_count": len(TOOLS_REGISTRY),
-        "database": "connected"
+        "database": "connected",
+        "cache": get_cache_stats(),
+        "semantic_cache": get_tool_semantic_cache().get_stats()
     }
 
 # =====================================================
@@ -283,6 +502,9 @@ if __name__ == "__main__":
     import uvicorn
     
     port = int(os.getenv("MCP_SERVER_PORT", 8000))
+    # Auto-reload is for local development only; it runs a single worker
+    reload = os.getenv("DEV_RELOAD") == "1"
+    workers = 1 if reload else int(os.getenv("WORKERS", "4"))
     
     print("=" * 60)
     print("🚀 Starting dBank MCP Server")
@@ -290,6 +512,7 @@ if __name__ == "__main__":
     print(f"\n📍 Server: http://localhost:{port}")
     print(f"📚 Docs: http://localhost:{port}/docs")
     print(f"🔧 Tools: {len(TOOLS_REGISTRY)}")
+    print(f"👷 Workers: {workers}{' (reload)' if reload else ''}")
     print("\nAvailable Tools:")
     for tool_name in TOOLS_REGISTRY.keys():
         print(f"  - {tool_name}")
@@ -299,6 +522,10 @@ if __name__ == "__main__":
         "server:app",
         host="0.0.0.0",
         port=port,
-        reload=True,
+        reload=reload,
+        workers=workers,
+        # uvloop and httptools come with uvicorn[standard]; uvloop has no Windows build
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
         log_level="info"
     )
\ No newline at end of file
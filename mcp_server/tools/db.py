@@ -0,0 +1,113 @@
+"""
+Database Connections - Shared psycopg2 pool for MCP tools
+
+Connections are opened once per worker and reused, so tool calls skip the
+TCP + auth handshake. The pool is created on first use; importing a tool
+does not require the database to be up.
+"""
+
+import os
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Optional, Sequence
+
+import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Database connection
+DB_CONFIG = {
+    'host': os.getenv('POSTGRES_HOST', 'localhost'),
+    'port': os.getenv('POSTGRES_PORT', '5433'),
+    'database': os.getenv('POSTGRES_DB', 'dbank'),
+    'user': os.getenv('POSTGRES_USER', 'dbank_user'),
+    'password': os.getenv('POSTGRES_PASSWORD', 'dbank_pass_2025'),
+    'application_name': os.getenv('DB_APPLICATION_NAME', 'dbank_mcp_tools')
+}
+
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', '1'))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', '8'))
+
+class _ToolConnection(psycopg2.extensions.connection):
+    """Connection that remembers which statements it has prepared"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+
+_pool: Optional[ThreadedConnectionPool] = None
+_pool_lock = threading.Lock()
+# ThreadedConnectionPool raises when exhausted; callers wait for a slot instead
+_slots = threading.BoundedSemaphore(DB_POOL_MAX)
+
+
+def _get_pool() -> ThreadedConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadedConnectionPool(
+                    DB_POOL_MIN, DB_POOL_MAX, connection_factory=_ToolConnection, **DB_CONFIG
+                )
+                atexit.register(_pool.closeall)
+    return _pool
+
+
+@contextmanager
+def get_db_connection(read_only: bool = False):
+    """
+    Context manager for a pooled database connection
+
+    The connection's open transaction is rolled back before it goes back to
+    the pool, so callers that write must commit themselves. Settings a caller
+    changes must be transaction-scoped (SET LOCAL) for the same reason.
+
+    Args:
+        read_only: Run the connection's transactions as READ ONLY (sent with
+            BEGIN, so no extra round trip)
+    """
+    conn = None
+    with _slots:
+        try:
+            conn = _get_pool().getconn()
+            if read_only:
+                conn.readonly = True
+            yield conn
+        except psycopg2.Error as e:
+            logger.error(f"Database connection error: {e}")
+            raise Exception(f"Failed to connect to database: {str(e)}")
+        finally:
+            if conn is not None:
+                broken = bool(conn.closed)
+                if not broken:
+                    try:
+                        conn.rollback()
+                        conn.readonly = None
+                    except psycopg2.Error:
+                        broken = True
+                _pool.putconn(conn, close=broken)
+
+
+def execute_prepared(cur, name: str, sql: str, params: Sequence = ()):
+    """
+    Execute sql as the server-side prepared statement `name`
+
+    sql uses $1..$n placeholders. It is prepared on the cursor's connection
+    on first use, so later calls on that pooled connection skip parse and
+    plan. Each distinct sql text needs its own name.
+    """
+    conn = cur.connection
+    if name not in conn.prepared:
+        cur.execute(f"PREPARE {name} AS {sql}")
+        conn.prepared.add(name)
+    if params:
+        cur.execute(f"EXECUTE {name}({', '.join(['%s'] * len(params))})", params)
+    else:
+        cur.execute(f"EXECUTE {name}")
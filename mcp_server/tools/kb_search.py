@@ -4,19 +4,265 @@ Knowledge Base Search Tool - Enhanced version with debugging and fallback
 
 import sys
 import os
-from pathlib import Path
+import time
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from itertools import count
 import logging
 
-# Add parent directory to path to import vector_search
-sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+import numpy as np
+from cachetools import TTLCache
+from psycopg2.extras import RealDictCursor, execute_values
 
-from vector_store.vector_search import search_knowledge_base
-from typing import List, Dict, Optional
+# vector_store resolves from the repo root on PYTHONPATH (set in the Docker image)
+from vector_store.vector_search import (
+    KB_BINARY_RERANK_MIN_K, KB_CATEGORIES, search_knowledge_base, search_by_embeddings, get_embedding
+)
+from typing import Any, List, Dict, Optional, Tuple
 
-# Setup logging
-logging.basicConfig(level=logging.INFO)
+try:
+    from .db import get_db_connection
+except ImportError:  # run directly as a script
+    from db import get_db_connection
+
+# Setup logging (handlers and level are left to the host process)
 logger = logging.getLogger(__name__)
 
+# Queries whose embeddings are at least this similar reuse each other's results
+KB_RESULT_CACHE_THRESHOLD = float(os.getenv('KB_RESULT_CACHE_THRESHOLD', '0.95'))
+KB_RESULT_CACHE_SIZE = int(os.getenv('KB_RESULT_CACHE_SIZE', '512'))
+KB_RESULT_CACHE_TTL_SECONDS = int(os.getenv('KB_CACHE_TTL_SECONDS', '3600'))
+# Verbatim repeats (same query text and arguments) skip the similarity scan
+KB_EXACT_CACHE_SIZE = int(os.getenv('KB_EXACT_CACHE_SIZE', '1024'))
+
+# Rows fetched for the unfiltered fallback tiers; one fixed size (at least the
+# 20-result cap) so concurrent searches with different top_k share a batch
+KB_CANDIDATE_POOL = int(os.getenv('KB_CANDIDATE_POOL', '20'))
+
+# Concurrent candidate searches arriving within the window share one statement
+KB_BATCH_SIZE = int(os.getenv('KB_BATCH_SIZE', '16'))
+KB_BATCH_WAIT_MS = float(os.getenv('KB_BATCH_WAIT_MS', '5'))
+
+_VALID_CATEGORIES = frozenset(KB_CATEGORIES)
+
+# check_database_status aggregates the whole documents table; reuse the counts
+KB_STATUS_TTL_SECONDS = int(os.getenv('KB_STATUS_TTL_SECONDS', '60'))
+_status_cache = TTLCache(maxsize=1, ttl=KB_STATUS_TTL_SECONDS)
+_status_lock = threading.Lock()
+
+
+class _SemanticResultCache:
+    """
+    Formatted search results keyed by query embedding
+
+    Entries are grouped by filter key (category, min_similarity, top_k,
+    fallback) so results never cross filters. Each group holds one normalized
+    embedding matrix, so a lookup is a single matrix-vector product. Least
+    recently used entries are evicted across all groups. An exact tier keyed
+    on the verbatim query and arguments is checked first.
+    """
+
+    def __init__(
+        self,
+        threshold: float = KB_RESULT_CACHE_THRESHOLD,
+        capacity: int = KB_RESULT_CACHE_SIZE,
+        ttl: int = KB_RESULT_CACHE_TTL_SECONDS,
+        exact_capacity: int = KB_EXACT_CACHE_SIZE
+    ):
+        self.threshold = threshold
+        self.capacity = capacity
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._ids = count()
+        # filter key -> {"emb": float32[N, D], "ids": [...], "results": [...], "expires": [...]}
+        self._groups: Dict[Tuple, Dict[str, Any]] = {}
+        self._lru: "OrderedDict[Tuple[Tuple, int], None]" = OrderedDict()
+        self._exact: TTLCache = TTLCache(maxsize=exact_capacity, ttl=ttl)
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup_exact(self, exact_key: Tuple) -> Optional[List[Dict]]:
+        """Cached results of the same query with the same arguments, or None"""
+        with self._lock:
+            results = self._exact.get(exact_key)
+        return [dict(r) for r in results] if results is not None else None
+
+    def store_exact(self, exact_key: Tuple, results: List[Dict]):
+        """Remember results for a verbatim query"""
+        with self._lock:
+            self._exact[exact_key] = [dict(r) for r in results]
+
+    def clear(self):
+        """Drop every cached result"""
+        with self._lock:
+            self._groups.clear()
+            self._lru.clear()
+            self._exact.clear()
+
+    def lookup(self, key: Tuple, embedding: List[float]) -> Optional[List[Dict]]:
+        """Cached results of the most similar earlier query, or None"""
+        query = self._normalize(embedding)
+        with self._lock:
+            group = self._groups.get(key)
+            if not group or not group['ids']:
+                return None
+            sims = group['emb'] @ query
+            best = int(np.argmax(sims))
+            if sims[best] < self.threshold or group['expires'][best] < time.time():
+                return None
+            self._lru.move_to_end((key, group['ids'][best]))
+            results = group['results'][best]
+        # Copies: callers such as search_with_context annotate result dicts
+        return [dict(r) for r in results]
+
+    def store(self, key: Tuple, embedding: List[float], results: List[Dict]):
+        """Remember results for a query embedding"""
+        query = self._normalize(embedding)
+        with self._lock:
+            entry_id = next(self._ids)
+            group = self._groups.get(key)
+            if group is None or group['emb'].shape[1] != query.size:
+                group = {'emb': np.empty((0, query.size), dtype=np.float32), 'ids': [], 'results': [], 'expires': []}
+                self._groups[key] = group
+            group['emb'] = np.vstack([group['emb'], query[None, :]])
+            group['ids'].append(entry_id)
+            group['results'].append([dict(r) for r in results])
+            group['expires'].append(time.time() + self.ttl)
+            self._lru[(key, entry_id)] = None
+
+            while len(self._lru) > self.capacity:
+                (old_key, old_id), _ = self._lru.popitem(last=False)
+                old = self._groups[old_key]
+                index = old['ids'].index(old_id)
+                old['emb'] = np.delete(old['emb'], index, axis=0)
+                del old['ids'][index], old['results'][index], old['expires'][index]
+
+
+_result_cache = _SemanticResultCache()
+
+
+class _CandidateBatcher:
+    """
+    Coalesces concurrent candidate searches into one pgvector statement
+
+    kb.search runs in asyncio.to_thread workers, so callers block on a Future
+    while one daemon thread drains the queue: it takes up to max_batch
+    searches arriving within max_wait seconds of the first and runs them as
+    a single LATERAL query (one round trip, one HNSW scan per query).
+    """
+
+    def __init__(self, max_batch: int = KB_BATCH_SIZE, max_wait: float = KB_BATCH_WAIT_MS / 1000):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue: queue.Queue = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def search(self, embedding: List[float], limit: int, requested_k: int) -> List[Dict]:
+        """
+        Unfiltered nearest chunks for an embedding, batched with concurrent callers
+
+        limit is the candidate pool size; requested_k is the caller's top_k,
+        which alone decides whether the binary-quantized stage runs.
+        """
+        if self._worker is None:
+            with self._start_lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name='kb-search-batcher', daemon=True)
+                    self._worker.start()
+        future: Future = Future()
+        self._queue.put((embedding, limit, requested_k, future))
+        return future.result()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            # Only small and large requests need different statements; the
+            # largest requested_k in a group stands for the whole group
+            by_plan: Dict[Tuple[int, bool], List[Tuple[List[float], int, Future]]] = {}
+            for embedding, limit, requested_k, future in batch:
+                key = (limit, requested_k > KB_BINARY_RERANK_MIN_K)
+                by_plan.setdefault(key, []).append((embedding, requested_k, future))
+            for (limit, _), items in by_plan.items():
+                try:
+                    grouped = search_by_embeddings(
+                        [embedding for embedding, _, _ in items],
+                        top_k=limit,
+                        min_similarity=0.0,
+                        requested_k=max(requested_k for _, requested_k, _ in items)
+                    )
+                except Exception as e:
+                    for _, _, future in items:
+                        future.set_exception(e)
+                    continue
+                for (_, _, future), results in zip(items, grouped):
+                    future.set_result(results)
+
+
+_candidate_batcher = _CandidateBatcher()
+
+def _fallback_search(
+    query: str,
+    query_embedding: List[float],
+    top_k: int,
+    category: Optional[str],
+    min_similarity: float
+) -> List[Dict]:
+    """
+    First non-empty tier of the fallback cascade
+
+    Tiers: the requested filters; threshold lowered to 0.3; category dropped;
+    any similarity. Each pool is fetched once at similarity 0 and the tier
+    thresholds are applied in Python. Category tiers read that category's
+    nearest chunks (its partial HNSW index) so they never depend on how other
+    categories rank; unfiltered tiers share a batched statement.
+    """
+    tiers = [(category, min_similarity)]
+    if min_similarity > 0.3:
+        tiers.append((category, 0.3))
+    if category:
+        tiers.append((None, 0.3))
+    tiers.append((None, 0.0))
+    
+    pools: Dict[Optional[str], List[Dict]] = {}
+    for tier, (tier_category, threshold) in enumerate(tiers):
+        if tier_category not in pools:
+            if tier_category:
+                pools[tier_category] = search_knowledge_base(
+                    query=query,
+                    top_k=top_k,
+                    filter_category=tier_category,
+                    min_similarity=0.0
+                )
+            else:
+                pools[None] = _candidate_batcher.search(query_embedding, max(top_k, KB_CANDIDATE_POOL), top_k)
+            logger.info("✅ Candidate search (category=%s) returned %d rows", tier_category, len(pools[tier_category]))
+        results = [r for r in pools[tier_category] if r['similarity'] >= threshold][:top_k]
+        if results:
+            if tier:
+                logger.info("🔄 Fallback: %d results with category=%s, min_sim=%s", len(results), tier_category, threshold)
+            return results
+    
+    logger.warning("⚠️  No candidates for fallback")
+    return []
+
+
 def search_knowledge_base_tool(
     query: str,
     top_k: int = 5,
@@ -47,64 +293,42 @@ def search_knowledge_base_tool(
     if min_similarity < 0.0 or min_similarity > 1.0:
         raise ValueError("min_similarity must be between 0.0 and 1.0")
     
-    valid_categories = ['product_guide', 'support_doc', 'reference_doc', 'general']
-    if category and category not in valid_categories:
-        raise ValueError(f"category must be one of: {', '.join(valid_categories)}")
+    if category and category not in _VALID_CATEGORIES:
+        raise ValueError(f"category must be one of: {', '.join(KB_CATEGORIES)}")
     
     try:
-        logger.info(f"🔍 Searching: '{query}' | top_k={top_k} | category={category} | min_sim={min_similarity}")
+        logger.info("🔍 Searching: '%s' | top_k=%d | category=%s | min_sim=%s", query, top_k, category, min_similarity)
         
-        # Call the vector search function
-        results = search_knowledge_base(
-            query=query,
-            top_k=top_k,
-            filter_category=category,
-            min_similarity=min_similarity
-        )
+        exact_key = (query, category, min_similarity, top_k, enable_fallback)
+        cached = _result_cache.lookup_exact(exact_key)
+        if cached is not None:
+            logger.info("⚡ Returning %d cached results for a repeated query", len(cached))
+            return cached
         
-        logger.info(f"✅ Initial search returned {len(results)} results")
+        # Near-duplicate questions reuse earlier results without a pgvector round trip.
+        # get_embedding is memoized, so search_knowledge_base reuses this embedding.
+        cache_key = (category, min_similarity, top_k, enable_fallback)
+        query_embedding = get_embedding(query)
+        cached = _result_cache.lookup(cache_key, query_embedding)
+        if cached is not None:
+            logger.info("⚡ Returning %d cached results for a similar query", len(cached))
+            _result_cache.store_exact(exact_key, cached)
+            return cached
         
-        # Fallback strategy if no results
-        if not results and enable_fallback:
-            logger.warning(f"⚠️  No results with similarity >= {min_similarity}")
-            
-            # Try 1: Lower similarity threshold
-            if min_similarity > 0.3:
-                logger.info(f"🔄 Retrying with lower threshold (0.3)...")
-                results = search_knowledge_base(
-                    query=query,
-                    top_k=top_k,
-                    filter_category=category,
-                    min_similarity=0.3
-                )
-                logger.info(f"   Found {len(results)} results with threshold 0.3")
-            
-            # Try 2: Remove category filter if still no results
-            if not results and category:
-                logger.info(f"🔄 Retrying without category filter...")
-                results = search_knowledge_base(
-                    query=query,
-                    top_k=top_k,
-                    filter_category=None,
-                    min_similarity=0.3
-                )
-                logger.info(f"   Found {len(results)} results without category filter")
-            
-            # Try 3: Get ANY results (no similarity filter)
-            if not results:
-                logger.info(f"🔄 Final attempt: getting top results regardless of similarity...")
-                results = search_knowledge_base(
-                    query=query,
-                    top_k=top_k,
-                    filter_category=None,
-                    min_similarity=0.0  # No filter
-                )
-                logger.info(f"   Found {len(results)} results (all similarities)")
+        if enable_fallback:
+            results = _fallback_search(query, query_embedding, top_k, category, min_similarity)
+        else:
+            results = search_knowledge_base(
+                query=query,
+                top_k=top_k,
+                filter_category=category,
+                min_similarity=min_similarity
+            )
+            logger.info("✅ Search returned %d results", len(results))
         
         # Format results for MCP response
-        formatted_results = []
-        for result in results:
-            formatted_results.append({
+        formatted_results = [
+            {
                 'title': result.get('title', 'Untitled'),
                 'content': result.get('content', ''),
                 'similarity': round(result.get('similarity', 0.0), 3),
@@ -114,70 +338,70 @@ def search_knowledge_base_tool(
                 'chunk_title': result.get('chunk_title', 'N/A'),
                 'is_critical': result.get('is_critical', False),
                 'source': result.get('filepath', '')
-            })
+            }
+            for result in results
+        ]
         
         # Log final result count
         if formatted_results:
-            logger.info(f"📊 Returning {len(formatted_results)} results (similarity range: {formatted_results[-1]['similarity']:.3f} - {formatted_results[0]['similarity']:.3f})")
+            if logger.isEnabledFor(logging.INFO):
+                logger.info(
+                    "📊 Returning %d results (similarity range: %.3f - %.3f)",
+                    len(formatted_results), formatted_results[-1]['similarity'], formatted_results[0]['similarity']
+                )
         else:
-            logger.warning(f"❌ No results found even after fallback attempts")
+            logger.warning("❌ No results found even after fallback attempts")
+        
+        if formatted_results:
+            _result_cache.store(cache_key, query_embedding, formatted_results)
+            _result_cache.store_exact(exact_key, formatted_results)
         
         return formatted_results
     
     except Exception as e:
-        logger.error(f"❌ Knowledge base search failed: {str(e)}", exc_info=True)
+        logger.error("❌ Knowledge base search failed: %s", e, exc_info=True)
         raise Exception(f"Knowledge base search failed: {str(e)}")
 
+# Admin hook: drop cached search results (e.g. after re-embedding the KB)
+search_knowledge_base_tool.cache_clear = _result_cache.clear
+
 def check_database_status() -> Dict:
     """
     Check database connectivity and content
-    Returns database statistics
+    Returns database statistics (cached for KB_STATUS_TTL_SECONDS after a
+    successful check; errors are not cached)
     """
+    with _status_lock:
+        cached = _status_cache.get('status')
+    if cached is not None:
+        return cached
+    
     try:
-        import os
-        from dotenv import load_dotenv
-        import psycopg2
-        from psycopg2.extras import RealDictCursor
-        
-        load_dotenv()
-        
-        DB_CONFIG = {
-            'host': os.getenv('POSTGRES_HOST', 'localhost'),
-            'port': os.getenv('POSTGRES_PORT', '5433'),
-            'database': os.getenv('POSTGRES_DB', 'dbank'),
-            'user': os.getenv('POSTGRES_USER', 'dbank_user'),
-            'password': os.getenv('POSTGRES_PASSWORD', 'dbank_pass_2025')
-        }
-        
-        conn = psycopg2.connect(**DB_CONFIG)
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        # Get stats
-        cur.execute("SELECT COUNT(*) as total FROM vector_store.documents")
-        total_chunks = cur.fetchone()['total']
-        
-        cur.execute("SELECT COUNT(DISTINCT document_name) as total FROM vector_store.documents")
-        total_docs = cur.fetchone()['total']
-        
-        cur.execute("""
-            SELECT metadata->>'category' as category, COUNT(*) as count
-            FROM vector_store.documents
-            GROUP BY metadata->>'category'
-        """)
-        categories = {row['category']: row['count'] for row in cur.fetchall()}
+        with get_db_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                # One scan; every chunk of a document shares its category, so
+                # per-category document counts add up to the total
+                cur.execute("""
+                    SELECT metadata->>'category' as category,
+                           COUNT(*) as chunks,
+                           COUNT(DISTINCT document_name) as documents
+                    FROM vector_store.documents
+                    GROUP BY metadata->>'category'
+                """)
+                rows = cur.fetchall()
         
-        cur.close()
-        conn.close()
-        
-        return {
+        status = {
             'status': 'connected',
-            'total_documents': total_docs,
-            'total_chunks': total_chunks,
-            'categories': categories
+            'total_documents': sum(row['documents'] for row in rows),
+            'total_chunks': sum(row['chunks'] for row in rows),
+            'categories': {row['category']: row['chunks'] for row in rows}
         }
+        with _status_lock:
+            _status_cache['status'] = status
+        return status
     
     except Exception as e:
-        logger.error(f"Database check failed: {e}")
+        logger.error("Database check failed: %s", e)
         return {
             'status': 'error',
             'error': str(e)
@@ -185,25 +409,41 @@ def check_database_status() -> Dict:
 
 def get_document_categories() -> List[str]:
     """Get available document categories"""
-    return ['product_guide', 'support_doc', 'reference_doc', 'general']
+    return list(KB_CATEGORIES)
 
 def get_critical_documents(top_k: int = 20) -> List[Dict]:
     """Get all documents marked as critical (e.g., v1.2 issues)"""
     try:
-        # Search for critical documents with low threshold
-        results = search_knowledge_base(
-            query="critical issues bugs problems version v1.2",
-            top_k=top_k,
-            min_similarity=0.3
-        )
+        # Critical chunks are flagged in metadata at embed time; read them
+        # through the partial index instead of a vector search
+        with get_db_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute("""
+                    SELECT doc_id, document_name, chunk_index, content, metadata
+                    FROM vector_store.documents
+                    WHERE metadata->>'is_critical' = 'true'
+                    ORDER BY document_name, chunk_index
+                    LIMIT %s
+                """, (top_k,))
+                rows = cur.fetchall()
         
-        # Filter for critical ones
-        critical = [r for r in results if r.get('is_critical', False)]
+        critical = [
+            {
+                'doc_id': row['doc_id'],
+                'title': row['document_name'],
+                'content': row['content'],
+                'chunk_index': row['chunk_index'],
+                'category': row['metadata'].get('category'),
+                'filename': row['metadata'].get('filename'),
+                'is_critical': True
+            }
+            for row in rows
+        ]
         
-        logger.info(f"Found {len(critical)} critical documents")
+        logger.info("Found %d critical documents", len(critical))
         return critical
     except Exception as e:
-        logger.error(f"Failed to get critical documents: {e}")
+        logger.error("Failed to get critical documents: %s", e)
         raise Exception(f"Failed to get critical documents: {str(e)}")
 
 def search_with_context(
@@ -222,57 +462,38 @@ def search_with_context(
         if not results or not include_surrounding:
             return results
         
-        # For each result, try to get adjacent chunks
-        import os
-        from dotenv import load_dotenv
-        import psycopg2
-        from psycopg2.extras import RealDictCursor
-        
-        load_dotenv()
+        # One round trip: each result's window (previous, own and next chunk)
+        # joined as VALUES rows, tagged with the result's position
+        windows = [
+            (i, r['title'], r['chunk_index'] - 1, r['chunk_index'] + 1)
+            for i, r in enumerate(results)
+        ]
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                rows = execute_values(cur, """
+                    SELECT w.idx, d.content
+                    FROM (VALUES %s) AS w(idx, document_name, lo, hi)
+                    JOIN vector_store.documents d
+                      ON d.document_name = w.document_name
+                     AND d.chunk_index BETWEEN w.lo AND w.hi
+                    ORDER BY w.idx, d.chunk_index
+                """, windows, fetch=True)
         
-        DB_CONFIG = {
-            'host': os.getenv('POSTGRES_HOST', 'localhost'),
-            'port': os.getenv('POSTGRES_PORT', '5433'),
-            'database': os.getenv('POSTGRES_DB', 'dbank'),
-            'user': os.getenv('POSTGRES_USER', 'dbank_user'),
-            'password': os.getenv('POSTGRES_PASSWORD', 'dbank_pass_2025')
-        }
-        
-        conn = psycopg2.connect(**DB_CONFIG)
-        cur = conn.cursor(cursor_factory=RealDictCursor)
+        adjacent: Dict[int, List[str]] = {}
+        for idx, content in rows:
+            adjacent.setdefault(idx, []).append(content)
         
         enriched_results = []
-        
-        for result in results:
-            doc_name = result['title']
-            chunk_idx = result['chunk_index']
-            
-            # Get adjacent chunks
-            cur.execute("""
-                SELECT content, chunk_index
-                FROM vector_store.documents
-                WHERE document_name = %s 
-                AND chunk_index IN (%s, %s, %s)
-                ORDER BY chunk_index
-            """, (doc_name, chunk_idx - 1, chunk_idx, chunk_idx + 1))
-            
-            adjacent = cur.fetchall()
-            
-            # Combine content
-            full_content = "\n\n---\n\n".join([chunk['content'] for chunk in adjacent])
-            
-            result['full_context'] = full_content
-            result['has_context'] = len(adjacent) > 1
-            
+        for i, result in enumerate(results):
+            chunks = adjacent.get(i, [])
+            result['full_context'] = "\n\n---\n\n".join(chunks)
+            result['has_context'] = len(chunks) > 1
             enriched_results.append(result)
         
-        cur.close()
-        conn.close()
-        
         return enriched_results
     
     except Exception as e:
-        logger.error(f"Context enrichment failed: {e}")
+        logger.error("Context enrichment failed: %s", e)
         # Return original results if context enrichment fails
         return results
 
@@ -327,6 +548,8 @@ def example_searches():
     return examples
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    
     # Comprehensive testing
     print("=" * 80)
     print("🧪 TESTING KNOWLEDGE BASE SEARCH TOOL")
@@ -419,7 +642,7 @@ if __name__ == "__main__":
         critical = get_critical_documents(top_k=10)
         print(f"✅ Found {len(critical)} critical documents")
         for doc in critical[:3]:
-            print(f"   - {doc['title']} (sim: {doc['similarity']})")
+            print(f"   - {doc['title']} ({doc['filename']})")
     except Exception as e:
         print(f"❌ Error: {e}")
     
@@ -3,59 +3,56 @@ KPI Tools - Enhanced version with better error handling and features
 Pre-aggregated KPI queries from dbt marts
 """
 
-import os
 import logging
+from itertools import product
 from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime, date
-from contextlib import contextmanager
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 from dotenv import load_dotenv
 
+try:
+    from .db import get_db_connection, execute_prepared
+except ImportError:  # run directly as a script
+    from db import get_db_connection, execute_prepared
+
+# The marts refresh daily: repeated calls with the same arguments are served
+# from memory (empty results for a shorter time so backfills show up quickly).
+# utils.tool_cache.clear_tool_caches() drops them after a manual dbt run.
+try:
+    from utils.tool_cache import ttl_cache, KPI_CACHE_TTL_SECONDS, EMPTY_CACHE_TTL_SECONDS
+except ImportError:  # run directly as a script: results are not cached
+    KPI_CACHE_TTL_SECONDS = EMPTY_CACHE_TTL_SECONDS = 0
+
+    def ttl_cache(namespace, ttl, maxsize=256, empty_ttl=None):
+        return lambda func: func
+
 load_dotenv()
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Database connection
-DB_CONFIG = {
-    'host': os.getenv('POSTGRES_HOST', 'localhost'),
-    'port': os.getenv('POSTGRES_PORT', '5433'),
-    'database': os.getenv('POSTGRES_DB', 'dbank'),
-    'user': os.getenv('POSTGRES_USER', 'dbank_user'),
-    'password': os.getenv('POSTGRES_PASSWORD', 'dbank_pass_2025')
-}
-
-# =====================================================
-# Database Connection Management
-# =====================================================
-
-@contextmanager
-def get_db_connection():
-    """Context manager for database connections"""
-    conn = None
-    try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        yield conn
-    except psycopg2.Error as e:
-        logger.error(f"Database connection error: {e}")
-        raise Exception(f"Failed to connect to database: {str(e)}")
-    finally:
-        if conn:
-            conn.close()
-
 def safe_int(value: Any, default: int = 0) -> int:
     """Safely convert to int"""
+    # COUNT/integer columns already arrive as int
+    if type(value) is int:
+        return value
+    if value is None:
+        return default
     try:
-        return int(value) if value is not None else default
+        return int(value)
     except (ValueError, TypeError):
         return default
 
 def safe_float(value: Any, default: float = 0.0) -> float:
     """Safely convert to float"""
+    if type(value) is float:
+        return value
+    if value is None:
+        return default
     try:
-        return float(value) if value is not None else default
+        return float(value)
     except (ValueError, TypeError):
         return default
 
@@ -63,6 +60,138 @@ def safe_float(value: Any, default: float = 0.0) -> float:
 # Root Cause Analysis
 # =====================================================
 
+# mart_top_root_causes columns read by the top root causes queries
+_ROOT_CAUSE_COLUMNS = """
+    root_cause_name,
+    root_cause_severity,
+    category_name,
+    product_category,
+    total_tickets,
+    open_tickets,
+    resolved_tickets,
+    pct_of_period,
+    pct_open,
+    avg_resolution_hours,
+    median_resolution_hours,
+    avg_satisfaction_score,
+    satisfaction_rate,
+    v12_related_tickets,
+    pct_v12_related,
+    created_year,
+    created_month,
+    created_month_name
+"""
+
+def _format_root_cause(row: Tuple) -> Dict[str, Any]:
+    """Root cause result from a _ROOT_CAUSE_COLUMNS tuple row, with safe type conversions"""
+    (
+        name, severity, category, product_category,
+        total_tickets, open_tickets, resolved_tickets,
+        pct_of_period, pct_open, avg_resolution_hours, median_resolution_hours,
+        avg_satisfaction, satisfaction_rate, v12_tickets, pct_v12,
+        year, month, month_name
+    ) = row
+    return {
+        'root_cause': name,
+        'severity': severity,
+        'category': category,
+        'product_category': product_category,
+        'metrics': {
+            'total_tickets': safe_int(total_tickets),
+            'open_tickets': safe_int(open_tickets),
+            'resolved_tickets': safe_int(resolved_tickets),
+            'pct_of_period': safe_float(pct_of_period),
+            'pct_open': safe_float(pct_open),
+            'avg_resolution_hours': safe_float(avg_resolution_hours),
+            'median_resolution_hours': safe_float(median_resolution_hours),
+            'avg_satisfaction': safe_float(avg_satisfaction),
+            'satisfaction_rate': safe_float(satisfaction_rate)
+        },
+        'v12_impact': {
+            'v12_tickets': safe_int(v12_tickets),
+            'pct_v12': safe_float(pct_v12)
+        },
+        'time_period': {
+            'year': safe_int(year),
+            'month': safe_int(month),
+            'month_name': month_name
+        }
+    }
+
+def _build_top_root_causes_queries() -> Dict[str, str]:
+    """
+    SQL for every combination of get_top_root_causes filters, by statement name
+    
+    Each optional filter (m: month, c: category, s: severity, t: min tickets)
+    adds a plain predicate, so every variant keeps a WHERE clause the planner
+    can match to the mart's indexes and is prepared under its own name.
+    """
+    predicates = (
+        ('m', 'created_month ='),
+        ('c', 'category_name ='),
+        ('s', 'root_cause_severity ='),
+        ('t', 'total_tickets >=')
+    )
+    queries = {}
+    for present in product((False, True), repeat=len(predicates)):
+        name = "kpi_top_root_causes_"
+        sql = f"SELECT {_ROOT_CAUSE_COLUMNS} FROM analytics_marts.mart_top_root_causes WHERE created_year = $1"
+        n = 1
+        for (flag, predicate), on in zip(predicates, present):
+            if on:
+                n += 1
+                name += flag
+                sql += f" AND {predicate} ${n}"
+        queries[name] = sql + f" ORDER BY total_tickets DESC LIMIT ${n + 1}"
+    return queries
+
+_TOP_ROOT_CAUSES_QUERIES = _build_top_root_causes_queries()
+
+_SEVERITY_LEVELS = frozenset(('critical', 'high', 'medium', 'low'))
+
+def _validate_period(year: int, month: Optional[int] = None):
+    """Raise ValueError for a year outside the mart's range or a month outside 1-12"""
+    current_year = datetime.now().year
+    if year < 2020 or year > current_year + 1:
+        raise ValueError(f"Year must be between 2020 and {current_year + 1}")
+    
+    if month is not None and (month < 1 or month > 12):
+        raise ValueError("Month must be between 1 and 12")
+
+def _top_root_causes_statement(
+    year: int,
+    month: Optional[int],
+    top_n: int,
+    category_filter: Optional[str],
+    severity_filter: Optional[str],
+    min_tickets: int
+) -> Tuple[str, List[Any]]:
+    """Validate get_top_root_causes arguments; return its statement name and parameters"""
+    # Validate inputs (month 0 means no month filter, as before)
+    _validate_period(year, month or None)
+    
+    if top_n < 1 or top_n > 100:
+        raise ValueError("top_n must be between 1 and 100")
+    
+    severity = severity_filter.lower() if severity_filter else None
+    if severity and severity not in _SEVERITY_LEVELS:
+        raise ValueError("severity_filter must be one of: critical, high, medium, low")
+    
+    # Optional filters that are set, in _TOP_ROOT_CAUSES_QUERIES order
+    filters = [
+        (flag, value)
+        for flag, value in (
+            ('m', month),
+            ('c', category_filter),
+            ('s', severity),
+            ('t', min_tickets if min_tickets > 0 else None)
+        )
+        if value
+    ]
+    statement = "kpi_top_root_causes_" + "".join(flag for flag, _ in filters)
+    return statement, [year, *(value for _, value in filters), top_n]
+
+@ttl_cache("kpi.top_root_causes", ttl=KPI_CACHE_TTL_SECONDS, empty_ttl=EMPTY_CACHE_TTL_SECONDS)
 def get_top_root_causes(
     year: int,
     month: Optional[int] = None,
@@ -85,121 +214,126 @@ def get_top_root_causes(
     Returns:
         List of top root causes with metrics
     """
-    # Validate inputs
-    current_year = datetime.now().year
-    if year < 2020 or year > current_year + 1:
-        raise ValueError(f"Year must be between 2020 and {current_year + 1}")
+    statement, params = _top_root_causes_statement(
+        year, month, top_n, category_filter, severity_filter, min_tickets
+    )
     
-    if month and (month < 1 or month > 12):
-        raise ValueError("Month must be between 1 and 12")
+    try:
+        logger.info(f"Fetching top {top_n} root causes for {year}-{month or 'all'}")
+        
+        with get_db_connection() as conn:
+            # Plain tuple rows: _format_root_cause builds the only dict per row
+            cur = conn.cursor()
+            execute_prepared(cur, statement, _TOP_ROOT_CAUSES_QUERIES[statement], params)
+            results = cur.fetchall()
+            cur.close()
+        
+        logger.info(f"Retrieved {len(results)} root causes")
+        
+        return [_format_root_cause(row) for row in results]
     
-    if top_n < 1 or top_n > 100:
-        raise ValueError("top_n must be between 1 and 100")
+    except psycopg2.Error as e:
+        logger.error(f"Database error in get_top_root_causes: {e}")
+        raise Exception(f"Database error: {str(e)}")
+    except Exception as e:
+        logger.error(f"Error in get_top_root_causes: {e}", exc_info=True)
+        raise Exception(f"KPI query failed: {str(e)}")
+
+def get_top_root_causes_table(
+    year: int,
+    month: Optional[int] = None,
+    top_n: int = 10,
+    category_filter: Optional[str] = None,
+    severity_filter: Optional[str] = None,
+    min_tickets: int = 0
+):
+    """
+    Get top root causes as a pyarrow.Table, one column per mart column
     
-    if severity_filter and severity_filter.lower() not in ['critical', 'high', 'medium', 'low']:
-        raise ValueError("severity_filter must be one of: critical, high, medium, low")
+    Same query and arguments as get_top_root_causes, for notebook/dashboard
+    callers that aggregate further: values stay in columnar buffers instead
+    of a nested dict per row. Numeric mart columns come back as decimals.
     
-    # Build query
-    query = """
-        SELECT 
-            root_cause_name,
-            root_cause_severity,
-            category_name,
-            product_category,
-            total_tickets,
-            open_tickets,
-            resolved_tickets,
-            pct_of_period,
-            pct_open,
-            avg_resolution_hours,
-            median_resolution_hours,
-            avg_satisfaction_score,
-            satisfaction_rate,
-            v12_related_tickets,
-            pct_v12_related,
-            created_year,
-            created_month,
-            created_month_name
-        FROM analytics_marts.mart_top_root_causes
-        WHERE created_year = %s
+    Returns:
+        pyarrow.Table ordered by total_tickets descending
     """
+    import pyarrow as pa
     
-    params = [year]
+    statement, params = _top_root_causes_statement(
+        year, month, top_n, category_filter, severity_filter, min_tickets
+    )
+    
+    try:
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            execute_prepared(cur, statement, _TOP_ROOT_CAUSES_QUERIES[statement], params)
+            names = [column[0] for column in cur.description]
+            results = cur.fetchall()
+            cur.close()
+        
+        columns = list(zip(*results)) or [()] * len(names)
+        return pa.table({name: list(values) for name, values in zip(names, columns)})
     
-    # Add month filter if provided
-    if month:
-        query += " AND created_month = %s"
-        params.append(month)
+    except Exception as e:
+        logger.error(f"Error in get_top_root_causes_table: {e}")
+        raise Exception(f"KPI query failed: {str(e)}")
+
+def get_top_root_causes_multi(
+    periods: List[Tuple[int, int]],
+    top_n: int = 10
+) -> Dict[Tuple[int, int], List[Dict[str, Any]]]:
+    """
+    Get top root causes for several year-months in one query
     
-    # Add category filter if provided
-    if category_filter:
-        query += " AND category_name = %s"
-        params.append(category_filter)
+    Args:
+        periods: (year, month) pairs
+        top_n: Number of top causes per period (1-100)
     
-    # Add severity filter if provided
-    if severity_filter:
-        query += " AND root_cause_severity = %s"
-        params.append(severity_filter.lower())
+    Returns:
+        (year, month) -> top root causes, ordered by total tickets; periods
+        with no mart rows map to an empty list
+    """
+    for year, month in periods:
+        _validate_period(year, month)
+    if top_n < 1 or top_n > 100:
+        raise ValueError("top_n must be between 1 and 100")
     
-    # Add minimum tickets threshold
-    if min_tickets > 0:
-        query += " AND total_tickets >= %s"
-        params.append(min_tickets)
+    results = {(year, month): [] for year, month in periods}
+    if not results:
+        return results
     
-    # Order and limit
-    query += " ORDER BY total_tickets DESC LIMIT %s"
-    params.append(top_n)
+    # The periods are joined as a VALUES list and ranked within each period
+    query = f"""
+        SELECT {_ROOT_CAUSE_COLUMNS} FROM (
+            SELECT {_ROOT_CAUSE_COLUMNS},
+                ROW_NUMBER() OVER (
+                    PARTITION BY t.created_year, t.created_month
+                    ORDER BY t.total_tickets DESC
+                ) as period_rank
+            FROM analytics_marts.mart_top_root_causes t
+            JOIN (VALUES %s) v(y, m) ON t.created_year = v.y AND t.created_month = v.m
+        ) ranked
+        WHERE period_rank <= {int(top_n)}
+        ORDER BY created_year, created_month, total_tickets DESC
+    """
     
     try:
-        logger.info(f"Fetching top {top_n} root causes for {year}-{month or 'all'}")
-        
         with get_db_connection() as conn:
-            cur = conn.cursor(cursor_factory=RealDictCursor)
-            cur.execute(query, params)
-            results = cur.fetchall()
+            cur = conn.cursor()
+            rows = execute_values(cur, query, list(results), page_size=len(results), fetch=True)
             cur.close()
         
-        logger.info(f"Retrieved {len(results)} root causes")
-        
-        # Format results with safe type conversions
-        formatted_results = []
-        for row in results:
-            formatted_results.append({
-                'root_cause': row['root_cause_name'],
-                'severity': row['root_cause_severity'],
-                'category': row['category_name'],
-                'product_category': row['product_category'],
-                'metrics': {
-                    'total_tickets': safe_int(row['total_tickets']),
-                    'open_tickets': safe_int(row['open_tickets']),
-                    'resolved_tickets': safe_int(row['resolved_tickets']),
-                    'pct_of_period': safe_float(row['pct_of_period']),
-                    'pct_open': safe_float(row['pct_open']),
-                    'avg_resolution_hours': safe_float(row['avg_resolution_hours']),
-                    'median_resolution_hours': safe_float(row['median_resolution_hours']),
-                    'avg_satisfaction': safe_float(row['avg_satisfaction_score']),
-                    'satisfaction_rate': safe_float(row['satisfaction_rate'])
-                },
-                'v12_impact': {
-                    'v12_tickets': safe_int(row['v12_related_tickets']),
-                    'pct_v12': safe_float(row['pct_v12_related'])
-                },
-                'time_period': {
-                    'year': safe_int(row['created_year']),
-                    'month': safe_int(row['created_month']),
-                    'month_name': row['created_month_name']
-                }
-            })
-        
-        return formatted_results
+        for row in rows:
+            root_cause = _format_root_cause(row)
+            period = root_cause['time_period']
+            results[(period['year'], period['month'])].append(root_cause)
+        return results
     
-    except psycopg2.Error as e:
-        logger.error(f"Database error in get_top_root_causes: {e}")
-        raise Exception(f"Database error: {str(e)}")
     except Exception as e:
-        logger.error(f"Error in get_top_root_causes: {e}", exc_info=True)
+        logger.error(f"Error in get_top_root_causes_multi: {e}")
         raise Exception(f"KPI query failed: {str(e)}")
 
+@ttl_cache("kpi.root_cause_trend", ttl=KPI_CACHE_TTL_SECONDS, empty_ttl=EMPTY_CACHE_TTL_SECONDS)
 def get_root_cause_trend(
     root_cause_name: str,
     start_year: int,
@@ -235,24 +369,18 @@ def get_root_cause_trend(
             avg_resolution_hours,
             avg_satisfaction_score
         FROM analytics_marts.mart_top_root_causes
-        WHERE root_cause_name = %s
-        AND (
-            (created_year > %s) OR 
-            (created_year = %s AND created_month >= %s)
-        )
-        AND (
-            (created_year < %s) OR 
-            (created_year = %s AND created_month <= %s)
-        )
+        WHERE root_cause_name = $1
+        AND (created_year, created_month) >= ($2, $3)
+        AND (created_year, created_month) <= ($4, $5)
         ORDER BY created_year, created_month
     """
     
-    params = [root_cause_name, start_year, start_year, start_month, end_year, end_year, end_month]
+    params = [root_cause_name, start_year, start_month, end_year, end_month]
     
     try:
         with get_db_connection() as conn:
             cur = conn.cursor(cursor_factory=RealDictCursor)
-            cur.execute(query, params)
+            execute_prepared(cur, "kpi_root_cause_trend", query, params)
             results = cur.fetchall()
             cur.close()
         
@@ -277,6 +405,18 @@ def get_root_cause_trend(
 # Churn Analysis
 # =====================================================
 
+# Risk levels reported in the churn breakdown ('active' customers are not churned)
+_CHURN_RISK_LEVELS = ('critical', 'high', 'medium', 'low')
+
+# <level>_count and <level>_pct (share of all churned, 1 decimal) per risk level
+_CHURN_LEVEL_COLUMNS = ",\n            ".join(
+    f"SUM(churned_count) FILTER (WHERE churn_risk_level = '{level}') as {level}_count, "
+    f"ROUND(100.0 * SUM(churned_count) FILTER (WHERE churn_risk_level = '{level}') "
+    f"/ NULLIF(SUM(churned_count), 0), 1) as {level}_pct"
+    for level in _CHURN_RISK_LEVELS
+)
+
+@ttl_cache("kpi.churn_summary", ttl=KPI_CACHE_TTL_SECONDS, empty_ttl=EMPTY_CACHE_TTL_SECONDS)
 def get_churn_summary(
     days: int = 30,
     segment: Optional[str] = None,
@@ -296,22 +436,20 @@ def get_churn_summary(
     if days not in [30, 90]:
         raise ValueError("days must be 30 or 90")
     
-    churn_flag = f"is_churned_{days}d"
-    
-    query = f"""
+    # mart_churn_summary holds a few rows per (period, segment); the averages
+    # are recomputed from its sums and counts, and each risk level's share of
+    # the total is rounded in SQL
+    query = """
         SELECT 
-            COUNT(*) as total_churned,
-            AVG(days_since_login) as avg_days_inactive,
-            SUM(estimated_clv) as total_clv_at_risk,
-            COUNT(CASE WHEN churn_risk_level = 'critical' THEN 1 END) as critical_count,
-            COUNT(CASE WHEN churn_risk_level = 'high' THEN 1 END) as high_count,
-            COUNT(CASE WHEN churn_risk_level = 'medium' THEN 1 END) as medium_count,
-            COUNT(CASE WHEN churn_risk_level = 'low' THEN 1 END) as low_count
-        FROM analytics_marts.mart_churned_customers
-        WHERE {churn_flag} = true
-    """
+            SUM(churned_count) as total_churned,
+            SUM(total_days_inactive)::numeric / NULLIF(SUM(days_inactive_count), 0) as avg_days_inactive,
+            SUM(total_clv_at_risk) as total_clv_at_risk,
+            {levels}
+        FROM analytics_marts.mart_churn_summary
+        WHERE churn_period_days = %s
+    """.format(levels=_CHURN_LEVEL_COLUMNS)
     
-    params = []
+    params = [days]
     
     if segment:
         query += " AND customer_segment = %s"
@@ -338,22 +476,11 @@ def get_churn_summary(
         
         if include_breakdown and total_churned > 0:
             summary['risk_breakdown'] = {
-                'critical': {
-                    'count': safe_int(result['critical_count']),
-                    'percentage': round(safe_int(result['critical_count']) * 100.0 / total_churned, 1)
-                },
-                'high': {
-                    'count': safe_int(result['high_count']),
-                    'percentage': round(safe_int(result['high_count']) * 100.0 / total_churned, 1)
-                },
-                'medium': {
-                    'count': safe_int(result['medium_count']),
-                    'percentage': round(safe_int(result['medium_count']) * 100.0 / total_churned, 1)
-                },
-                'low': {
-                    'count': safe_int(result['low_count']),
-                    'percentage': round(safe_int(result['low_count']) * 100.0 / total_churned, 1)
+                level: {
+                    'count': safe_int(result[f'{level}_count']),
+                    'percentage': safe_float(result[f'{level}_pct'])
                 }
+                for level in _CHURN_RISK_LEVELS
             }
         
         logger.info(f"Churn summary: {total_churned} churned customers")
@@ -363,17 +490,18 @@ def get_churn_summary(
         logger.error(f"Error in get_churn_summary: {e}")
         raise Exception(f"Churn summary failed: {str(e)}")
 
+@ttl_cache("kpi.churn_by_segment", ttl=KPI_CACHE_TTL_SECONDS, empty_ttl=EMPTY_CACHE_TTL_SECONDS)
 def get_churn_by_segment() -> List[Dict[str, Any]]:
     """Get churn rates broken down by customer segment"""
     
     query = """
         SELECT 
             customer_segment,
-            COUNT(*) as churned_count,
-            AVG(estimated_clv) as avg_clv_at_risk,
-            AVG(days_since_login) as avg_days_inactive
-        FROM analytics_marts.mart_churned_customers
-        WHERE is_churned_30d = true
+            SUM(churned_count) as churned_count,
+            SUM(total_clv_at_risk)::numeric / NULLIF(SUM(clv_count), 0) as avg_clv_at_risk,
+            SUM(total_days_inactive)::numeric / NULLIF(SUM(days_inactive_count), 0) as avg_days_inactive
+        FROM analytics_marts.mart_churn_summary
+        WHERE churn_period_days = 30
         GROUP BY customer_segment
         ORDER BY churned_count DESC
     """
@@ -403,6 +531,7 @@ def get_churn_by_segment() -> List[Dict[str, Any]]:
 # v1.2 Impact Analysis
 # =====================================================
 
+@ttl_cache("kpi.v12_impact_summary", ttl=KPI_CACHE_TTL_SECONDS, empty_ttl=EMPTY_CACHE_TTL_SECONDS)
 def get_v12_impact_summary(include_details: bool = False) -> Dict[str, Any]:
     """
     Get summary of v1.2 app version impact with optional details
@@ -414,15 +543,19 @@ def get_v12_impact_summary(include_details: bool = False) -> Dict[str, Any]:
         v1.2 impact summary
     """
     
+    # One scan of the mart: the () grouping set gives the totals row, the
+    # (product_type) set one row per product, from which the product count
+    # and list are taken (no DISTINCT aggregates to sort)
     query = """
         SELECT 
-            COUNT(*) as total_v12_tickets,
-            COUNT(DISTINCT product_type) as affected_products,
+            product_type,
+            COUNT(*) as ticket_count,
             AVG(resolution_time_hours) as avg_resolution_hours,
-            COUNT(CASE WHEN ticket_status = 'open' THEN 1 END) as still_open,
-            STRING_AGG(DISTINCT product_type, ', ') as product_list
+            COUNT(*) FILTER (WHERE ticket_status = 'open') as open_count
         FROM analytics_marts.mart_ticket_analytics
         WHERE is_v12_related = true
+        GROUP BY GROUPING SETS ((product_type), ())
+        ORDER BY GROUPING(product_type) DESC, COUNT(*) DESC
     """
     
     try:
@@ -431,51 +564,37 @@ def get_v12_impact_summary(include_details: bool = False) -> Dict[str, Any]:
         with get_db_connection() as conn:
             cur = conn.cursor(cursor_factory=RealDictCursor)
             cur.execute(query)
-            result = cur.fetchone()
-            
-            total_tickets = safe_int(result['total_v12_tickets'])
-            still_open = safe_int(result['still_open'])
-            
-            summary = {
-                'total_v12_tickets': total_tickets,
-                'affected_products': safe_int(result['affected_products']),
-                'product_list': result['product_list'],
-                'avg_resolution_hours': round(safe_float(result['avg_resolution_hours']), 2),
-                'still_open': still_open,
-                'pct_still_open': round(still_open * 100.0 / total_tickets, 2) if total_tickets > 0 else 0,
-                'pct_resolved': round((total_tickets - still_open) * 100.0 / total_tickets, 2) if total_tickets > 0 else 0
-            }
-            
-            # Add detailed breakdown if requested
-            if include_details and total_tickets > 0:
-                detail_query = """
-                    SELECT 
-                        product_type,
-                        COUNT(*) as ticket_count,
-                        AVG(resolution_time_hours) as avg_resolution_hours,
-                        COUNT(CASE WHEN ticket_status = 'open' THEN 1 END) as open_count
-                    FROM analytics_marts.mart_ticket_analytics
-                    WHERE is_v12_related = true
-                    GROUP BY product_type
-                    ORDER BY ticket_count DESC
-                """
-                
-                cur.execute(detail_query)
-                details = cur.fetchall()
-                
-                summary['product_breakdown'] = [
-                    {
-                        'product': row['product_type'],
-                        'ticket_count': safe_int(row['ticket_count']),
-                        'pct_of_total': round(safe_int(row['ticket_count']) * 100.0 / total_tickets, 1),
-                        'avg_resolution_hours': round(safe_float(row['avg_resolution_hours']), 2),
-                        'open_count': safe_int(row['open_count'])
-                    }
-                    for row in details
-                ]
-            
+            rows = cur.fetchall()
             cur.close()
         
+        result, details = rows[0], rows[1:]
+        total_tickets = safe_int(result['ticket_count'])
+        still_open = safe_int(result['open_count'])
+        products = sorted(row['product_type'] for row in details if row['product_type'] is not None)
+        
+        summary = {
+            'total_v12_tickets': total_tickets,
+            'affected_products': len(products),
+            'product_list': ', '.join(products) or None,
+            'avg_resolution_hours': round(safe_float(result['avg_resolution_hours']), 2),
+            'still_open': still_open,
+            'pct_still_open': round(still_open * 100.0 / total_tickets, 2) if total_tickets > 0 else 0,
+            'pct_resolved': round((total_tickets - still_open) * 100.0 / total_tickets, 2) if total_tickets > 0 else 0
+        }
+        
+        # Add detailed breakdown if requested
+        if include_details and total_tickets > 0:
+            summary['product_breakdown'] = [
+                {
+                    'product': row['product_type'],
+                    'ticket_count': safe_int(row['ticket_count']),
+                    'pct_of_total': round(safe_int(row['ticket_count']) * 100.0 / total_tickets, 1),
+                    'avg_resolution_hours': round(safe_float(row['avg_resolution_hours']), 2),
+                    'open_count': safe_int(row['open_count'])
+                }
+                for row in details
+            ]
+        
         logger.info(f"v1.2 impact: {total_tickets} tickets, {still_open} still open")
         return summary
     
@@ -505,62 +624,84 @@ def compare_periods(
     Returns:
         Comparative analysis
     """
+    _validate_period(year1, month1)
+    _validate_period(year2, month2)
+    if top_n < 1 or top_n > 100:
+        raise ValueError("top_n must be between 1 and 100")
+    
+    # Each period's top_n mart rows, summed per root cause (the mart is also
+    # split by category), joined side by side and ordered by absolute change
+    query = """
+        WITH p1 AS (
+            SELECT root_cause_name, SUM(total_tickets) as tickets
+            FROM (
+                SELECT root_cause_name, total_tickets
+                FROM analytics_marts.mart_top_root_causes
+                WHERE created_year = %s AND created_month = %s
+                ORDER BY total_tickets DESC
+                LIMIT %s
+            ) top_rows
+            GROUP BY root_cause_name
+        ),
+        p2 AS (
+            SELECT root_cause_name, SUM(total_tickets) as tickets
+            FROM (
+                SELECT root_cause_name, total_tickets
+                FROM analytics_marts.mart_top_root_causes
+                WHERE created_year = %s AND created_month = %s
+                ORDER BY total_tickets DESC
+                LIMIT %s
+            ) top_rows
+            GROUP BY root_cause_name
+        )
+        SELECT 
+            root_cause_name,
+            p1.tickets IS NOT NULL as in_period1,
+            p2.tickets IS NOT NULL as in_period2,
+            COALESCE(p1.tickets, 0) as period1_tickets,
+            COALESCE(p2.tickets, 0) as period2_tickets
+        FROM p1 FULL OUTER JOIN p2 USING (root_cause_name)
+        ORDER BY ABS(COALESCE(p2.tickets, 0) - COALESCE(p1.tickets, 0)) DESC, root_cause_name
+    """
+    
     try:
         logger.info(f"Comparing {year1}-{month1} vs {year2}-{month2}")
         
-        period1 = get_top_root_causes(year1, month1, top_n)
-        period2 = get_top_root_causes(year2, month2, top_n)
-        
-        # Calculate changes
-        period1_map = {rc['root_cause']: rc for rc in period1}
-        period2_map = {rc['root_cause']: rc for rc in period2}
-        
-        all_causes = set(period1_map.keys()) | set(period2_map.keys())
+        with get_db_connection() as conn:
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+            cur.execute(query, (year1, month1, top_n, year2, month2, top_n))
+            rows = cur.fetchall()
+            cur.close()
         
         comparisons = []
-        for cause in all_causes:
-            p1 = period1_map.get(cause)
-            p2 = period2_map.get(cause)
+        for row in rows:
+            period1_tickets = safe_int(row['period1_tickets'])
+            period2_tickets = safe_int(row['period2_tickets'])
+            ticket_change = period2_tickets - period1_tickets
             
-            if p1 and p2:
-                ticket_change = p2['metrics']['total_tickets'] - p1['metrics']['total_tickets']
-                pct_change = (ticket_change / p1['metrics']['total_tickets'] * 100) if p1['metrics']['total_tickets'] > 0 else 0
-                
-                comparisons.append({
-                    'root_cause': cause,
-                    'period1_tickets': p1['metrics']['total_tickets'],
-                    'period2_tickets': p2['metrics']['total_tickets'],
-                    'change': ticket_change,
-                    'pct_change': round(pct_change, 1),
-                    'trend': 'increasing' if ticket_change > 0 else 'decreasing' if ticket_change < 0 else 'stable'
-                })
-            elif p1:
-                comparisons.append({
-                    'root_cause': cause,
-                    'period1_tickets': p1['metrics']['total_tickets'],
-                    'period2_tickets': 0,
-                    'change': -p1['metrics']['total_tickets'],
-                    'pct_change': -100.0,
-                    'trend': 'resolved'
-                })
-            else:  # p2
-                comparisons.append({
-                    'root_cause': cause,
-                    'period1_tickets': 0,
-                    'period2_tickets': p2['metrics']['total_tickets'],
-                    'change': p2['metrics']['total_tickets'],
-                    'pct_change': float('inf'),
-                    'trend': 'new'
-                })
-        
-        # Sort by absolute change
-        comparisons.sort(key=lambda x: abs(x['change']), reverse=True)
+            if row['in_period1'] and row['in_period2']:
+                pct_change = (ticket_change / period1_tickets * 100) if period1_tickets > 0 else 0
+                pct_change = round(pct_change, 1)
+                trend = 'increasing' if ticket_change > 0 else 'decreasing' if ticket_change < 0 else 'stable'
+            elif row['in_period1']:
+                pct_change, trend = -100.0, 'resolved'
+            else:
+                pct_change, trend = float('inf'), 'new'
+            
+            comparisons.append({
+                'root_cause': row['root_cause_name'],
+                'period1_tickets': period1_tickets,
+                'period2_tickets': period2_tickets,
+                'change': ticket_change,
+                'pct_change': pct_change,
+                'trend': trend
+            })
         
         return {
             'period1': f"{year1}-{month1:02d}",
             'period2': f"{year2}-{month2:02d}",
-            'total_period1_tickets': sum(rc['metrics']['total_tickets'] for rc in period1),
-            'total_period2_tickets': sum(rc['metrics']['total_tickets'] for rc in period2),
+            'total_period1_tickets': sum(c['period1_tickets'] for c in comparisons),
+            'total_period2_tickets': sum(c['period2_tickets'] for c in comparisons),
             'comparisons': comparisons
         }
     
@@ -572,6 +713,7 @@ def compare_periods(
 # Quick Stats
 # =====================================================
 
+@ttl_cache("kpi.quick_stats", ttl=KPI_CACHE_TTL_SECONDS, empty_ttl=EMPTY_CACHE_TTL_SECONDS)
 def get_quick_stats(year: int, month: int) -> Dict[str, Any]:
     """
     Get quick overview statistics for a time period
@@ -583,41 +725,81 @@ def get_quick_stats(year: int, month: int) -> Dict[str, Any]:
     Returns:
         Quick stats summary
     """
+    # Same argument checks as get_top_root_causes
+    _top_root_causes_statement(year, month, 5, None, None, 0)
+    
+    # Top 5 root causes, v1.2 counts and 30-day churn in one round trip; the
+    # top 5 list comes back already shaped as JSON
+    query = """
+        WITH top_causes AS (
+            SELECT root_cause_name, root_cause_severity, total_tickets
+            FROM analytics_marts.mart_top_root_causes
+            WHERE created_year = %(year)s AND created_month = %(month)s
+            ORDER BY total_tickets DESC
+            LIMIT 5
+        ),
+        v12 AS (
+            SELECT 
+                COUNT(*) as total_tickets,
+                COUNT(*) FILTER (WHERE ticket_status = 'open') as still_open
+            FROM analytics_marts.mart_ticket_analytics
+            WHERE is_v12_related = true
+        ),
+        churn AS (
+            SELECT 
+                SUM(churned_count) as total_churned,
+                ROUND(SUM(total_clv_at_risk)::numeric, 2) as clv_at_risk
+            FROM analytics_marts.mart_churn_summary
+            WHERE churn_period_days = 30
+        )
+        SELECT 
+            (SELECT SUM(total_tickets) FROM top_causes) as total_tickets,
+            (
+                SELECT jsonb_agg(
+                    jsonb_build_object(
+                        'name', root_cause_name,
+                        'tickets', total_tickets,
+                        'severity', root_cause_severity
+                    )
+                    ORDER BY total_tickets DESC
+                )
+                FROM top_causes
+            ) as top_5_root_causes,
+            v12.total_tickets as v12_tickets,
+            v12.still_open as v12_still_open,
+            churn.total_churned,
+            churn.clv_at_risk
+        FROM v12, churn
+    """
+    
     try:
         logger.info(f"Fetching quick stats for {year}-{month}")
         
-        # Get top root causes
-        root_causes = get_top_root_causes(year, month, top_n=5)
-        
-        # Get v1.2 impact
-        v12_impact = get_v12_impact_summary()
-        
-        # Get churn summary
-        churn = get_churn_summary(days=30)
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(query, {'year': year, 'month': month})
+            (
+                total_tickets, top_causes, v12_tickets, v12_still_open,
+                total_churned, clv_at_risk
+            ) = cur.fetchone()
+            cur.close()
         
-        total_tickets = sum(rc['metrics']['total_tickets'] for rc in root_causes)
+        top_causes = top_causes or []
         
         return {
             'time_period': f"{year}-{month:02d}",
-            'total_tickets': total_tickets,
-            'top_root_cause': root_causes[0]['root_cause'] if root_causes else None,
-            'top_root_cause_tickets': root_causes[0]['metrics']['total_tickets'] if root_causes else 0,
+            'total_tickets': safe_int(total_tickets),
+            'top_root_cause': top_causes[0]['name'] if top_causes else None,
+            'top_root_cause_tickets': top_causes[0]['tickets'] if top_causes else 0,
             'v12_impact': {
-                'total_tickets': v12_impact['total_v12_tickets'],
-                'still_open': v12_impact['still_open']
+                'total_tickets': safe_int(v12_tickets),
+                'still_open': safe_int(v12_still_open)
             },
             'churn': {
-                'total_churned': churn['total_churned'],
-                'clv_at_risk': churn['total_clv_at_risk']
+                'total_churned': safe_int(total_churned),
+                'clv_at_risk': safe_float(clv_at_risk)
             },
-            'top_5_root_causes': [
-                {
-                    'name': rc['root_cause'],
-                    'tickets': rc['metrics']['total_tickets'],
-                    'severity': rc['severity']
-                }
-                for rc in root_causes[:5]
-            ]
+            'top_5_root_causes': top_causes
         }
     
     except Exception as e:
@@ -6,34 +6,33 @@ Execute read-only, parameterized SQL queries with comprehensive protection
 import os
 import re
 import logging
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Callable, Dict, Generator, List, Any, Optional, Tuple
 from datetime import datetime
-from contextlib import contextmanager
+from functools import lru_cache
 import psycopg2
 from psycopg2 import sql
 from psycopg2.extras import RealDictCursor
 from dotenv import load_dotenv
 
+try:
+    from .db import get_db_connection
+except ImportError:  # run directly as a script
+    from db import get_db_connection
+
 load_dotenv()
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Database connection
-DB_CONFIG = {
-    'host': os.getenv('POSTGRES_HOST', 'localhost'),
-    'port': os.getenv('POSTGRES_PORT', '5433'),
-    'database': os.getenv('POSTGRES_DB', 'dbank'),
-    'user': os.getenv('POSTGRES_USER', 'dbank_user'),
-    'password': os.getenv('POSTGRES_PASSWORD', 'dbank_pass_2025')
-}
-
 # Safety limits
 SQL_TIMEOUT_SECONDS = int(os.getenv('SQL_TIMEOUT_SECONDS', '30'))
 MAX_RESULT_ROWS = int(os.getenv('MAX_RESULT_ROWS', '1000'))
 MAX_QUERY_LENGTH = 10000
 
+# Rows fetched per round-trip by the streaming server-side cursor
+STREAM_FETCH_SIZE = int(os.getenv('SQL_STREAM_FETCH_SIZE', '200'))
+
 # PII field patterns (case-insensitive)
 PII_FIELDS = [
     'email', 'phone', 'mobile', 'ssn', 'passport', 'id_number',
@@ -43,38 +42,36 @@ PII_FIELDS = [
 ]
 
 # =====================================================
-# Connection Management
+# SQL Validation
 # =====================================================
 
-@contextmanager
-def get_db_connection(read_only: bool = True):
-    """
-    Context manager for database connections
-    
-    Args:
-        read_only: If True, set transaction to read-only mode
-    """
-    conn = None
-    try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        
-        # Set read-only mode for extra safety
-        if read_only:
-            cur = conn.cursor()
-            cur.execute("SET TRANSACTION READ ONLY")
-            cur.close()
-        
-        yield conn
-    except psycopg2.Error as e:
-        logger.error(f"Database connection error: {e}")
-        raise Exception(f"Failed to connect to database: {str(e)}")
-    finally:
-        if conn:
-            conn.close()
+# Patterns used on every sql.query call, compiled once at import
+_LINE_COMMENT_RE = re.compile(r'--.*?$', re.MULTILINE)
+_BLOCK_COMMENT_RE = re.compile(r'/\*.*?\*/', re.DOTALL)
 
-# =====================================================
-# SQL Validation
-# =====================================================
+# Any write keyword as a whole word, in one alternation
+_WRITE_KEYWORD_RE = re.compile(r'\b(?:' + '|'.join([
+    'INSERT', 'UPDATE', 'DELETE', 'DROP', 'CREATE', 'ALTER',
+    'TRUNCATE', 'REPLACE', 'MERGE', 'GRANT', 'REVOKE',
+    'EXEC', 'EXECUTE', 'CALL', 'DO'
+]) + r')\b')
+
+_DANGEROUS_PATTERNS = [
+    (re.compile(pattern, re.IGNORECASE), message)
+    for pattern, message in [
+        (r';\s*SELECT', 'Multiple statements detected'),
+        (r';\s*WITH', 'Multiple statements detected'),
+        (r'pg_sleep', 'Sleep functions not allowed'),
+        (r'dblink', 'Database links not allowed'),
+        (r'copy\s+', 'COPY command not allowed'),
+        (r'lo_import', 'Large object functions not allowed'),
+        (r'lo_export', 'Large object functions not allowed'),
+        (r'\binto\s+outfile\b', 'File operations not allowed'),
+        (r'\bload_file\b', 'File operations not allowed'),
+    ]
+]
+
+_TABLE_NAME_RE = re.compile(r'(?:FROM|JOIN)\s+([a-zA-Z0-9_\.]+)', re.IGNORECASE)
 
 def is_read_only(query: str) -> bool:
     """
@@ -90,21 +87,12 @@ def is_read_only(query: str) -> bool:
     normalized = query.strip().upper()
     
     # Remove comments
-    normalized = re.sub(r'--.*?$', '', normalized, flags=re.MULTILINE)
-    normalized = re.sub(r'/\*.*?\*/', '', normalized, flags=re.DOTALL)
-    
-    # Check for write operations
-    write_keywords = [
-        'INSERT', 'UPDATE', 'DELETE', 'DROP', 'CREATE', 'ALTER',
-        'TRUNCATE', 'REPLACE', 'MERGE', 'GRANT', 'REVOKE',
-        'EXEC', 'EXECUTE', 'CALL', 'DO'
-    ]
+    normalized = _LINE_COMMENT_RE.sub('', normalized)
+    normalized = _BLOCK_COMMENT_RE.sub('', normalized)
     
-    for keyword in write_keywords:
-        # Use word boundaries to avoid false positives
-        pattern = r'\b' + keyword + r'\b'
-        if re.search(pattern, normalized):
-            return False
+    # Check for write operations (word boundaries avoid false positives)
+    if _WRITE_KEYWORD_RE.search(normalized):
+        return False
     
     # Must start with SELECT or WITH (for CTEs)
     if not (normalized.startswith('SELECT') or normalized.startswith('WITH')):
@@ -129,21 +117,9 @@ def validate_sql_query(query: str) -> Optional[str]:
         return f"Query exceeds maximum length of {MAX_QUERY_LENGTH} characters"
     
     # Check for dangerous patterns
-    dangerous_patterns = [
-        (r';\s*SELECT', 'Multiple statements detected'),
-        (r';\s*WITH', 'Multiple statements detected'),
-        (r'pg_sleep', 'Sleep functions not allowed'),
-        (r'dblink', 'Database links not allowed'),
-        (r'copy\s+', 'COPY command not allowed'),
-        (r'lo_import', 'Large object functions not allowed'),
-        (r'lo_export', 'Large object functions not allowed'),
-        (r'\binto\s+outfile\b', 'File operations not allowed'),
-        (r'\bload_file\b', 'File operations not allowed'),
-    ]
-    
     normalized = query.upper()
-    for pattern, message in dangerous_patterns:
-        if re.search(pattern, normalized, re.IGNORECASE):
+    for pattern, message in _DANGEROUS_PATTERNS:
+        if pattern.search(normalized):
             return message
     
     return None
@@ -159,18 +135,67 @@ def extract_table_names(query: str) -> List[str]:
         List of table names found in query
     """
     # Simple extraction - looks for FROM and JOIN clauses
-    pattern = r'(?:FROM|JOIN)\s+([a-zA-Z0-9_\.]+)'
-    matches = re.findall(pattern, query, re.IGNORECASE)
+    matches = _TABLE_NAME_RE.findall(query)
     return list(set(matches))
 
 # =====================================================
 # PII Masking
 # =====================================================
 
+# Single alternation over all PII substrings, compiled once
+_PII_FIELD_RE = re.compile('|'.join(re.escape(pii) for pii in PII_FIELDS))
+
 def is_pii_field(field_name: str) -> bool:
     """Check if field name suggests PII data"""
+    return _PII_FIELD_RE.search(field_name.lower()) is not None
+
+def _mask_general(value_str: str) -> str:
+    """Show first and last char"""
+    if len(value_str) > 2:
+        return f"{value_str[0]}{'*' * (len(value_str) - 2)}{value_str[-1]}"
+    return "***"
+
+def _mask_phone(value_str: str) -> str:
+    """Show last 4 digits"""
+    if len(value_str) >= 4:
+        return f"***-***-{value_str[-4:]}"
+    return "***"
+
+def _mask_email(value_str: str) -> str:
+    """Show first char and domain; values without '@' get general masking"""
+    if '@' in value_str:
+        local, domain = value_str.split('@', 1)
+        return f"{local[0]}***@{domain}"
+    return _mask_general(value_str)
+
+def _mask_email_or_phone(value_str: str) -> str:
+    """Column named like both email and phone: email if it looks like one"""
+    if '@' in value_str:
+        return _mask_email(value_str)
+    return _mask_phone(value_str)
+
+@lru_cache(maxsize=512)
+def _column_masker(field_name: str) -> Optional[Callable[[str], str]]:
+    """
+    Resolve the masking function for a column once, from its name
+    
+    Returns:
+        Function applied to str(value), or None for non-PII columns
+    """
+    if not is_pii_field(field_name):
+        return None
+    
     field_lower = field_name.lower()
-    return any(pii in field_lower for pii in PII_FIELDS)
+    is_email = 'email' in field_lower
+    is_phone = 'phone' in field_lower or 'mobile' in field_lower
+    
+    if is_email and is_phone:
+        return _mask_email_or_phone
+    if is_email:
+        return _mask_email
+    if is_phone:
+        return _mask_phone
+    return _mask_general
 
 def mask_value(value: Any, field_name: str) -> Any:
     """
@@ -183,32 +208,18 @@ def mask_value(value: Any, field_name: str) -> Any:
     Returns:
         Masked or original value
     """
-    if value is None or not is_pii_field(field_name):
+    masker = _column_masker(field_name)
+    if value is None or masker is None:
         return value
-    
-    value_str = str(value)
-    
-    # Email masking: show first char and domain
-    if 'email' in field_name.lower() and '@' in value_str:
-        local, domain = value_str.split('@', 1)
-        return f"{local[0]}***@{domain}"
-    
-    # Phone masking: show last 4 digits
-    elif 'phone' in field_name.lower() or 'mobile' in field_name.lower():
-        if len(value_str) >= 4:
-            return f"***-***-{value_str[-4:]}"
-        return "***"
-    
-    # General masking: show first and last char
-    elif len(value_str) > 2:
-        return f"{value_str[0]}{'*' * (len(value_str) - 2)}{value_str[-1]}"
-    else:
-        return "***"
+    return masker(str(value))
 
 def mask_query_results(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """
     Mask PII fields in query results
     
+    PII columns are resolved once from the first row (every row of a result
+    set has the same columns) and only those columns are touched per row.
+    
     Args:
         results: List of result dictionaries
     
@@ -218,12 +229,18 @@ def mask_query_results(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     if not results:
         return results
     
-    masked_results = []
-    for row in results:
-        masked_row = {}
-        for field, value in row.items():
-            masked_row[field] = mask_value(value, field)
-        masked_results.append(masked_row)
+    maskers = [
+        (field, masker)
+        for field in results[0]
+        if (masker := _column_masker(field)) is not None
+    ]
+    
+    masked_results = [dict(row) for row in results]
+    for field, masker in maskers:
+        for row in masked_results:
+            value = row.get(field)
+            if value is not None:
+                row[field] = masker(str(value))
     
     return masked_results
 
@@ -231,6 +248,9 @@ def mask_query_results(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
 # Parameter Handling
 # =====================================================
 
+_PLACEHOLDER_RE = re.compile(r'\{\{(\w+)\}\}')
+_PARAM_NAME_RE = re.compile(r'^[a-zA-Z_][a-zA-Z0-9_]*$')
+
 def convert_named_to_positional(
     query: str, 
     parameters: Dict[str, Any]
@@ -246,8 +266,7 @@ def convert_named_to_positional(
         Tuple of (modified query, list of parameter values)
     """
     # Find all {{param}} placeholders
-    pattern = r'\{\{(\w+)\}\}'
-    matches = re.findall(pattern, query)
+    matches = _PLACEHOLDER_RE.findall(query)
     
     if not matches:
         return query, []
@@ -285,7 +304,7 @@ def validate_parameters(parameters: Dict[str, Any]) -> Optional[str]:
     
     for key, value in parameters.items():
         # Check key format
-        if not re.match(r'^[a-zA-Z_][a-zA-Z0-9_]*$', key):
+        if not _PARAM_NAME_RE.match(key):
             return f"Invalid parameter name: {key}"
         
         # Check for suspicious values
@@ -305,39 +324,20 @@ def validate_parameters(parameters: Dict[str, Any]) -> Optional[str]:
 # Query Execution
 # =====================================================
 
-def execute_sql_query(
+def _prepare_query(
     query: str,
-    parameters: Optional[Dict[str, Any]] = None,
-    mask_pii: bool = True,
-    max_rows: Optional[int] = None,
-    explain_only: bool = False
-) -> Dict[str, Any]:
+    parameters: Optional[Dict[str, Any]],
+    max_rows: Optional[int]
+) -> Tuple[str, List[Any], int, List[str]]:
     """
-    Execute a read-only SQL query with comprehensive safety checks
-    
-    Args:
-        query: SQL query string (SELECT only)
-        parameters: Optional parameters for parameterized queries
-        mask_pii: Whether to mask PII fields in results
-        max_rows: Maximum rows to return (default: MAX_RESULT_ROWS)
-        explain_only: If True, return query plan instead of executing
+    Validate a query and rewrite it for execution
     
     Returns:
-        Dictionary with results and metadata:
-        {
-            'results': [...],
-            'row_count': int,
-            'execution_time_ms': float,
-            'columns': [...],
-            'truncated': bool
-        }
+        (query, positional parameter values, effective max_rows, tables accessed)
     
     Raises:
         ValueError: If query is not read-only or invalid
-        Exception: If execution fails
     """
-    start_time = datetime.now()
-    
     # Validate query
     if not query or not query.strip():
         raise ValueError("Query cannot be empty")
@@ -382,12 +382,105 @@ def execute_sql_query(
     logger.info(f"Executing query on tables: {', '.join(table_names) if table_names else 'unknown'}")
     logger.debug(f"Query: {query[:200]}...")  # Log first 200 chars
     
+    return query, param_values, max_rows, table_names
+
+
+def _fetch_results(
+    cur,
+    query: str,
+    param_values: List[Any],
+    max_rows: int,
+    mask_pii: bool
+) -> Dict[str, Any]:
+    """Execute a prepared query on an open cursor and shape the results"""
+    # Execute query with parameters
+    if param_values:
+        cur.execute(query, param_values)
+    else:
+        cur.execute(query)
+    
+    # Fetch results
+    results = cur.fetchall()
+    
+    # Check if truncated
+    truncated = len(results) > max_rows
+    if truncated:
+        results = results[:max_rows]
+        logger.warning(f"Results truncated to {max_rows} rows")
+    
+    # Get column names
+    columns = [desc[0] for desc in cur.description] if cur.description else []
+    
+    # Convert to list of dicts
+    results_list = [dict(row) for row in results]
+    
+    # Mask PII if requested
+    if mask_pii and results_list:
+        results_list = mask_query_results(results_list)
+    
+    return {
+        'results': results_list,
+        'row_count': len(results_list),
+        'columns': columns,
+        'truncated': truncated
+    }
+
+
+def _raise_database_error(e: psycopg2.Error, table_names: List[str]):
+    """Translate a psycopg2 error into a helpful message"""
+    logger.error(f"Database error: {e}")
+    error_msg = str(e)
+    
+    # Provide helpful error messages
+    if 'timeout' in error_msg.lower():
+        raise Exception(f"Query timeout after {SQL_TIMEOUT_SECONDS} seconds. Try simplifying your query.")
+    elif 'permission' in error_msg.lower():
+        raise Exception(f"Permission denied. You may not have access to these tables: {', '.join(table_names)}")
+    else:
+        raise Exception(f"Database error: {error_msg}")
+
+
+def execute_sql_query(
+    query: str,
+    parameters: Optional[Dict[str, Any]] = None,
+    mask_pii: bool = True,
+    max_rows: Optional[int] = None,
+    explain_only: bool = False
+) -> Dict[str, Any]:
+    """
+    Execute a read-only SQL query with comprehensive safety checks
+    
+    Args:
+        query: SQL query string (SELECT only)
+        parameters: Optional parameters for parameterized queries
+        mask_pii: Whether to mask PII fields in results
+        max_rows: Maximum rows to return (default: MAX_RESULT_ROWS)
+        explain_only: If True, return query plan instead of executing
+    
+    Returns:
+        Dictionary with results and metadata:
+        {
+            'results': [...],
+            'row_count': int,
+            'execution_time_ms': float,
+            'columns': [...],
+            'truncated': bool
+        }
+    
+    Raises:
+        ValueError: If query is not read-only or invalid
+        Exception: If execution fails
+    """
+    start_time = datetime.now()
+    
+    query, param_values, max_rows, table_names = _prepare_query(query, parameters, max_rows)
+    
     try:
         with get_db_connection(read_only=True) as conn:
             cur = conn.cursor(cursor_factory=RealDictCursor)
             
             # Set statement timeout
-            cur.execute(f"SET statement_timeout = '{SQL_TIMEOUT_SECONDS}s'")
+            cur.execute(f"SET LOCAL statement_timeout = '{SQL_TIMEOUT_SECONDS}s'")
             
             # EXPLAIN only mode
             if explain_only:
@@ -408,62 +501,187 @@ def execute_sql_query(
                     'explain_only': True
                 }
             
-            # Execute query with parameters
+            result = _fetch_results(cur, query, param_values, max_rows, mask_pii)
+            cur.close()
+        
+        execution_time = (datetime.now() - start_time).total_seconds() * 1000
+        
+        logger.info(f"Query executed successfully: {result['row_count']} rows in {execution_time:.2f}ms")
+        
+        return {
+            'results': result['results'],
+            'row_count': result['row_count'],
+            'execution_time_ms': round(execution_time, 2),
+            'columns': result['columns'],
+            'truncated': result['truncated'],
+            'tables_accessed': table_names,
+            'timestamp': datetime.now().isoformat()
+        }
+    
+    except psycopg2.Error as e:
+        _raise_database_error(e, table_names)
+    
+    except Exception as e:
+        logger.error(f"Query execution error: {e}", exc_info=True)
+        raise Exception(f"Query execution failed: {str(e)}")
+
+
+def stream_sql_query(
+    query: str,
+    parameters: Optional[Dict[str, Any]] = None,
+    mask_pii: bool = True,
+    max_rows: Optional[int] = None
+) -> Generator[Dict[str, Any], None, Dict[str, Any]]:
+    """
+    Execute a read-only SQL query and yield rows as they arrive
+    
+    Uses a server-side (named) cursor, so rows are pulled from PostgreSQL
+    STREAM_FETCH_SIZE at a time instead of materializing the whole result.
+    Validation and PII masking are the same as execute_sql_query.
+    
+    Args:
+        query: SQL query string (SELECT only)
+        parameters: Optional parameters for parameterized queries
+        mask_pii: Whether to mask PII fields in results
+        max_rows: Maximum rows to yield (default: MAX_RESULT_ROWS)
+    
+    Yields:
+        One dict per result row
+    
+    Returns:
+        Summary as the generator's return value:
+        {'row_count': int, 'columns': [...], 'truncated': bool, 'tables_accessed': [...]}
+    
+    Raises:
+        ValueError: If query is not read-only or invalid
+        Exception: If execution fails
+    """
+    query, param_values, max_rows, table_names = _prepare_query(query, parameters, max_rows)
+    
+    row_count = 0
+    truncated = False
+    columns: List[str] = []
+    
+    try:
+        with get_db_connection(read_only=True) as conn:
+            setup = conn.cursor()
+            setup.execute(f"SET LOCAL statement_timeout = '{SQL_TIMEOUT_SECONDS}s'")
+            setup.close()
+            
+            cur = conn.cursor(name='sql_query_stream', cursor_factory=RealDictCursor)
             if param_values:
                 cur.execute(query, param_values)
             else:
                 cur.execute(query)
             
-            # Fetch results
-            results = cur.fetchall()
-            
-            # Check if truncated
-            truncated = len(results) > max_rows
-            if truncated:
-                results = results[:max_rows]
-                logger.warning(f"Results truncated to {max_rows} rows")
+            while True:
+                rows = cur.fetchmany(STREAM_FETCH_SIZE)
+                if not rows:
+                    break
+                if not columns:
+                    columns = [desc[0] for desc in cur.description] if cur.description else []
+                
+                rows = [dict(row) for row in rows]
+                if row_count + len(rows) > max_rows:
+                    rows = rows[:max_rows - row_count]
+                    truncated = True
+                if mask_pii:
+                    rows = mask_query_results(rows)
+                
+                for row in rows:
+                    yield row
+                row_count += len(rows)
+                
+                if truncated:
+                    logger.warning(f"Streamed results truncated to {max_rows} rows")
+                    break
             
-            # Get column names
-            columns = [desc[0] for desc in cur.description] if cur.description else []
+            cur.close()
+        
+        logger.info(f"Query streamed successfully: {row_count} rows")
+        
+        return {
+            'row_count': row_count,
+            'columns': columns,
+            'truncated': truncated,
+            'tables_accessed': table_names
+        }
+    
+    except psycopg2.Error as e:
+        _raise_database_error(e, table_names)
+    
+    except Exception as e:
+        logger.error(f"Query streaming error: {e}", exc_info=True)
+        raise Exception(f"Query execution failed: {str(e)}")
+
+
+def execute_sql_batch(
+    queries: List[str],
+    parameters: Optional[Dict[str, Any]] = None,
+    mask_pii: bool = True,
+    max_rows: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Execute several related read-only queries over one connection
+    
+    All queries are validated up front, then run back-to-back in a single
+    read-only transaction, so the batch pays for one connection setup and one
+    statement_timeout round-trip instead of one per query.
+    
+    Args:
+        queries: SQL query strings (SELECT only)
+        parameters: Optional parameters shared by all queries
+        mask_pii: Whether to mask PII fields in results
+        max_rows: Maximum rows to return per query (default: MAX_RESULT_ROWS)
+    
+    Returns:
+        Dictionary with one result entry per query (same shape as execute_sql_query)
+    
+    Raises:
+        ValueError: If any query is not read-only or invalid
+        Exception: If execution fails
+    """
+    start_time = datetime.now()
+    
+    if not queries:
+        raise ValueError("queries cannot be empty")
+    
+    prepared = [_prepare_query(q, parameters, max_rows) for q in queries]
+    all_tables = sorted({t for _, _, _, tables in prepared for t in tables})
+    
+    try:
+        with get_db_connection(read_only=True) as conn:
+            cur = conn.cursor(cursor_factory=RealDictCursor)
             
-            # Convert to list of dicts
-            results_list = [dict(row) for row in results]
+            # Set statement timeout once for the whole batch
+            cur.execute(f"SET LOCAL statement_timeout = '{SQL_TIMEOUT_SECONDS}s'")
             
-            # Mask PII if requested
-            if mask_pii and results_list:
-                results_list = mask_query_results(results_list)
+            batch = []
+            for query, param_values, rows_limit, table_names in prepared:
+                result = _fetch_results(cur, query, param_values, rows_limit, mask_pii)
+                result['tables_accessed'] = table_names
+                batch.append(result)
             
             cur.close()
         
         execution_time = (datetime.now() - start_time).total_seconds() * 1000
         
-        logger.info(f"Query executed successfully: {len(results_list)} rows in {execution_time:.2f}ms")
+        logger.info(f"Batch executed successfully: {len(batch)} queries in {execution_time:.2f}ms")
         
         return {
-            'results': results_list,
-            'row_count': len(results_list),
+            'batch': batch,
+            'query_count': len(batch),
             'execution_time_ms': round(execution_time, 2),
-            'columns': columns,
-            'truncated': truncated,
-            'tables_accessed': table_names,
+            'tables_accessed': all_tables,
             'timestamp': datetime.now().isoformat()
         }
     
     except psycopg2.Error as e:
-        logger.error(f"Database error: {e}")
-        error_msg = str(e)
-        
-        # Provide helpful error messages
-        if 'timeout' in error_msg.lower():
-            raise Exception(f"Query timeout after {SQL_TIMEOUT_SECONDS} seconds. Try simplifying your query.")
-        elif 'permission' in error_msg.lower():
-            raise Exception(f"Permission denied. You may not have access to these tables: {', '.join(table_names)}")
-        else:
-            raise Exception(f"Database error: {error_msg}")
+        _raise_database_error(e, all_tables)
     
     except Exception as e:
-        logger.error(f"Query execution error: {e}", exc_info=True)
-        raise Exception(f"Query execution failed: {str(e)}")
+        logger.error(f"Batch execution error: {e}", exc_info=True)
+        raise Exception(f"Batch execution failed: {str(e)}")
 
 # =====================================================
 # Utility Functions
@@ -491,7 +709,7 @@ def get_table_info(schema: str = 'analytics') -> List[Dict[str, Any]]:
     """
     
     try:
-        with get_db_connection() as conn:
+        with get_db_connection(read_only=True) as conn:
             cur = conn.cursor(cursor_factory=RealDictCursor)
             cur.execute(query, (schema,))
             results = cur.fetchall()
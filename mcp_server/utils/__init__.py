@@ -4,6 +4,8 @@
 from .pii_masking import mask_query_results, mask_email, mask_phone, mask_national_id
 from .sql_validator import is_read_only, validate_sql_query
 from .logger import log_tool_call, get_recent_logs, get_tool_statistics
+from .tool_cache import ttl_cache, clear_tool_caches, get_cache_stats, track_cache_status
+from .semantic_cache import ToolSemanticCache, get_tool_semantic_cache
 
 __all__ = [
     'mask_query_results',
@@ -14,5 +16,11 @@ __all__ = [
     'validate_sql_query',
     'log_tool_call',
     'get_recent_logs',
-    'get_tool_statistics'
+    'get_tool_statistics',
+    'ttl_cache',
+    'clear_tool_caches',
+    'get_cache_stats',
+    'track_cache_status',
+    'ToolSemanticCache',
+    'get_tool_semantic_cache'
 ]
\ No newline at end of file
@@ -3,6 +3,7 @@ PII Masking Utility - Protect sensitive data in query results
 """
 
 import re
+from functools import lru_cache
 from typing import List, Dict, Any
 
 # PII field patterns
@@ -15,6 +16,8 @@ PII_FIELDS = {
     'ip_address': ['ip_address', 'ip', 'ip_addr']
 }
 
+_PHONE_SEPARATORS = re.compile(r'[\s\-()]')
+
 def mask_email(email: str) -> str:
     """
     Mask email address
@@ -38,7 +41,7 @@ def mask_phone(phone: str) -> str:
         return phone
     
     # Remove spaces and dashes for processing
-    clean = re.sub(r'[\s\-()]', '', str(phone))
+    clean = _PHONE_SEPARATORS.sub('', str(phone))
     
     if len(clean) <= 4:
         return '*' * len(clean)
@@ -96,6 +99,14 @@ def mask_ip_address(ip: str) -> str:
     
     return "***"
 
+_MASKERS = {
+    'email': mask_email,
+    'phone': mask_phone,
+    'national_id': mask_national_id,
+    'name': mask_name,
+    'ip_address': mask_ip_address,
+}
+
 def mask_value(value: Any, field_type: str) -> Any:
     """
     Mask a value based on its field type
@@ -110,21 +121,10 @@ def mask_value(value: Any, field_type: str) -> Any:
     if value is None:
         return None
     
-    value_str = str(value)
-    
-    if field_type == 'email':
-        return mask_email(value_str)
-    elif field_type == 'phone':
-        return mask_phone(value_str)
-    elif field_type == 'national_id':
-        return mask_national_id(value_str)
-    elif field_type == 'name':
-        return mask_name(value_str)
-    elif field_type == 'ip_address':
-        return mask_ip_address(value_str)
-    else:
-        return value
+    masker = _MASKERS.get(field_type)
+    return masker(str(value)) if masker else value
 
+@lru_cache(maxsize=512)
 def identify_pii_fields(column_name: str) -> str:
     """
     Identify if a column name contains PII
@@ -0,0 +1,617 @@
+"""
+Semantic Cache - Reuses tool results for repeated or near-identical calls
+
+Every cacheable tool first checks an exact tier keyed by the canonical call.
+Free-text tools (kb.search) then fall back to embedding similarity of the text
+parameter, with every other parameter required to match exactly. Tools whose
+parameters are code or numbers (sql.query) only have the exact tier:
+embeddings can't tell 2023 from 2024 or one column from another.
+
+Both tiers live in process memory (L1). With TOOL_CACHE_REDIS_URL set, they
+are also written to Redis (L2), so uvicorn workers share hits and a restart
+starts warm.
+"""
+
+import os
+import re
+import time
+import queue
+import logging
+import hashlib
+import threading
+from concurrent.futures import Future
+from functools import lru_cache
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+import orjson
+from cachetools import TTLCache
+
+from .tool_cache import MART_VERSION
+
+logger = logging.getLogger(__name__)
+
+# Text Embeddings Inference (TEI) server that batches concurrent requests into
+# one forward pass; "local" runs the model in-process (local dev)
+EMBED_URL = os.getenv('EMBED_URL', 'local').rstrip('/')
+
+# Int8 dynamic quantization of the in-process model's Linear layers (CPU only).
+# Vectors only feed a cosine comparison, so the small accuracy loss is harmless.
+EMBED_QUANTIZE = os.getenv('EMBED_QUANTIZE', 'true').lower() == 'true'
+
+# In-process micro-batching: concurrent lookups arriving within the window are
+# encoded in one forward pass
+EMBED_BATCH_SIZE = int(os.getenv('EMBED_BATCH_SIZE', '32'))
+EMBED_BATCH_WAIT_MS = float(os.getenv('EMBED_BATCH_WAIT_MS', '5'))
+
+# Shared L2 tier; empty keeps the cache per process
+TOOL_CACHE_REDIS_URL = os.getenv('TOOL_CACHE_REDIS_URL', '')
+
+# Bumping MART_VERSION (schema change) orphans every L2 key, which then expires
+_REDIS_PREFIX = f'dbank:tool_cache:v{MART_VERSION}'
+
+# Redis Stack only: keep L2 semantic entries in a RediSearch HNSW index so
+# the nearest match is found in Redis instead of pulling a whole namespace
+TOOL_CACHE_REDIS_SEARCH = os.getenv('TOOL_CACHE_REDIS_SEARCH', 'false').lower() == 'true'
+_REDIS_INDEX = f'{_REDIS_PREFIX}:semantic_idx'
+
+# Cosine similarity above which two kb.search queries are the same question
+SIMILARITY_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.95'))
+
+# tool -> parameter holding free text matched by similarity
+SEMANTIC_FIELDS = {
+    'kb.search': 'query',
+}
+
+# tool -> seconds a cached result stays valid, by how fresh its data must be:
+# the KB is static, while sql.query can read tables that change any time.
+# kpi.top_root_causes is cached per argument set in tool_cache and is not listed here.
+CACHEABLE_TOOLS = {
+    'kb.search': int(os.getenv('KB_CACHE_TTL_SECONDS', '3600')),
+    'sql.query': int(os.getenv('SQL_CACHE_TTL_SECONDS', '30')),
+}
+
+# PostgreSQL functions whose value differs between identical calls
+_NON_DETERMINISTIC_SQL = re.compile(
+    r"\b(?:now|random|clock_timestamp|statement_timestamp|timeofday|gen_random_uuid)\s*\("
+    r"|\b(?:current_date|current_time|current_timestamp|localtime|localtimestamp)\b",
+    re.IGNORECASE
+)
+
+# Whitespace outside single-quoted literals (literals are matched and kept)
+_SQL_WHITESPACE = re.compile(r"('(?:[^']|'')*')|\s+")
+
+
+def canonical_key(tool: str, parameters: Dict[str, Any]) -> bytes:
+    """Stable digest for a tool call: SHA-256 of `tool|{sorted JSON parameters}`"""
+    payload = orjson.dumps(parameters, option=orjson.OPT_SORT_KEYS, default=str)
+    return hashlib.sha256(tool.encode() + b"|" + payload).digest()
+
+
+def _json_default(obj: Any) -> Any:
+    """orjson fallback for psycopg2 values (NUMERIC columns, etc.), matching the API output"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    return str(obj)
+
+
+def _normalize_sql(query: Any) -> Any:
+    """Collapse whitespace outside string literals so reformatted queries share a key"""
+    if not isinstance(query, str):
+        return query
+    return _SQL_WHITESPACE.sub(lambda m: m.group(1) or ' ', query).strip()
+
+
+def _exact_key(tool: str, parameters: Dict[str, Any]) -> Optional[bytes]:
+    """
+    Exact-tier key for a call, or None when its result must not be cached
+
+    SQL text is whitespace-normalized, and queries calling NOW(), random()
+    and the like are never cached.
+    """
+    if tool == 'sql.query':
+        queries = parameters.get('queries') or [parameters.get('query')]
+        if any(isinstance(q, str) and _NON_DETERMINISTIC_SQL.search(q) for q in queries):
+            return None
+        parameters = dict(parameters)
+        if 'query' in parameters:
+            parameters['query'] = _normalize_sql(parameters['query'])
+        if isinstance(parameters.get('queries'), list):
+            parameters['queries'] = [_normalize_sql(q) for q in parameters['queries']]
+    return canonical_key(tool, parameters)
+
+
+class EmbedBatcher:
+    """
+    Coalesces embed calls from concurrent worker threads into batched encodes
+
+    Cache lookups run in asyncio.to_thread workers, so callers block on a
+    Future while one daemon thread drains the queue: it takes up to
+    max_batch texts arriving within max_wait seconds of the first and encodes
+    them together.
+    """
+
+    def __init__(
+        self,
+        encode_batch: Callable[[List[str]], np.ndarray],
+        max_batch: int = EMBED_BATCH_SIZE,
+        max_wait: float = EMBED_BATCH_WAIT_MS / 1000
+    ):
+        """
+        Args:
+            encode_batch: Maps a list of texts to an (n, dim) array
+            max_batch: Maximum texts per encode
+            max_wait: Seconds to wait for more texts after the first arrives
+        """
+        self.encode_batch = encode_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue: queue.Queue = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def embed(self, text: str) -> np.ndarray:
+        """Embed one text, sharing a forward pass with concurrent callers"""
+        if self._worker is None:
+            with self._start_lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name='embed-batcher', daemon=True)
+                    self._worker.start()
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future.result()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                vectors = self.encode_batch([text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+
+class ToolSemanticCache:
+    """In-memory cache of tool results, semantic for free-text tools"""
+
+    def __init__(
+        self,
+        threshold: float = SIMILARITY_THRESHOLD,
+        max_entries: int = 500,
+        model_name: str = 'all-MiniLM-L6-v2'
+    ):
+        """
+        Initialize tool result cache
+
+        Args:
+            threshold: Minimum cosine similarity for a semantic hit
+            max_entries: Maximum cached results per namespace
+            model_name: Sentence-transformers model used for embeddings (384-dim)
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.model_name = model_name
+        self._model = None
+        self._http = None
+        self._redis = None
+        self._redis_index_ready = False
+        self._lock = threading.Lock()
+        # namespace -> [{"embedding" (fp16), "result", "expires_at"}]
+        self._semantic: Dict[bytes, List[Dict[str, Any]]] = {}
+        # Exact tier for every tool: identical repeats skip the embedding pass
+        self._exact: Dict[str, TTLCache] = {
+            tool: TTLCache(maxsize=max_entries, ttl=ttl)
+            for tool, ttl in CACHEABLE_TOOLS.items()
+        }
+        self.hits = 0
+        self.exact_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self._batcher = EmbedBatcher(self._encode_local_batch)
+        # Exact repeats of a text skip the model forward pass
+        self._encode = lru_cache(maxsize=4096)(self._encode_uncached)
+
+    def _encode_uncached(self, text: str) -> np.ndarray:
+        """Embed text with a normalized, read-only vector (shared via the LRU cache)"""
+        if EMBED_URL != 'local':
+            embedding = np.asarray(self._embed_remote(text), dtype=np.float32)
+        else:
+            # Copy the row so the LRU entry doesn't pin the whole batch array
+            embedding = np.array(self._batcher.embed(text), dtype=np.float32)
+        embedding.setflags(write=False)
+        return embedding
+
+    def _encode_local_batch(self, texts: List[str]) -> np.ndarray:
+        """Encode a batch with the in-process model (called on the batcher thread)"""
+        if self._model is None:
+            self._model = self._load_model()
+        return self._model.encode(
+            texts,
+            batch_size=len(texts),
+            normalize_embeddings=True,
+            convert_to_numpy=True
+        )
+
+    def _load_model(self):
+        """Load the sentence-transformers model, int8-quantized when running on CPU"""
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(self.model_name)
+        if EMBED_QUANTIZE and model.device.type == 'cpu':
+            import torch
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return model
+
+    def _embed_remote(self, text: str) -> List[float]:
+        """
+        Embed text on the TEI server at EMBED_URL
+
+        Lookups run in asyncio.to_thread workers, so this uses one pooled sync
+        client shared by every thread; TEI fuses concurrent calls into batches.
+        """
+        with self._lock:
+            if self._http is None:
+                self._http = httpx.Client(
+                    base_url=EMBED_URL,
+                    http2=True,
+                    limits=httpx.Limits(max_keepalive_connections=20, keepalive_expiry=60.0),
+                    timeout=httpx.Timeout(10.0, connect=2.0),
+                )
+        response = self._http.post('/embed', json={'inputs': text, 'normalize': True})
+        response.raise_for_status()
+        return response.json()[0]
+
+    @staticmethod
+    def _namespace(tool: str, parameters: Dict[str, Any]) -> bytes:
+        """Tool plus every non-text parameter; only calls within a namespace are compared"""
+        field = SEMANTIC_FIELDS[tool]
+        rest = {k: v for k, v in parameters.items() if k != field}
+        return canonical_key(tool, rest)
+
+    def lookup(self, tool: str, parameters: Dict[str, Any]) -> Tuple[Optional[Any], Optional[str]]:
+        """
+        Find a cached result for this call, checking every tier in order
+
+        Args:
+            tool: MCP tool name
+            parameters: Tool parameters
+
+        Returns:
+            (result, "exact_hit" | "shared_hit" | "semantic_hit"), or
+            (None, None) on a miss (or for tools that aren't cached)
+        """
+        result = self.lookup_exact(tool, parameters)
+        if result is not None:
+            return result, "exact_hit"
+        if self.has_blocking_tiers(tool):
+            return self.lookup_blocking(tool, parameters)
+        return None, None
+
+    def has_blocking_tiers(self, tool: str) -> bool:
+        """True if a miss in lookup_exact still has Redis or an embedding to try"""
+        return tool in CACHEABLE_TOOLS and (bool(TOOL_CACHE_REDIS_URL) or tool in SEMANTIC_FIELDS)
+
+    def lookup_exact(self, tool: str, parameters: Dict[str, Any]) -> Optional[Any]:
+        """
+        In-process exact tier only: a dict lookup, cheap enough to call on the event loop
+
+        Returns:
+            Cached result, or None on a miss
+        """
+        if tool not in CACHEABLE_TOOLS:
+            return None
+
+        key = _exact_key(tool, parameters)
+        if key is None:
+            return None
+
+        with self._lock:
+            result = self._exact[tool].get(key)
+        if result is not None:
+            self.exact_hits += 1
+            self._count(True)
+        elif not self.has_blocking_tiers(tool):
+            self._count(False)
+        return result
+
+    def lookup_blocking(self, tool: str, parameters: Dict[str, Any]) -> Tuple[Optional[Any], Optional[str]]:
+        """
+        Tiers after lookup_exact: Redis exact, then semantic (L1, then Redis).
+        These block on the network or the embedding model, so run them off the
+        event loop.
+
+        Returns:
+            (result, "shared_hit" | "semantic_hit"), or (None, None) on a miss
+        """
+        key = _exact_key(tool, parameters)
+        if key is None:
+            return None, None
+
+        result = self._shared_get(tool, key)
+        if result is not None:
+            with self._lock:
+                self._exact[tool][key] = result
+            self.shared_hits += 1
+            self._count(True)
+            return result, "shared_hit"
+
+        result = self._lookup_semantic(tool, parameters)
+        self._count(result is not None)
+        return (result, "semantic_hit") if result is not None else (None, None)
+
+    def _lookup_semantic(self, tool: str, parameters: Dict[str, Any]) -> Optional[Any]:
+        """Best semantic match among this namespace's L1 entries, then its L2 entries"""
+        field = SEMANTIC_FIELDS.get(tool)
+        if field is None:
+            return None
+
+        text = parameters.get(field)
+        if not isinstance(text, str) or not text.strip():
+            return None
+
+        namespace = self._namespace(tool, parameters)
+        with self._lock:
+            now = time.time()
+            entries = self._semantic.get(namespace)
+            if entries:
+                entries[:] = [e for e in entries if e['expires_at'] > now]
+            # Snapshot: eviction in store() may shift indices once the lock is released
+            snapshot = list(entries or ())
+        if not snapshot and not TOOL_CACHE_REDIS_URL:
+            return None
+
+        embedding = self._encode(text)
+        match = self._best_match(snapshot, embedding)
+        if match is not None:
+            return match['result']
+
+        # Entries other workers (or a previous process) stored
+        if TOOL_CACHE_REDIS_SEARCH:
+            match = self._shared_nearest(namespace, embedding)
+        else:
+            match = self._best_match(self._shared_semantic(namespace), embedding)
+        if match is None:
+            return None
+        self.shared_hits += 1
+        with self._lock:
+            self._append_semantic(namespace, [match])
+        return match['result']
+
+    def _best_match(self, entries: List[Dict[str, Any]], embedding: np.ndarray) -> Optional[Dict[str, Any]]:
+        """Most similar entry at or above the threshold"""
+        if not entries:
+            return None
+        scores = np.stack([e['embedding'] for e in entries]) @ embedding
+        best = int(np.argmax(scores))
+        return entries[best] if scores[best] >= self.threshold else None
+
+    def store(self, tool: str, parameters: Dict[str, Any], result: Any):
+        """
+        Cache a tool result
+
+        Args:
+            tool: MCP tool name
+            parameters: Tool parameters
+            result: Result returned by the tool
+        """
+        if tool not in CACHEABLE_TOOLS:
+            return
+
+        key = _exact_key(tool, parameters)
+        if key is None:
+            return
+
+        with self._lock:
+            self._exact[tool][key] = result
+
+        field = SEMANTIC_FIELDS.get(tool)
+        text = parameters.get(field) if field else None
+        if not isinstance(text, str) or not text.strip():
+            self._shared_store(tool, key, result)
+            return
+
+        entry = {
+            # fp16 halves the RAM of stored vectors; scoring upcasts to fp32
+            'embedding': self._encode(text).astype(np.float16),
+            'result': result,
+            'expires_at': time.time() + CACHEABLE_TOOLS[tool]
+        }
+        namespace = self._namespace(tool, parameters)
+        with self._lock:
+            self._append_semantic(namespace, [entry])
+        self._shared_store(tool, key, result, namespace, entry)
+
+    def _append_semantic(self, namespace: bytes, entries: List[Dict[str, Any]]):
+        """Add entries to an L1 namespace, dropping the oldest beyond capacity (hold the lock)"""
+        stored = self._semantic.setdefault(namespace, [])
+        stored.extend(entries)
+        if len(stored) > self.max_entries:
+            del stored[:len(stored) - self.max_entries]
+
+    # ---- Redis L2 -------------------------------------------------------
+
+    def _shared(self):
+        """Redis client for the L2 tier, or None when it is disabled"""
+        if not TOOL_CACHE_REDIS_URL:
+            return None
+        with self._lock:
+            if self._redis is None:
+                import redis
+                self._redis = redis.Redis.from_url(TOOL_CACHE_REDIS_URL, socket_timeout=0.5)
+        return self._redis
+
+    def _shared_get(self, tool: str, key: bytes) -> Optional[Any]:
+        """Exact result from Redis; errors count as a miss so the cache never fails a call"""
+        client = self._shared()
+        if client is None:
+            return None
+        try:
+            raw = client.get(f'{_REDIS_PREFIX}:exact:{tool}:{key.hex()}')
+        except Exception as e:
+            logger.warning(f"Tool cache L2 read failed: {e}")
+            return None
+        return orjson.loads(raw) if raw else None
+
+    def _shared_semantic(self, namespace: bytes) -> List[Dict[str, Any]]:
+        """Unexpired semantic entries stored in Redis for a namespace"""
+        client = self._shared()
+        if client is None:
+            return []
+        try:
+            raw_entries = client.lrange(f'{_REDIS_PREFIX}:semantic:{namespace.hex()}', 0, -1)
+        except Exception as e:
+            logger.warning(f"Tool cache L2 read failed: {e}")
+            return []
+        now = time.time()
+        entries = []
+        for raw in raw_entries:
+            entry = orjson.loads(raw)
+            if entry['expires_at'] > now:
+                entry['embedding'] = np.asarray(entry['embedding'], dtype=np.float16)
+                entries.append(entry)
+        return entries
+
+    def _ensure_shared_index(self, client, dim: int):
+        """Create the RediSearch vector index over semantic entry hashes once"""
+        if self._redis_index_ready:
+            return
+        from redis.exceptions import ResponseError
+        from redis.commands.search.field import TagField, VectorField
+        from redis.commands.search.indexDefinition import IndexDefinition, IndexType
+
+        index = client.ft(_REDIS_INDEX)
+        try:
+            index.info()
+        except ResponseError:
+            try:
+                index.create_index(
+                    [
+                        TagField('ns'),
+                        VectorField('emb', 'HNSW', {'TYPE': 'FLOAT32', 'DIM': dim, 'DISTANCE_METRIC': 'COSINE'}),
+                    ],
+                    definition=IndexDefinition(
+                        prefix=[f'{_REDIS_PREFIX}:semantic_entry:'],
+                        index_type=IndexType.HASH
+                    )
+                )
+            except ResponseError as e:
+                # Another worker created it first
+                if 'already exists' not in str(e).lower():
+                    raise
+        self._redis_index_ready = True
+
+    def _shared_nearest(self, namespace: bytes, embedding: np.ndarray) -> Optional[Dict[str, Any]]:
+        """Nearest Redis semantic entry in a namespace via KNN, if within the threshold"""
+        client = self._shared()
+        if client is None:
+            return None
+        from redis.commands.search.query import Query
+
+        query = (
+            Query(f'(@ns:{{{namespace.hex()}}})=>[KNN 1 @emb $vec AS distance]')
+            .return_fields('result', 'expires_at', 'distance')
+            .paging(0, 1)
+            .dialect(2)
+        )
+        try:
+            self._ensure_shared_index(client, embedding.size)
+            docs = client.ft(_REDIS_INDEX).search(
+                query,
+                query_params={'vec': np.asarray(embedding, dtype=np.float32).tobytes()}
+            ).docs
+        except Exception as e:
+            logger.warning(f"Tool cache L2 search failed: {e}")
+            return None
+        # COSINE distance = 1 - cosine similarity
+        if not docs or 1 - float(docs[0].distance) < self.threshold:
+            return None
+        return {
+            'embedding': embedding.astype(np.float16),
+            'result': orjson.loads(docs[0].result),
+            'expires_at': float(docs[0].expires_at)
+        }
+
+    def _shared_store(
+        self,
+        tool: str,
+        key: bytes,
+        result: Any,
+        namespace: Optional[bytes] = None,
+        entry: Optional[Dict[str, Any]] = None
+    ):
+        """Write a result (and its semantic entry) to Redis with the tool's TTL"""
+        client = self._shared()
+        if client is None:
+            return
+        ttl = CACHEABLE_TOOLS[tool]
+        try:
+            pipe = client.pipeline(transaction=False)
+            pipe.set(
+                f'{_REDIS_PREFIX}:exact:{tool}:{key.hex()}',
+                orjson.dumps(result, default=_json_default),
+                ex=ttl
+            )
+            if namespace is not None and entry is not None and TOOL_CACHE_REDIS_SEARCH:
+                self._ensure_shared_index(client, entry['embedding'].size)
+                entry_key = f'{_REDIS_PREFIX}:semantic_entry:{key.hex()}'
+                pipe.hset(entry_key, mapping={
+                    'ns': namespace.hex(),
+                    'emb': entry['embedding'].astype(np.float32).tobytes(),
+                    'result': orjson.dumps(result, default=_json_default),
+                    'expires_at': entry['expires_at']
+                })
+                pipe.expire(entry_key, ttl)
+            elif namespace is not None and entry is not None:
+                semantic_key = f'{_REDIS_PREFIX}:semantic:{namespace.hex()}'
+                pipe.rpush(semantic_key, orjson.dumps({
+                    'embedding': entry['embedding'].astype(np.float32).tolist(),
+                    'result': result,
+                    'expires_at': entry['expires_at']
+                }, default=_json_default))
+                pipe.ltrim(semantic_key, -self.max_entries, -1)
+                pipe.expire(semantic_key, ttl)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Tool cache L2 write failed: {e}")
+
+    def _count(self, hit: bool):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and entry counts"""
+        return {
+            'hits': self.hits,
+            'exact_hits': self.exact_hits,
+            'shared_hits': self.shared_hits,
+            'shared_tier': bool(TOOL_CACHE_REDIS_URL),
+            'misses': self.misses,
+            'semantic_entries': sum(len(e) for e in self._semantic.values()),
+            'exact_entries': {tool: len(cache) for tool, cache in self._exact.items()},
+            'embeddings': self._encode.cache_info()._asdict(),
+        }
+
+
+# Global tool cache instance
+tool_semantic_cache = ToolSemanticCache()
+
+
+def get_tool_semantic_cache() -> ToolSemanticCache:
+    """Get the global tool result cache"""
+    return tool_semantic_cache
@@ -0,0 +1,133 @@
+"""
+Tool Cache - In-process TTL cache for deterministic tool calls
+
+KPI tools read pre-aggregated dbt marts that refresh daily, so the same
+arguments return the same rows until the next refresh. Results are kept in
+memory per worker; swap the TTLCache for Redis when scaling horizontally.
+"""
+
+import os
+import inspect
+import threading
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Callable, Dict, Optional
+
+from cachetools import TTLCache
+
+# Bump when a mart's schema or semantics change so cached results are dropped
+MART_VERSION = os.getenv('MART_VERSION', '1')
+
+KPI_CACHE_TTL_SECONDS = int(os.getenv('KPI_CACHE_TTL_SECONDS', '3600'))
+
+# Empty results (unbackfilled months, missing categories) are remembered for
+# less time so a backfill shows up within minutes
+EMPTY_CACHE_TTL_SECONDS = int(os.getenv('EMPTY_CACHE_TTL_SECONDS', '900'))
+
+# Per-request holder for the outcome of a cached call ("hit", "empty_hit" or
+# "miss"). A mutable dict rather than a plain value so outcomes recorded in
+# asyncio.to_thread workers (which run in a copy of the context) are visible
+# to the request handler.
+_cache_status: ContextVar[Optional[Dict[str, str]]] = ContextVar('tool_cache_status', default=None)
+
+_MISSING = object()
+
+# namespace -> cache, for stats and manual invalidation
+_CACHES: Dict[str, TTLCache] = {}
+
+
+def ttl_cache(
+    namespace: str,
+    ttl: int,
+    maxsize: int = 256,
+    empty_ttl: Optional[int] = None
+) -> Callable:
+    """
+    Cache a tool function's results by its bound arguments
+
+    Positional and keyword calls with the same values share one entry, and
+    the key includes MART_VERSION. Exceptions are not cached.
+
+    Args:
+        namespace: Cache name (usually the MCP tool name)
+        ttl: Seconds an entry stays valid
+        maxsize: Maximum entries before least-recently-used eviction
+        empty_ttl: Seconds to remember empty results (defaults to ttl)
+
+    Returns:
+        Decorator; cached results are shared, so callers must not mutate them
+    """
+    cache = TTLCache(maxsize=maxsize, ttl=ttl)
+    empty_cache = TTLCache(maxsize=maxsize, ttl=empty_ttl if empty_ttl is not None else ttl)
+    lock = threading.Lock()
+    _CACHES[namespace] = cache
+    _CACHES[f'{namespace}:empty'] = empty_cache
+
+    def decorator(func: Callable) -> Callable:
+        signature = inspect.signature(func)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = (MART_VERSION, tuple(bound.arguments.items()))
+
+            with lock:
+                result = empty_cache.get(key, _MISSING)
+                if result is not _MISSING:
+                    _record_status('empty_hit')
+                    return result
+                result = cache.get(key, _MISSING)
+                if result is not _MISSING:
+                    _record_status('hit')
+                    return result
+
+            _record_status('miss')
+            result = func(*args, **kwargs)
+            with lock:
+                if result:
+                    cache[key] = result
+                else:
+                    empty_cache[key] = result
+            return result
+
+        wrapper.cache = cache
+        wrapper.empty_cache = empty_cache
+        return wrapper
+
+    return decorator
+
+
+def track_cache_status() -> Dict[str, str]:
+    """
+    Start recording cache outcomes for the current request
+
+    Returns:
+        Dict that receives a 'status' key when a cached tool is called
+    """
+    status: Dict[str, str] = {}
+    _cache_status.set(status)
+    return status
+
+
+def _record_status(status: str):
+    holder = _cache_status.get()
+    if holder is not None:
+        holder['status'] = status
+
+
+def clear_tool_caches():
+    """Drop every cached tool result (e.g. after a manual mart refresh)"""
+    for cache in _CACHES.values():
+        cache.clear()
+
+
+def get_cache_stats() -> Dict[str, Any]:
+    """Entry counts per cache namespace"""
+    return {
+        'mart_version': MART_VERSION,
+        'caches': {
+            namespace: {'entries': len(cache), 'maxsize': cache.maxsize, 'ttl': cache.ttl}
+            for namespace, cache in _CACHES.items()
+        }
+    }
@@ -0,0 +1,105 @@
+"""
+Prompt Minifier for dBank Support Copilot
+Builds DBANK_SYSTEM_PROMPT_MIN (fastapi_app/prompts/system_prompts_min.py)
+from DBANK_SYSTEM_PROMPT with fewer tokens and the same instructions
+
+Run from the repo root after editing the prompt:
+    python scripts/minify_prompt.py
+"""
+
+import re
+import sys
+import hashlib
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from fastapi_app.prompts.system_prompts import DBANK_SYSTEM_PROMPT
+
+OUTPUT_FILE = ROOT / "fastapi_app" / "prompts" / "system_prompts_min.py"
+
+# Paragraphs whose word sets overlap more than this are treated as duplicates
+JACCARD_THRESHOLD = 0.9
+
+
+def count_tokens(text: str):
+    """Token count with the gpt-4o tokenizer, or None if tiktoken is unavailable"""
+    try:
+        import tiktoken
+        return len(tiktoken.encoding_for_model("gpt-4o-mini").encode(text))
+    except Exception:
+        return None
+
+
+def jaccard(a: set, b: set) -> float:
+    """Jaccard similarity of two word sets"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def minify(prompt: str) -> str:
+    """Apply token-saving rewrites that keep the instructions intact"""
+    text = prompt
+
+    # Emoji markers -> plain words ("✅ CORRECT Response:" -> "OK:")
+    text = re.sub(r"✅\s*CORRECT( Response)?:?", "OK:", text)
+    text = re.sub(r"❌\s*WRONG( Response)?:?", "NO:", text)
+    text = text.replace("✅", "OK:").replace("❌", "NO:")
+    text = re.sub(r"[⚠️🔴🟢]", "", text)
+    text = text.replace(" (READ CAREFULLY)", "")
+
+    # Markdown decoration: bold markers, heading hashes beyond one level
+    text = text.replace("**", "")
+    text = re.sub(r"^#{2,}\s*", "# ", text, flags=re.MULTILINE)
+
+    # Whitespace: trailing spaces, aligned padding, runs of blank lines
+    text = re.sub(r"[ \t]+$", "", text, flags=re.MULTILINE)
+    text = re.sub(r"^[ \t]{2,}", " ", text, flags=re.MULTILINE)
+    text = re.sub(r"(\S)[ \t]{2,}(?=\S)", r"\1 ", text)
+    text = re.sub(r"\n{3,}", "\n\n", text)
+
+    # Drop near-duplicate paragraphs (repeated PII masking explanations etc.)
+    kept = []
+    seen = []
+    for paragraph in text.split("\n\n"):
+        words = set(re.findall(r"\w+", paragraph.lower()))
+        if len(words) > 5 and any(jaccard(words, prev) > JACCARD_THRESHOLD for prev in seen):
+            continue
+        seen.append(words)
+        kept.append(paragraph)
+
+    return "\n\n".join(kept).strip() + "\n"
+
+
+def main():
+    minified = minify(DBANK_SYSTEM_PROMPT)
+    if '"""' in minified or "\\" in minified:
+        raise SystemExit("Prompt contains triple quotes or backslashes; cannot emit as a plain literal")
+    source_hash = hashlib.sha256(DBANK_SYSTEM_PROMPT.encode("utf-8")).hexdigest()[:12]
+
+    OUTPUT_FILE.write_text(
+        '"""\n'
+        "Minified system prompt - GENERATED by scripts/minify_prompt.py, do not edit\n"
+        '"""\n'
+        "from typing import Final\n\n"
+        f'# Generated from DBANK_SYSTEM_PROMPT version {source_hash}\n'
+        f'DBANK_SYSTEM_PROMPT_MIN: Final[str] = """{minified}"""\n',
+        encoding="utf-8"
+    )
+
+    full_tokens = count_tokens(DBANK_SYSTEM_PROMPT)
+    min_tokens = count_tokens(minified)
+
+    print("=" * 60)
+    print("✂️  Prompt minified")
+    print("=" * 60)
+    print(f"   Characters: {len(DBANK_SYSTEM_PROMPT):,} -> {len(minified):,}")
+    if full_tokens and min_tokens:
+        print(f"   Tokens:     {full_tokens:,} -> {min_tokens:,} ({1 - min_tokens / full_tokens:.0%} smaller)")
+    print(f"   Written to: {OUTPUT_FILE.relative_to(ROOT)}")
+
+
+if __name__ == "__main__":
+    main()
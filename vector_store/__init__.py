@@ -0,0 +1,3 @@
+"""
+Vector Store - pgvector embedding and semantic search for the knowledge base
+"""
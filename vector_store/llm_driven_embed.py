@@ -24,6 +24,11 @@ MAX_CHUNK_SIZE = 1200  # maximum tokens per chunk
 EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "openai")
 CHUNKING_METHOD = os.getenv("CHUNKING_METHOD", "llm")  # "llm" or "simple"
 
+# HNSW index build memory and parallelism; the graph builds much faster when
+# it fits in maintenance_work_mem
+HNSW_MAINTENANCE_WORK_MEM = os.getenv("HNSW_MAINTENANCE_WORK_MEM", "512MB")
+HNSW_BUILD_WORKERS = int(os.getenv("HNSW_BUILD_WORKERS", "2"))
+
 # Database connection
 DB_CONFIG = {
     'host': os.getenv('POSTGRES_HOST', 'localhost'),
@@ -257,22 +262,31 @@ def get_embedding(text: str) -> List[float]:
 # =====================================================
 
 def ensure_vector_dimension(conn, dim: int):
-    """Update vector dimension if needed"""
+    """Update the embedding column to halfvec(dim) if needed"""
     with conn.cursor() as cur:
         cur.execute("""
-            SELECT atttypmod 
+            SELECT format_type(atttypid, atttypmod)
             FROM pg_attribute 
             WHERE attrelid = 'vector_store.documents'::regclass 
             AND attname = 'embedding'
         """)
         result = cur.fetchone()
         
-        if result and result[0] != dim:
-            print(f"⚠️  Updating vector dimension from {result[0]} to {dim}")
+        if result and result[0] != f"halfvec({dim})":
+            print(f"⚠️  Updating embedding column from {result[0]} to halfvec({dim})")
+            # Index opclasses are type-specific; they are rebuilt after loading
+            cur.execute("""
+                SELECT indexname
+                FROM pg_indexes
+                WHERE schemaname = 'vector_store' AND tablename = 'documents'
+                AND indexdef LIKE '%(embedding%'
+            """)
+            for (index_name,) in cur.fetchall():
+                cur.execute(f"DROP INDEX IF EXISTS vector_store.{index_name}")
             cur.execute("""
                 ALTER TABLE vector_store.documents 
-                ALTER COLUMN embedding TYPE vector(%s)
-            """, (dim,))
+                ALTER COLUMN embedding TYPE halfvec(%s) USING embedding::halfvec(%s)
+            """, (dim, dim))
             conn.commit()
 
 def clear_existing_documents(conn):
@@ -288,7 +302,7 @@ def insert_embeddings(conn, embeddings_data: List[Tuple]):
         insert_query = """
             INSERT INTO vector_store.documents 
             (document_name, document_type, chunk_index, content, embedding, metadata)
-            VALUES (%s, %s, %s, %s, %s, %s)
+            VALUES (%s, %s, %s, %s, %s::halfvec, %s)
         """
         
         formatted_data = [
@@ -395,15 +409,40 @@ def process_knowledge_base():
     print(f"✅ Inserted {total_chunks} chunks (avg {avg_tokens:.0f} tokens/chunk)")
     
     # Create index for faster search
-    print("\n🔨 Creating vector index...")
+    from vector_search import KB_CATEGORIES, configure_hnsw_params
+    hnsw = configure_hnsw_params(total_chunks)
+    print(f"\n🔨 Creating HNSW vector index (m={hnsw['m']}, ef_construction={hnsw['ef_construction']})...")
     with conn.cursor() as cur:
+        cur.execute("SET LOCAL maintenance_work_mem = %s", (HNSW_MAINTENANCE_WORK_MEM,))
+        cur.execute("SET LOCAL max_parallel_maintenance_workers = %s", (HNSW_BUILD_WORKERS,))
         cur.execute("DROP INDEX IF EXISTS vector_store.documents_embedding_idx")
         cur.execute("""
-            CREATE INDEX documents_embedding_idx 
-            ON vector_store.documents 
-            USING ivfflat (embedding vector_cosine_ops)
-            WITH (lists = 100)
-        """)
+            CREATE INDEX documents_embedding_idx
+            ON vector_store.documents
+            USING hnsw (embedding halfvec_cosine_ops)
+            WITH (m = %s, ef_construction = %s)
+        """, (hnsw['m'], hnsw['ef_construction']))
+        
+        # Per-category partial indexes, used by category-filtered searches
+        # (kb.search's category tiers, via the kb_search_<category> statements)
+        for category in KB_CATEGORIES:
+            cur.execute(f"DROP INDEX IF EXISTS vector_store.documents_embedding_{category}_idx")
+            cur.execute(f"""
+                CREATE INDEX documents_embedding_{category}_idx
+                ON vector_store.documents
+                USING hnsw (embedding halfvec_cosine_ops)
+                WITH (m = %s, ef_construction = %s)
+                WHERE metadata->>'category' = %s
+            """, (hnsw['m'], hnsw['ef_construction'], category))
+        
+        # Binary-quantized index for two-stage (Hamming, then cosine) searches
+        cur.execute("DROP INDEX IF EXISTS vector_store.documents_embedding_bq_idx")
+        cur.execute(f"""
+            CREATE INDEX documents_embedding_bq_idx
+            ON vector_store.documents
+            USING hnsw ((binary_quantize(embedding)::bit({EMBEDDING_DIM})) bit_hamming_ops)
+            WITH (m = %s, ef_construction = %s)
+        """, (hnsw['m'], hnsw['ef_construction']))
         conn.commit()
     
     print("✅ Vector index created")
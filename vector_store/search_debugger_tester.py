@@ -78,7 +78,7 @@ def search_vectors(
             chunk_index,
             content,
             metadata,
-            1 - (embedding <=> %s::vector) as similarity
+            1 - (embedding <=> %s::halfvec) as similarity
         FROM vector_store.documents
         WHERE 1=1
     """
@@ -89,7 +89,7 @@ def search_vectors(
         params.append(category_filter)
     
     if min_similarity:
-        sql += " AND (1 - (embedding <=> %s::vector)) >= %s"
+        sql += " AND (1 - (embedding <=> %s::halfvec)) >= %s"
         params.extend([query_embedding, min_similarity])
     
     sql += " ORDER BY similarity DESC LIMIT %s"
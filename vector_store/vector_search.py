@@ -3,10 +3,15 @@ Semantic Search over Knowledge Base using pgvector
 """
 
 import os
-from typing import List, Dict
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import List, Dict, Optional
 from dotenv import load_dotenv
 import psycopg2
+import psycopg2.extensions
 from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
 
 load_dotenv()
 
@@ -22,21 +27,193 @@ DB_CONFIG = {
     'password': os.getenv('POSTGRES_PASSWORD', 'dbank_pass_2025')
 }
 
-# Initialize embedding model
+# Pooled search connections per process
+KB_DB_POOL_MAX = int(os.getenv('KB_DB_POOL_MAX', '8'))
+
+# Initialize embedding model. Embeddings are memoized by exact text: kb.search
+# retries the same query at lower thresholds, and users repeat questions.
+# The returned list is shared between callers and must not be mutated.
 if EMBEDDING_PROVIDER == "openai":
     from openai import OpenAI
     client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
     EMBEDDING_MODEL = "text-embedding-3-small"
+    EMBEDDING_DIM = 1536
     
+    @lru_cache(maxsize=4096)
     def get_embedding(text: str) -> List[float]:
         response = client.embeddings.create(input=text, model=EMBEDDING_MODEL)
         return response.data[0].embedding
+    
+    def get_embeddings(texts: List[str]) -> List[List[float]]:
+        """Embed several texts in one API call (not memoized)"""
+        response = client.embeddings.create(input=texts, model=EMBEDDING_MODEL)
+        return [item.embedding for item in response.data]
 else:
     from sentence_transformers import SentenceTransformer
     model = SentenceTransformer('all-MiniLM-L6-v2')
+    EMBEDDING_DIM = 384
     
+    @lru_cache(maxsize=4096)
     def get_embedding(text: str) -> List[float]:
         return model.encode(text).tolist()
+    
+    def get_embeddings(texts: List[str]) -> List[List[float]]:
+        """Embed several texts in one forward pass (not memoized)"""
+        return model.encode(texts).tolist()
+
+# Values of metadata->>'category'; each has its own partial HNSW index, which
+# search_knowledge_base(filter_category=...) reaches through its prepared statement
+KB_CATEGORIES = ('product_guide', 'support_doc', 'reference_doc', 'general')
+
+# Two-stage search for large result sets: Hamming distance over the
+# binary-quantized index picks this many candidates, which are reranked by
+# exact cosine. 0 disables; capped at pgvector's ef_search maximum (1000).
+KB_BINARY_CANDIDATES = min(int(os.getenv('KB_BINARY_CANDIDATES', '1000')), 1000)
+KB_BINARY_RERANK_MIN_K = int(os.getenv('KB_BINARY_RERANK_MIN_K', '10'))
+
+# HNSW search breadth; unset means pick from the table size on first search
+HNSW_EF_SEARCH: Optional[int] = int(os.environ['HNSW_EF_SEARCH']) if os.getenv('HNSW_EF_SEARCH') else None
+
+
+def configure_hnsw_params(vector_count: int) -> Dict[str, int]:
+    """
+    HNSW build and search settings for a table of the given size
+
+    Args:
+        vector_count: Number of embedded chunks
+
+    Returns:
+        Dict with index build params (m, ef_construction) and query ef_search
+    """
+    if vector_count < 100_000:
+        return {"m": 16, "ef_construction": 64, "ef_search": 40}
+    if vector_count < 1_000_000:
+        return {"m": 24, "ef_construction": 100, "ef_search": 100}
+    return {"m": 32, "ef_construction": 128, "ef_search": 200}
+
+
+def _ef_search(cur) -> int:
+    """ef_search for this process, sized from the planner's row estimate once"""
+    global HNSW_EF_SEARCH
+    if HNSW_EF_SEARCH is None:
+        cur.execute("""
+            SELECT GREATEST(reltuples, 0)::bigint AS total
+            FROM pg_class
+            WHERE oid = 'vector_store.documents'::regclass
+        """)
+        HNSW_EF_SEARCH = configure_hnsw_params(cur.fetchone()['total'])['ef_search']
+    return HNSW_EF_SEARCH
+
+
+class _KBConnection(psycopg2.extensions.connection):
+    """Connection that remembers which search statements it has prepared"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+
+_pool: Optional[ThreadedConnectionPool] = None
+_pool_lock = threading.Lock()
+# ThreadedConnectionPool raises when exhausted; callers wait for a slot instead
+_pool_slots = threading.BoundedSemaphore(KB_DB_POOL_MAX)
+
+
+@contextmanager
+def _pooled_connection():
+    """
+    Borrow a search connection; connections (and their prepared statements)
+    live for the process. The transaction is rolled back on return.
+    """
+    global _pool
+    with _pool_slots:
+        if _pool is None:
+            with _pool_lock:
+                if _pool is None:
+                    _pool = ThreadedConnectionPool(
+                        1, KB_DB_POOL_MAX, connection_factory=_KBConnection, **DB_CONFIG
+                    )
+        conn = _pool.getconn()
+        broken = False
+        try:
+            yield conn
+        except psycopg2.Error:
+            broken = True
+            raise
+        finally:
+            if not broken and not conn.closed:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    broken = True
+            _pool.putconn(conn, close=broken or bool(conn.closed))
+
+
+def _nearest_sql(
+    vec: str,
+    min_similarity: str,
+    limit: str,
+    category_filter: str = "",
+    candidates: Optional[str] = None
+) -> str:
+    """
+    Nearest-chunk SELECT for one query vector, given as SQL expressions
+
+    With candidates, the rows come from the binary-quantized HNSW index
+    (Hamming distance) and only those are ranked by exact cosine.
+    """
+    source = "vector_store.documents"
+    if candidates:
+        source = f"""vector_store.documents
+        JOIN (
+            SELECT doc_id
+            FROM vector_store.documents
+            ORDER BY binary_quantize(embedding)::bit({EMBEDDING_DIM}) <~> binary_quantize({vec})
+            LIMIT {candidates}
+        ) candidates USING (doc_id)"""
+    return f"""
+        SELECT 
+            doc_id,
+            document_name,
+            chunk_index,
+            content,
+            metadata,
+            1 - (embedding <=> {vec}) as similarity
+        FROM {source}
+        WHERE {category_filter}1 - (embedding <=> {vec}) >= {min_similarity}
+        ORDER BY embedding <=> {vec}
+        LIMIT {limit}
+    """
+
+
+def _use_binary_stage(top_k: int, category: Optional[str]) -> bool:
+    """Large unfiltered searches go through the binary-quantized index"""
+    return KB_BINARY_CANDIDATES > 0 and not category and top_k > KB_BINARY_RERANK_MIN_K
+
+
+def _prepare_search(conn, cur, category: Optional[str], two_stage: bool = False) -> str:
+    """
+    Name of the prepared search, preparing it on this connection on first use
+
+    Parameters: $1 query embedding, $2 min similarity, $3 limit and, for the
+    two-stage search, $4 candidate count. The category is a literal in the
+    statement rather than a parameter so the plan can use that category's
+    partial HNSW index.
+    """
+    if two_stage:
+        name = "kb_search_bq"
+    else:
+        name = f"kb_search_{category}" if category else "kb_search"
+    if name not in conn.prepared:
+        if two_stage:
+            sql = "PREPARE kb_search_bq(halfvec, float8, int, int) AS " + _nearest_sql("$1", "$2", "$3", candidates="$4")
+        else:
+            category_filter = "metadata->>'category' = %s AND " if category else ""
+            sql = f"PREPARE {name}(halfvec, float8, int) AS " + _nearest_sql("$1", "$2", "$3", category_filter)
+        cur.execute(sql, (category,) if category and not two_stage else None)
+        conn.prepared.add(name)
+    return name
+
 
 def search_knowledge_base(
     query: str, 
@@ -56,64 +233,129 @@ def search_knowledge_base(
     Returns:
         List of matching document chunks with metadata
     """
+    # Chunks are only ever filed under KB_CATEGORIES
+    if filter_category and filter_category not in KB_CATEGORIES:
+        return []
+    
     # Get query embedding
     query_embedding = get_embedding(query)
     
-    # Connect to database
-    conn = psycopg2.connect(**DB_CONFIG)
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    with _pooled_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            two_stage = _use_binary_stage(top_k, filter_category)
+            # Scoped to this transaction; ef_search below the number of rows
+            # wanted from the index would cap the results
+            wanted = KB_BINARY_CANDIDATES if two_stage else top_k
+            cur.execute("SET LOCAL hnsw.ef_search = %s", (max(_ef_search(cur), wanted),))
+            
+            statement = _prepare_search(conn, cur, filter_category, two_stage)
+            if two_stage:
+                cur.execute(
+                    f"EXECUTE {statement}(%s::halfvec, %s, %s, %s)",
+                    (query_embedding, min_similarity, top_k, KB_BINARY_CANDIDATES)
+                )
+            else:
+                cur.execute(
+                    f"EXECUTE {statement}(%s::halfvec, %s, %s)",
+                    (query_embedding, min_similarity, top_k)
+                )
+            results = cur.fetchall()
     
-    # Build query
-    sql = """
-        SELECT 
-            doc_id,
-            document_name,
-            chunk_index,
-            content,
-            metadata,
-            1 - (embedding <=> %s::vector) as similarity
-        FROM vector_store.documents
-        WHERE 1=1
+    return [_format_row(row) for row in results]
+
+
+def search_by_embeddings(
+    embeddings: List[List[float]],
+    top_k: int = 5,
+    filter_category: str = None,
+    min_similarity: float = 0.5,
+    requested_k: Optional[int] = None
+) -> List[List[Dict]]:
     """
+    Nearest chunks for several query embeddings in one statement
+
+    Each embedding runs its own HNSW scan inside a LATERAL join, so N
+    queries cost one round trip instead of N.
+
+    Args:
+        embeddings: Query embeddings
+        top_k: Number of results per query
+        filter_category: Optional category filter shared by all queries
+        min_similarity: Minimum similarity threshold (0-1)
+        requested_k: Results the caller will keep when top_k is a larger
+            candidate pool; decides the binary stage (defaults to top_k)
+
+    Returns:
+        One result list per embedding, in input order
+    """
+    if not embeddings:
+        return []
+    if filter_category and filter_category not in KB_CATEGORIES:
+        return [[] for _ in embeddings]
+    
+    two_stage = _use_binary_stage(requested_k or top_k, filter_category)
+    nearest = _nearest_sql(
+        "q.vec",
+        "%(min_similarity)s",
+        "%(top_k)s",
+        "metadata->>'category' = %(category)s AND " if filter_category else "",
+        "%(candidates)s" if two_stage else None
+    )
+    vectors = ['[' + ','.join(map(str, embedding)) + ']' for embedding in embeddings]
     
-    params = [query_embedding]
-    
-    # Add category filter if specified
-    if filter_category:
-        sql += " AND metadata->>'category' = %s"
-        params.append(filter_category)
-    
-    # Add similarity threshold
-    sql += " AND 1 - (embedding <=> %s::vector) >= %s"
-    params.extend([query_embedding, min_similarity])
-    
-    # Order by similarity and limit
-    sql += " ORDER BY similarity DESC LIMIT %s"
-    params.append(top_k)
-    
-    # Execute query
-    cur.execute(sql, params)
-    results = cur.fetchall()
-    
-    # Close connection
-    cur.close()
-    conn.close()
-    
-    # Format results
-    formatted_results = []
-    for row in results:
-        formatted_results.append({
-            'doc_id': row['doc_id'],
-            'title': row['document_name'],
-            'content': row['content'],
-            'chunk_index': row['chunk_index'],
-            'similarity': float(row['similarity']),
-            'category': row['metadata'].get('category'),
-            'filename': row['metadata'].get('filename'),
-            'is_critical': row['metadata'].get('is_critical', False)
-        })
-    
-    return formatted_results
+    with _pooled_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            wanted = KB_BINARY_CANDIDATES if two_stage else top_k
+            cur.execute("SET LOCAL hnsw.ef_search = %s", (max(_ef_search(cur), wanted),))
+            cur.execute(f"""
+                SELECT q.i, t.*
+                FROM unnest(%(vectors)s::halfvec[]) WITH ORDINALITY AS q(vec, i)
+                CROSS JOIN LATERAL ({nearest}) t
+                ORDER BY q.i, t.similarity DESC
+            """, {
+                'vectors': vectors,
+                'min_similarity': min_similarity,
+                'top_k': top_k,
+                'category': filter_category,
+                'candidates': KB_BINARY_CANDIDATES
+            })
+            rows = cur.fetchall()
+    
+    grouped: List[List[Dict]] = [[] for _ in embeddings]
+    for row in rows:
+        grouped[row['i'] - 1].append(_format_row(row))
+    return grouped
+
+
+def search_knowledge_base_batch(
+    queries: List[str],
+    top_k: int = 5,
+    filter_category: str = None,
+    min_similarity: float = 0.5
+) -> List[List[Dict]]:
+    """
+    Semantic search for several queries: one embedding call, one SQL statement
+
+    Returns:
+        One result list per query, in input order
+    """
+    if not queries:
+        return []
+    return search_by_embeddings(get_embeddings(queries), top_k, filter_category, min_similarity)
+
+
+def _format_row(row: Dict) -> Dict:
+    """Search result dict for a documents row"""
+    return {
+        'doc_id': row['doc_id'],
+        'title': row['document_name'],
+        'content': row['content'],
+        'chunk_index': row['chunk_index'],
+        'similarity': float(row['similarity']),
+        'category': row['metadata'].get('category'),
+        'filename': row['metadata'].get('filename'),
+        'is_critical': row['metadata'].get('is_critical', False)
+    }
 
 def search_and_display(query: str, top_k: int = 3, min_similarity: float = 0.5):
     """Search and display results nicely"""